@@ -2,7 +2,8 @@
 
 import re
 from argparse import ArgumentParser
-from datetime import datetime, timedelta, timezone
+from dataclasses import replace
+from datetime import datetime, timedelta
 from pathlib import Path
 from queue import Queue
 from time import sleep
@@ -15,7 +16,6 @@ from pyproj.crs.coordinate_operation import TransverseMercatorConversion
 
 import ob_inst_survey as obsurv
 
-STARTTIME = datetime.now(timezone.utc)
 DFLT_PREFIX = "ASCENT-DESCENT"
 DFLT_PATH = Path.cwd() / "results/"
 ACCOU_TURNTIME = 12.5  # millisec
@@ -24,6 +24,8 @@ ACCOU_SPD = 1500  # m/sec
 
 def main():
     """Initialise NMEA and EdgeTech data streams and log to CSV text file."""
+    context = obsurv.SurveyContext()
+
     # Default CLI arguments.
     ip_param = obsurv.IpParam()
     etech_param = obsurv.EtechParam()
@@ -45,10 +47,16 @@ def main():
             obsurv.out_filepath_parser(DFLT_PATH),
             obsurv.out_fileprefix_parser(DFLT_PREFIX),
             obsurv.lograw_parser(),
+            obsurv.compress_parser(),
             obsurv.ip_arg_parser(ip_param),
             obsurv.edgetech_arg_parser(etech_param),
+            obsurv.clock_sync_parser(),
+            obsurv.capture_proc_parser(),
+            obsurv.stall_timeout_parser(),
+            obsurv.nmea_failover_parser(),
             obsurv.replay2files_parser(None),
             obsurv.apriori_coord_parser(),
+            obsurv.resume_parser(),
         ],
         description=helpdesc,
     )
@@ -63,53 +71,81 @@ def main():
         addr=args.ipaddr,
         prot=args.ipprot,
         buffer=args.ipbuffer,
+        rcvbuf=args.iprcvbuf,
+        sentences=args.nmeatypes,
+        talkers=args.nmeatalkers,
+        group=args.ipgroup,
+        label=args.iplabel,
+        outage=args.ipoutage,
     )
+    ip_params = [ip_param]
+    for port, label in args.addipport:
+        ip_params.append(replace(ip_param, port=int(port), label=label))
+    standby_param = None
+    if args.standbyport:
+        standby_param = replace(
+            ip_param,
+            port=args.standbyport,
+            addr=args.standbyaddr or ip_param.addr,
+            label=args.standbylabel,
+        )
     etech_param = obsurv.EtechParam(
         port=args.serport,
         baud=args.serbaud,
         stop=args.serstop,
         parity=args.serparity,
         bytesize=args.serbytesize,
+        tx_correction=args.sertxcorrect,
         turn_time=args.acouturn,
         snd_spd=args.acouspd,
+        label=args.serlabel,
+        range_interval=args.rnginterval,
+        upper_gate=args.rnggate,
+        range_command=args.rngcommand,
     )
+    etech_params = [etech_param]
+    for port, label in args.addserport:
+        etech_params.append(replace(etech_param, port=port, label=label))
     replay_nmeafile: Path = args.replaynmea
-    replay_rngfile: Path = args.replayrange
+    replay_rngfile: list[Path] = args.replayrange
     replay_start: datetime = args.replaystart
     replay_speed: float = args.replayspeed
     timestamp_offset: float = args.timestampoffset
 
     if not (replay_rngfile and replay_nmeafile):
-        timestamp_start = STARTTIME.strftime("%Y-%m-%d_%H-%M")
+        timestamp_start = context.timestamp_start
     else:
-        with open(replay_rngfile, encoding="utf-8") as etech_file:
-            etech_lines = etech_file.readlines()
-        for sentence in etech_lines:
-            try:
-                # Attempt to extract the timestamp from the beginning of first
-                # senetence of the file replay.
-                timestamp_pattern = (
-                    r"^\d{4}[:_-]\d{2}[:_-]\d{2}[Tt :_-]"
-                    r"\d{2}[:_-]\d{2}[:_-]\d{2}\.\d{0,6}"
-                )
-                timestamp = re.search(timestamp_pattern, sentence).group()
-                timestamp = re.sub(r"[Tt :_-]", r"_", timestamp)
-                timestamp = datetime.strptime(timestamp, r"%Y_%m_%d_%H_%M_%S.%f")
-                timestamp = timestamp + timedelta(seconds=timestamp_offset)
-                timestamp_start = timestamp.strftime("%Y-%m-%d_%H-%M")
-                break
-            except AttributeError:
-                # If no valid timestamp continue with next response line.
-                pass
+        # Name output files from the timestamp of the first range response,
+        # found from the time index of the file.
+        timestamp_start = context.timestamp_start
+        timestamp = obsurv.replay_index(replay_rngfile[0], "etech").first_datetime
+        if timestamp:
+            timestamp = timestamp + timedelta(seconds=timestamp_offset)
+            timestamp_start = timestamp.strftime("%Y-%m-%d_%H-%M")
+
+    # If resuming an interrupted survey, continue with the same output files.
+    checkpoint_state = None
+    if args.resume:
+        checkpoint_state = obsurv.load_checkpoint(args.resume)
+        timestamp_start = checkpoint_state["timestamp_start"]
+        apriori_coord = checkpoint_state["apriori_coord"]
+        print(f"Resuming survey from checkpoint {args.resume}")
+
+    clock = obsurv.ClockDiscipline() if args.clocksync else None
+    if clock and checkpoint_state and checkpoint_state["clock"]:
+        clock.set_state(checkpoint_state["clock"])
 
     outfile_path: Path = args.outfilepath
     outfile_name: str = f"{args.outfileprefix}_{timestamp_start}"
     obsfile_name: str = f"{outfile_name}_OBSVNS"
     obsfile_log: str = outfile_path / f"{obsfile_name}.csv"
+    context.timestamp_start = timestamp_start
+    context.outfile_path = outfile_path
+    context.outfile_prefix = args.outfileprefix
+    context.etech_conn = etech_params
     if args.lograw:
-        rawfile_path = outfile_path
-    else:
-        rawfile_path = None
+        context.rawfile_path = outfile_path
+        context.raw_compression = args.compress
 
     # Create directories for logging (included raw NMEA and Ranging streams).
     outfile_path.mkdir(parents=True, exist_ok=True)
@@ -119,36 +155,45 @@ def main():
     obsvn_q: Queue[dict] = Queue()
     obsurv.ranging_survey_stream(
         obsvn_q=obsvn_q,
-        nmea_conn=ip_param,
-        etech_conn=etech_param,
+        nmea_conn=ip_params,
         nmea_filename=replay_nmeafile,
         etech_filename=replay_rngfile,
         replay_start=replay_start,
         spd_fctr=replay_speed,
         timestamp_offset=timestamp_offset,
-        rawfile_path=rawfile_path,
-        rawfile_prefix=args.outfileprefix,
+        clock=clock,
+        context=context,
+        capture_proc=args.captureproc,
+        stall_timeout=args.stalltimeout or None,
+        nmea_standby=standby_param,
+        failover_window=args.failoverwindow,
     )
 
     display_cols = (
-        f'{"utcTime":^12s}',
-        f'{"range":^8s}',
-        f'{"horzntl":^8s}',
-        f'{"depth":^8s}',
-        f'{"rate":^8s}',
-        f'{"eta_min":^6s}',
-        f'{"eta_time":^8s}',
-        f'{"towards":^8s}',
-        f'{"lat":^14s}',
-        f'{"lon":^14s}',
-        f'{"cog":^6s}',
-        f'{"sogKt":^5s}',
-        f'{"heading":^6s}',
+        f"{'utcTime':^12s}",
+        f"{'range':^8s}",
+        f"{'horzntl':^8s}",
+        f"{'depth':^8s}",
+        f"{'rate':^8s}",
+        f"{'eta_min':^6s}",
+        f"{'eta_time':^8s}",
+        f"{'towards':^8s}",
+        f"{'lat':^14s}",
+        f"{'lon':^14s}",
+        f"{'cog':^6s}",
+        f"{'sogKt':^5s}",
+        f"{'heading':^6s}",
     )
     print(", ".join(display_cols))
 
     obsvn_df = pd.DataFrame(dtype=object)
     prev_record = {}
+    if checkpoint_state:
+        obsvn_df = checkpoint_state["obsvn_df"]
+        prev_record = checkpoint_state["prev_record"]
+    checkpointer = obsurv.Checkpointer(
+        args.resume or outfile_path / f"{outfile_name}_CHECKPOINT.pkl"
+    )
     # Main survey loop.
     try:
         while True:
@@ -156,6 +201,15 @@ def main():
                 sleep(0.000001)  # Prevents idle loop from 100% CPU thread usage.
                 continue
             curr_record = dict(obsvn_q.get())
+            if curr_record["flag"] == "Stalled":
+                print(
+                    f"!!! No {curr_record['source']} data for "
+                    f"{curr_record['lastMsgAge']:.0f} seconds. !!!"
+                )
+                continue
+            if curr_record["flag"] == "Recovered":
+                print(f"*** {curr_record['source']} data resumed. ***")
+                continue
             if curr_record["flag"] in ["TimeoutError", "EOF"]:
                 print(f"*** Survey Ended: {curr_record['flag']} ***")
                 break
@@ -256,32 +310,38 @@ def main():
             else:
                 obsvn_df = curr_obsvn
             obsvn_df.to_csv(obsfile_log, index=False)
+            if checkpointer.due():
+                checkpointer.save(
+                    session_state(
+                        timestamp_start, apriori_coord, obsvn_df, prev_record, clock
+                    )
+                )
 
             # Display summary values to screen
             display_vals = []
-            display_vals.append(f'{curr_record["utcTime"]:<12s}')
-            display_vals.append(f'{curr_record["range"]:8.2f}')
-            display_vals.append(f'{curr_record["dist"]:8.2f}')
+            display_vals.append(f"{curr_record['utcTime']:<12s}")
+            display_vals.append(f"{curr_record['range']:8.2f}")
+            display_vals.append(f"{curr_record['dist']:8.2f}")
             if curr_record["depth"]:
-                display_vals.append(f'{curr_record["depth"]:8.2f}')
+                display_vals.append(f"{curr_record['depth']:8.2f}")
             else:
-                display_vals.append(f'{"":8s}')
+                display_vals.append(f"{'':8s}")
             if curr_record["rate_mpsec"]:
-                display_vals.append(f'{curr_record["rate_mpsec"]*60:8.2f}')
+                display_vals.append(f"{curr_record['rate_mpsec'] * 60:8.2f}")
             else:
-                display_vals.append(f'{"":>8s}')
+                display_vals.append(f"{'':>8s}")
             display_vals.append(f"{eta_mins:>7s}")
-            display_vals.append(f'{curr_record["eta_time"]:>8s}')
+            display_vals.append(f"{curr_record['eta_time']:>8s}")
             display_vals.append(f"{direction:>8s}")
-            display_vals.append(f'{curr_record["lat"]:>14s}')
-            display_vals.append(f'{curr_record["lon"]:>14s}')
+            display_vals.append(f"{curr_record['lat']:>14s}")
+            display_vals.append(f"{curr_record['lon']:>14s}")
             try:
-                display_vals.append(f'{curr_record["cog"]:06.2f}')
-                display_vals.append(f'{curr_record["sogKt"]:5.1f}')
+                display_vals.append(f"{curr_record['cog']:06.2f}")
+                display_vals.append(f"{curr_record['sogKt']:5.1f}")
             except ValueError:
                 display_vals.extend([" " * 6, " " * 5])
             try:
-                display_vals.append(f'{curr_record["heading"]:06.2f}')
+                display_vals.append(f"{curr_record['heading']:06.2f}")
             except ValueError:
                 display_vals.append(" " * 6)
             print(", ".join(display_vals))
@@ -294,6 +354,30 @@ def main():
 
     except KeyboardInterrupt:
         print("*** Ranging survey ended. ***")
+    finally:
+        context.stop()
+        print(context.telemetry.report())
+        checkpointer.save(
+            session_state(timestamp_start, apriori_coord, obsvn_df, prev_record, clock)
+        )
+        print(f"Survey state saved to {checkpointer.filename}")
+
+
+def session_state(
+    timestamp_start: str,
+    apriori_coord: pd.Series,
+    obsvn_df: pd.DataFrame,
+    prev_record: dict,
+    clock: obsurv.ClockDiscipline,
+) -> dict:
+    """Return the survey session state to be checkpointed."""
+    return {
+        "timestamp_start": timestamp_start,
+        "apriori_coord": apriori_coord,
+        "obsvn_df": obsvn_df,
+        "prev_record": prev_record,
+        "clock": clock.get_state() if clock else None,
+    }
 
 
 def rect2pol(x_coord, y_coord):
@@ -0,0 +1,70 @@
+"""Build time index sidecar files for NMEA and EdgeTech replay files."""
+
+from argparse import ArgumentParser
+from pathlib import Path
+
+import ob_inst_survey as obsurv
+
+
+def main():
+    """Index each file specified and display its time span."""
+    # Retrieve CLI arguments.
+    helpdesc: str = (
+        "Builds a time index for each NMEA and EdgeTech text file specified, "
+        'saved alongside the file as "<filename>.idx". Replays starting at a '
+        "specified time (--replaystart) use the index to seek directly to "
+        "that time. Indexes are otherwise built when first needed, and "
+        "rebuilt automatically whenever the file changes. Directories and "
+        "quoted globs of rotated files are indexed file by file. Compressed "
+        "files (.gz, .bz2, .xz) are indexed for their dates and times, but "
+        "cannot be seeked directly: seeking decompresses the file from the "
+        "start, so replays of them gain no speed-up from the index."
+    )
+    parser = ArgumentParser(description=helpdesc)
+    parser.add_argument(
+        "--nmea",
+        help="NMEA text files to index.",
+        nargs="+",
+        default=[],
+        type=Path,
+    )
+    parser.add_argument(
+        "--range",
+        help="EdgeTech ranging text files to index.",
+        nargs="+",
+        default=[],
+        type=Path,
+    )
+    parser.add_argument(
+        "--indexinterval",
+        help="Seconds between index entries. Default: 60",
+        default=60,
+        type=float,
+    )
+    args = parser.parse_args()
+    if not (args.nmea or args.range):
+        parser.error("Specify at least one file to index with --nmea or --range.")
+
+    files = [
+        (filename, "nmea")
+        for source in args.nmea
+        for filename in obsurv.replay_files(source)
+    ]
+    files.extend(
+        (filename, "etech")
+        for source in args.range
+        for filename in obsurv.replay_files(source)
+    )
+    for filename, kind in files:
+        index = obsurv.replay_index(filename, kind, args.indexinterval, rebuild=True)
+        print(
+            f"{filename}: {index.first_timestamp} to {index.last_timestamp} "
+            f"(1900-01-01 is the first day), {len(index.entries)} entries, "
+            f"{len(index.rollovers)} day rollovers."
+        )
+        if obsurv.uncompressed_filename(filename) != filename:
+            print(f"{filename}: compressed, seeking reads from the start.")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,14 @@
 
 import sys
 from argparse import ArgumentParser
-from datetime import datetime, timezone
+from datetime import UTC, datetime
 from pathlib import Path
 from queue import Queue
 from time import sleep
 
 import ob_inst_survey as obsurv
 
-TIMESTAMP_START = datetime.now(timezone.utc).strftime("%Y-%m-%d_%H-%M")
+TIMESTAMP_START = datetime.now(UTC).strftime("%Y-%m-%d_%H-%M")
 DFLT_PREFIX = "edgetech"
 DFLT_PATH = Path.home() / "logs/edgetech/"
 
@@ -34,18 +34,22 @@ def main():
             obsurv.out_fileprefix_parser(DFLT_PREFIX),
             obsurv.ser_arg_parser(ser_param),
             obsurv.replayfile_parser(None),
+            obsurv.compress_parser(),
         ],
         description=helpdesc,
     )
     args = parser.parse_args()
     outfilepath: Path = args.outfilepath
-    outfilename: str = outfilepath / f"{args.outfileprefix}_{TIMESTAMP_START}.txt"
+    outfilename: Path = obsurv.compressed_filename(
+        outfilepath / f"{args.outfileprefix}_{TIMESTAMP_START}.txt", args.compress
+    )
     ser_param = obsurv.SerParam(
         port=args.serport,
         baud=args.serbaud,
         stop=args.serstop,
         parity=args.serparity,
         bytesize=args.serbytesize,
+        tx_correction=args.sertxcorrect,
     )
     replay_file: Path = args.replayfile
     replay_start: datetime = args.replaystart
@@ -57,31 +61,34 @@ def main():
 
     edgetech_q: Queue[str, datetime] = Queue()
     if replay_file:
-        obsurv.etech_replay_textfile(
+        stream = obsurv.etech_replay_textfile(
             filename=replay_file,
             edgetech_q=edgetech_q,
             spd_fctr=replay_speed,
             timestamp_start=replay_start,
         )
     else:
-        obsurv.etech_serial_stream(
+        stream = obsurv.etech_serial_stream(
             ser_conn=ser_param,
             edgetech_q=edgetech_q,
         )
 
     try:
-        while True:
-            sleep(0.001)  # Prevents idle loop from 100% CPU thread usage.
-            sentence, timestamp = get_next_sentence(edgetech_q)
-            if not sentence:
-                continue
-            timestamp = timestamp.strftime("%Y-%m-%dT%H-%M-%S.%f")
-            with open(outfilename, "a+", newline="", encoding="utf-8") as log_file:
+        with obsurv.LogWriter(outfilename) as log_file:
+            while True:
+                sleep(0.001)  # Prevents idle loop from 100% CPU thread usage.
+                sentence, timestamp = get_next_sentence(edgetech_q)
+                if not sentence:
+                    continue
+                timestamp = timestamp.strftime("%Y-%m-%dT%H-%M-%S.%f")
                 log_file.write(f"{timestamp} {sentence}\n")
                 print(sentence)
 
     except KeyboardInterrupt:
         sys.exit("*** End EdgeTech Logging ***")
+    finally:
+        stream.stop()
+        stream.join(timeout=2)
 
 
 def get_next_sentence(edgetech_q: Queue) -> str:
@@ -2,7 +2,8 @@
 
 import sys
 from argparse import ArgumentParser
-from datetime import datetime, timedelta, timezone
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 from queue import Queue
 from time import sleep
@@ -33,6 +34,7 @@ def main():
             obsurv.out_fileprefix_parser(DFLT_PREFIX),
             obsurv.ip_arg_parser(ip_param),
             obsurv.file_split_parser(),
+            obsurv.compress_parser(),
             obsurv.replayfile_parser(None),
         ],
         description=helpdesc,
@@ -51,7 +53,16 @@ def main():
         addr=args.ipaddr,
         prot=args.ipprot,
         buffer=args.ipbuffer,
+        rcvbuf=args.iprcvbuf,
+        sentences=args.nmeatypes,
+        talkers=args.nmeatalkers,
+        group=args.ipgroup,
+        label=args.iplabel,
+        outage=args.ipoutage,
     )
+    ip_params = [ip_param]
+    for port, label in args.addipport:
+        ip_params.append(replace(ip_param, port=int(port), label=label))
     file_split_hours: int = args.filesplit
     last_file_split = 0
     replay_file: Path = args.replayfile
@@ -65,18 +76,19 @@ def main():
 
     nmea_q: Queue[str] = Queue()
     if replay_file:
-        obsurv.nmea_replay_textfile(
+        stream = obsurv.nmea_replay_textfile(
             filename=replay_file,
             nmea_q=nmea_q,
             spd_fctr=replay_speed,
             timestamp_start=replay_start,
         )
     else:
-        obsurv.nmea_ip_stream(
-            ip_conn=ip_param,
+        stream = obsurv.nmea_ip_stream(
+            ip_conn=ip_params,
             nmea_q=nmea_q,
         )
 
+    nmea_log: obsurv.LogWriter = None
     try:
         count_no_time = 0
         while True:
@@ -100,7 +112,7 @@ def main():
                     if count_no_time > 5:
                         # Use system time to name file if NMEA has no time
                         # stamp after 6 sentences.
-                        nmea_time = datetime.now(timezone.utc)
+                        nmea_time = datetime.now(UTC)
                     else:
                         continue
 
@@ -113,21 +125,31 @@ def main():
                 curr_file_split = int(nmea_time.timestamp() / (file_split_hours * 3600))
                 if curr_file_split > last_file_split:
                     file_timestamp = nmea_time.strftime("%Y-%m-%d_%H-%M")
-                    outfilename = outfilepath / f"{outfileprefix}_{file_timestamp}.txt"
+                    outfilename = obsurv.compressed_filename(
+                        outfilepath / f"{outfileprefix}_{file_timestamp}.txt",
+                        args.compress,
+                    )
+                    if nmea_log:
+                        nmea_log.close()
+                    nmea_log = obsurv.LogWriter(outfilename)
                     last_file_split = curr_file_split
 
-            with open(outfilename, "a+", newline="", encoding="utf-8") as nmea_file:
-                nmea_file.write(f"{sentence}\n")
-                print(sentence)
+            nmea_log.write(f"{sentence}\n")
+            print(sentence)
 
     except KeyboardInterrupt:
         sys.exit("*** End NMEA Logging ***")
+    finally:
+        stream.stop()
+        stream.join(timeout=2)
+        if nmea_log:
+            nmea_log.close()
 
 
 def log_invalid_nmea_str(outfilepath, nmea_sentence, message):
     """Write an invalid NMEA sentence to a log file."""
     logfilename = outfilepath / "invalid_nmea_log.txt"
-    sys_time = datetime.now(timezone.utc)
+    sys_time = datetime.now(UTC)
     time_str = sys_time.strftime("%Y-%m-%d_%H-%M-%S")
     with open(logfilename, "a+", newline="", encoding="utf-8") as nmea_log_file:
         nmea_log_file.write(f"{time_str}:- {message}\n")
@@ -140,6 +162,9 @@ def get_next_sentence(nmea_q: Queue) -> str:
     if nmea_q.empty():
         return None
     nmea_str = nmea_q.get(block=False)
+    if isinstance(nmea_str, tuple):
+        # Sentence from one of several sources.
+        nmea_str = nmea_str[0]
     if nmea_str in ["TimeoutError", "EOF"]:
         sys.exit(f"*** NMEA: {nmea_str} ***")
     return nmea_str
@@ -154,7 +179,7 @@ def time_from_nmea(sentence: str) -> datetime:
     except ValueError:
         # This NMEA sentence does not contain a time field.
         return 0
-    sys_time = datetime.now(timezone.utc)
+    sys_time = datetime.now(UTC)
     sys_yr = sys_time.year
     sys_mth = sys_time.month
     sys_day = sys_time.day
@@ -163,7 +188,7 @@ def time_from_nmea(sentence: str) -> datetime:
         nmea_time = datetime(sys_yr, sys_mth, sys_day, nmea_hr, nmea_min, nmea_sec)
     except ValueError:
         return "invalid_time"
-    nmea_time = nmea_time.replace(tzinfo=timezone.utc)
+    nmea_time = nmea_time.replace(tzinfo=UTC)
     if nmea_hr == 0 and sys_hr == 23:
         nmea_time += timedelta(days=1)
     if nmea_hr == 23 and sys_hr == 0:
@@ -1,25 +1,77 @@
 """Init file for ob_inst_survey package."""
 
-from .etech_replay_textfile import etech_replay_textfile
-from .etech_serial_stream import SerParam, etech_serial_stream
-from .nmea_checksum import nmea_checksum
-from .nmea_ip_stream import IpParam, nmea_ip_stream
-from .nmea_replay_textfile import nmea_replay_textfile
+from .checkpoint import Checkpointer, load_checkpoint, save_checkpoint
+from .clock_discipline import ClockDiscipline
+from .compressed_io import (
+    LogWriter,
+    compressed_filename,
+    open_logfile,
+    uncompressed_filename,
+)
+from .stream_handle import StreamHandle, StreamStats
+from .parse_cache import (
+    cached_lines,
+    cached_table,
+    caching_lines,
+    evict_cache,
+    load_cached_table,
+    save_cached_table,
+)
+from .stream_telemetry import StreamTelemetry
+from .survey_context import SurveyContext
+from .replay_sources import (
+    date_from_filename,
+    file_timestamp,
+    read_replay_files,
+    replay_files,
+)
+from .replay_index import (
+    ReplayIndex,
+    build_replay_index,
+    index_filename,
+    replay_index,
+)
+from .etech_replay_textfile import (
+    etech_replay_textfile,
+    parse_etech_timestamp,
+    read_etech_textfile,
+)
+from .etech_serial_stream import SerParam, SerialLineReader, etech_serial_stream
+from .etech_command import EtechCommander
+from .etech_simulator import DeckboxSimulator, SimGeometry, SimParam, read_scenario
+from .nmea_checksum import nmea_checksum, nmea_checksum_block, nmea_checksum_file
+from .nmea_fix import FIX_QUALITY, FixParser, FixRecord
+from .nmea_ip_stream import IpParam, NmeaFramer, nmea_failover_stream, nmea_ip_stream
+from .nmea_replay_textfile import nmea_replay_textfile, read_nmea_textfile
+from .replay_engine import replay_merged_textfiles
+from .capture_process import RingBuffer, capture_process_stream
+from .obsvn_router import ObsvnRouter, StationParam, read_station_file
 from .plot_trilateration import init_plot_trilateration, plot_trilateration
-from .ranging_surv_stream import EtechParam, ranging_survey_stream
+from .ranging_surv_stream import OBSVN_COLS, EtechParam, ranging_survey_stream
+from .obsvn_convert import convert_raw_logs, read_fix_table, read_range_table
 from .std_arg_parsers import (
     apriori_coord_parser,
+    capture_proc_parser,
+    clock_sync_parser,
+    compress_parser,
     edgetech_arg_parser,
+    etech_command_parser,
     file_split_parser,
     ip_arg_parser,
     lograw_parser,
+    nmea_failover_parser,
     obsfile_parser,
     out_filepath_parser,
     out_fileprefix_parser,
     replay2files_parser,
     replayfile_parser,
+    resume_parser,
     ser_arg_parser,
+    stall_timeout_parser,
+    station_file_parser,
     options_parser,
     parse_cli_datetime,
 )
+from .solver_worker import SolverWorker
+from .station_survey import StationSurvey
 from .trilateration import trilateration
@@ -0,0 +1,243 @@
+"""Capture NMEA and EdgeTech streams in a separate process.
+
+In the realtime scripts the capture threads share the GIL with trilateration,
+pandas and plotting, so a heavy solve or redraw can delay the moment a deckbox
+response or NMEA sentence is timestamped. In capture-process mode a small
+separate process reads the serial ports and socket, timestamps each line as it
+is received, and writes it as a fixed-size record into a shared memory ring
+buffer. A thread in the main process reads the records directly from shared
+memory and populates the usual NMEA and EdgeTech queues, with the timestamps
+from the capture process.
+
+Each record contains a sequence number, the timestamp (POSIX seconds), the
+source ID, the payload length and the payload bytes. Source IDs are the index
+of each NMEA source, followed by those of the EdgeTech sources (ie the nth
+EdgeTech source of k NMEA sources is k + n - 1).
+"""
+
+from datetime import UTC, datetime
+from multiprocessing import Event, Process
+from multiprocessing.shared_memory import SharedMemory
+from queue import Queue
+from time import sleep
+
+import numpy as np
+
+import ob_inst_survey as obsurv
+
+PAYLOAD_SIZE = 238  # Maximum bytes of a line. NMEA sentences are <= 82 bytes.
+RECORD_DTYPE = np.dtype(
+    [
+        ("seq", "<u8"),
+        ("timestamp", "<f8"),
+        ("source", "<u2"),
+        ("length", "<u2"),
+        ("payload", f"S{PAYLOAD_SIZE}"),
+    ]
+)
+HEADER_DTYPE = np.dtype("<u8")  # Number of records written.
+
+
+class RingBuffer:
+    """Single writer, single reader ring buffer of records in shared memory."""
+
+    def __init__(self, capacity: int = 4096, name: str = None):
+        """Create a new ring buffer, or attach to an existing one by name.
+
+        Args:
+            capacity (int, optional): Number of records. Defaults to 4096.
+            name (str, optional): Name of existing shared memory to attach
+                to. Defaults to None, which creates new shared memory.
+        """
+        self.capacity = capacity
+        size = HEADER_DTYPE.itemsize + capacity * RECORD_DTYPE.itemsize
+        self._owner = name is None
+        self.shm = SharedMemory(name=name, create=self._owner, size=size)
+        self.name = self.shm.name
+        self._count = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=self.shm.buf)
+        self._records = np.ndarray(
+            (capacity,),
+            dtype=RECORD_DTYPE,
+            buffer=self.shm.buf,
+            offset=HEADER_DTYPE.itemsize,
+        )
+        if self._owner:
+            self._count[0] = 0
+            self._records["seq"] = 0
+        self._next_read = int(self._count[0])
+        self.lost = 0  # Records overwritten before they were read.
+
+    def write(self, source: int, timestamp: float, payload: bytes):
+        """Write a record, overwriting the oldest if the buffer is full."""
+        count = int(self._count[0])
+        record = self._records[count % self.capacity]
+        record["seq"] = 0  # Mark record as being written.
+        record["timestamp"] = timestamp
+        record["source"] = source
+        record["length"] = min(len(payload), PAYLOAD_SIZE)
+        record["payload"] = payload[:PAYLOAD_SIZE]
+        record["seq"] = count + 1
+        self._count[0] = count + 1
+
+    def read(self) -> list[tuple[int, float, bytes]]:
+        """Return (source, timestamp, payload) for each unread record."""
+        count = int(self._count[0])
+        if count - self._next_read > self.capacity:
+            self.lost += count - self._next_read - self.capacity
+            self._next_read = count - self.capacity
+        records = []
+        for seq in range(self._next_read + 1, count + 1):
+            record = self._records[(seq - 1) % self.capacity]
+            if record["seq"] != seq:
+                self.lost += 1
+                continue
+            item = (
+                int(record["source"]),
+                float(record["timestamp"]),
+                record["payload"][: record["length"]],
+            )
+            # Discard if overwritten by the writer while being read.
+            if record["seq"] != seq:
+                self.lost += 1
+                continue
+            records.append(item)
+        self._next_read = count
+        return records
+
+    def close(self):
+        """Release the shared memory (and destroy it if this is the owner)."""
+        del self._count, self._records
+        self.shm.close()
+        if self._owner:
+            self.shm.unlink()
+
+
+def capture_process_stream(
+    nmea_conn: obsurv.IpParam | list[obsurv.IpParam],
+    nmea_q: Queue,
+    etech_conn: list[obsurv.SerParam],
+    edgetech_qs: list[Queue],
+    capacity: int = 4096,
+    etech_stats: list[obsurv.StreamStats] = None,
+) -> obsurv.StreamHandle:
+    """Initiate NMEA and EdgeTech queues populated by a capture process.
+
+    Items placed in nmea_q are tuples of (sentence, datetime received, source
+    label), and those placed in each of edgetech_qs are tuples of (response,
+    datetime received), in the same order as etech_conn.
+
+    Args:
+        nmea_conn (obsurv.IpParam | list[obsurv.IpParam]): NMEA connection
+            parameters, of one or more sources.
+        nmea_q (Queue): Queue to be populated with NMEA sentences.
+        etech_conn (list[obsurv.SerParam]): EdgeTech serial connections.
+        edgetech_qs (list[Queue]): Queue for each EdgeTech connection.
+        capacity (int, optional): Records of the ring buffer. Defaults to 4096.
+        etech_stats (list[obsurv.StreamStats], optional): Counters for each
+            EdgeTech source. Defaults to new StreamStats.
+
+    Returns:
+        obsurv.StreamHandle: Handle which may be used to stop the capture
+            process, whose stats count the NMEA sentences.
+    """
+    if not isinstance(nmea_conn, (list, tuple)):
+        nmea_conn = [nmea_conn]
+    if etech_stats is None:
+        etech_stats = [obsurv.StreamStats() for _ in etech_conn]
+    return obsurv.StreamHandle(
+        name="Capture process",
+        target=_read_ring_buffer,
+        args=(nmea_conn, nmea_q, etech_conn, edgetech_qs, capacity, etech_stats),
+    ).start()
+
+
+def _read_ring_buffer(
+    handle: obsurv.StreamHandle,
+    nmea_conn: list[obsurv.IpParam],
+    nmea_q: Queue,
+    etech_conn: list[obsurv.SerParam],
+    edgetech_qs: list[Queue],
+    capacity: int,
+    etech_stats: list[obsurv.StreamStats],
+):
+    """Start the capture process and distribute its records to the queues."""
+    ring = RingBuffer(capacity)
+    stop_event = Event()
+    capture = Process(
+        target=_capture_loop,
+        args=(ring.name, capacity, nmea_conn, etech_conn, stop_event),
+        daemon=True,
+    )
+    capture.start()
+    lost_notified = 0
+    try:
+        while not handle.stopped:
+            records = ring.read()
+            if not records:
+                if not capture.is_alive():
+                    print("*** Capture process has ended. ***")
+                    return
+                handle.wait(0.001)
+                continue
+            for source, timestamp, payload in records:
+                line = payload.decode("utf-8", errors="replace")
+                received = datetime.fromtimestamp(timestamp, UTC)
+                if source < len(nmea_conn):
+                    nmea_q.put((line, received, nmea_conn[source].label))
+                    handle.stats.record(len(payload))
+                else:
+                    etech_idx = source - len(nmea_conn)
+                    edgetech_qs[etech_idx].put((line, received))
+                    etech_stats[etech_idx].record(len(payload))
+            if ring.lost > lost_notified:
+                print(f"!!! Capture ring buffer overrun, {ring.lost} lines lost.")
+                lost_notified = ring.lost
+    finally:
+        stop_event.set()
+        capture.join(timeout=2)
+        if capture.is_alive():
+            capture.terminate()
+        ring.close()
+
+
+def _capture_loop(
+    ring_name: str,
+    capacity: int,
+    nmea_conn: list[obsurv.IpParam],
+    etech_conn: list[obsurv.SerParam],
+    stop_event: Event,
+):
+    """Receive streams and write each line to the ring buffer (capture process)."""
+    ring = RingBuffer(capacity, name=ring_name)
+    nmea_q: Queue[tuple[str, datetime, str]] = Queue()
+    edgetech_qs = [Queue() for _ in etech_conn]
+    # Sentences are tagged with their source, to be written with its ID.
+    handles = [obsurv.nmea_ip_stream(nmea_conn, nmea_q, tag_source=True)]
+    nmea_ids = {}
+    for source, conn in enumerate(nmea_conn):
+        nmea_ids.setdefault(conn.label, source)
+    for conn, edgetech_q in zip(etech_conn, edgetech_qs, strict=True):
+        handles.append(obsurv.etech_serial_stream(conn, edgetech_q))
+
+    try:
+        while not stop_event.is_set():
+            idle = True
+            while not nmea_q.empty():
+                sentence, received, label = nmea_q.get()
+                ring.write(
+                    nmea_ids.get(label, 0),
+                    received.timestamp(),
+                    sentence.encode("utf-8"),
+                )
+                idle = False
+            for source, edgetech_q in enumerate(edgetech_qs, start=len(nmea_conn)):
+                while not edgetech_q.empty():
+                    response, received = edgetech_q.get()
+                    ring.write(source, received.timestamp(), response.encode("utf-8"))
+                    idle = False
+            if idle:
+                sleep(0.0005)
+    finally:
+        for stream in handles:
+            stream.stop()
+        ring.close()
@@ -0,0 +1,74 @@
+"""Save and restore the state of a realtime survey session.
+
+The session state (observations, outlier flags, current solution, apriori
+coordinate, clock offset, etc) is periodically saved to a checkpoint file, so
+that if the survey is interrupted it can be resumed without losing accumulated
+observations and without re-parsing raw log files.
+
+The checkpoint is written to a temporary file which then atomically replaces
+the previous checkpoint, so a crash while saving can never leave a corrupt
+checkpoint.
+"""
+
+import os
+import pickle
+import sys
+from pathlib import Path
+from time import monotonic
+
+CHECKPOINT_VERSION = 1
+
+
+class Checkpointer:
+    """Periodically save session state to a checkpoint file."""
+
+    def __init__(self, filename: Path, interval: float = 10.0):
+        """Initialise the checkpointer.
+
+        Args:
+            filename (Path): Full path and filename of the checkpoint file.
+            interval (float, optional): Minimum number of seconds between
+                checkpoints. Defaults to 10.
+        """
+        self.filename = Path(filename)
+        self.interval = interval
+        self._last_save = monotonic()
+
+    def due(self) -> bool:
+        """Return True if the interval since the last checkpoint has elapsed."""
+        return monotonic() - self._last_save >= self.interval
+
+    def save(self, state: dict):
+        """Save the session state to the checkpoint file."""
+        save_checkpoint(self.filename, state)
+        self._last_save = monotonic()
+
+
+def save_checkpoint(filename: Path, state: dict):
+    """Atomically write session state to a checkpoint file."""
+    filename = Path(filename)
+    tmp_filename = filename.with_name(f"{filename.name}.tmp")
+    with open(tmp_filename, "wb") as tmp_file:
+        pickle.dump(
+            {"version": CHECKPOINT_VERSION, **state},
+            tmp_file,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        tmp_file.flush()
+        os.fsync(tmp_file.fileno())
+    os.replace(tmp_filename, filename)
+
+
+def load_checkpoint(filename: Path) -> dict:
+    """Load session state previously saved to a checkpoint file."""
+    try:
+        with open(filename, "rb") as checkpoint_file:
+            state = pickle.load(checkpoint_file)
+    except FileNotFoundError:
+        sys.exit(f"Checkpoint file '{filename}' does not exist!")
+    if state.get("version") != CHECKPOINT_VERSION:
+        sys.exit(
+            f"Checkpoint file '{filename}' is version {state.get('version')}, "
+            f"expected version {CHECKPOINT_VERSION}."
+        )
+    return state
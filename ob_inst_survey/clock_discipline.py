@@ -0,0 +1,121 @@
+"""Estimate the offset and drift of the PC clock relative to NMEA (GNSS) time.
+
+Each NMEA fix provides a pair of (PC arrival time, NMEA time). A robust
+(Theil-Sen) linear regression over a sliding window of these pairs gives the
+current offset and drift of the PC clock, which can then be used to correct
+the PC timestamps applied to EdgeTech deckbox responses.
+"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from threading import Lock
+
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class ClockDiscipline:
+    """Continuously estimate the PC-to-NMEA clock offset and drift."""
+
+    def __init__(self, window: int = 120, min_samples: int = 10):
+        """Initialise the clock discipline.
+
+        Args:
+            window (int, optional): Number of most recent NMEA fixes used in the
+                regression. Defaults to 120.
+            min_samples (int, optional): Number of fixes required before a
+                correction will be applied. Defaults to 10.
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._pc_secs = deque(maxlen=window)
+        self._offsets = deque(maxlen=window)
+        self._lock = Lock()
+        self._fit = None  # (pc_ref, offset_at_ref, drift)
+        self._generation = 0  # Incremented each time the samples change.
+
+    @property
+    def ready(self) -> bool:
+        """True if enough samples have been received to apply a correction."""
+        return len(self._offsets) >= self.min_samples
+
+    def update(self, pc_time: datetime, nmea_time: datetime):
+        """Add a new (PC time, NMEA time) pair to the sliding window."""
+        pc_secs = _to_secs(pc_time)
+        with self._lock:
+            self._pc_secs.append(pc_secs)
+            self._offsets.append(_to_secs(nmea_time) - pc_secs)
+            self._fit = None
+            self._generation += 1
+
+    def offset(self, pc_time: datetime) -> timedelta:
+        """Return the estimated offset (NMEA - PC) at the specified PC time."""
+        fit = self._get_fit()
+        if fit is None:
+            return timedelta(0)
+        pc_ref, offset_ref, drift = fit
+        secs = offset_ref + drift * (_to_secs(pc_time) - pc_ref)
+        return timedelta(seconds=secs)
+
+    def correct(self, pc_time: datetime) -> datetime:
+        """Return the PC time corrected to NMEA time."""
+        return pc_time + self.offset(pc_time)
+
+    def drift_ppm(self) -> float:
+        """Return the estimated drift of the PC clock in parts per million."""
+        fit = self._get_fit()
+        if fit is None:
+            return 0.0
+        return fit[2] * 1e6
+
+    def get_state(self) -> dict:
+        """Return the sliding window samples so they may be saved."""
+        with self._lock:
+            return {
+                "pc_secs": list(self._pc_secs),
+                "offsets": list(self._offsets),
+            }
+
+    def set_state(self, state: dict):
+        """Restore sliding window samples previously returned by get_state()."""
+        with self._lock:
+            self._pc_secs.clear()
+            self._offsets.clear()
+            self._pc_secs.extend(state["pc_secs"])
+            self._offsets.extend(state["offsets"])
+            self._fit = None
+            self._generation += 1
+
+    def _get_fit(self):
+        """Theil-Sen regression of offset against PC time (refit lazily)."""
+        with self._lock:
+            if not self.ready:
+                return None
+            if self._fit is not None:
+                return self._fit
+            generation = self._generation
+            pc_secs = np.fromiter(self._pc_secs, dtype=float)
+            offsets = np.fromiter(self._offsets, dtype=float)
+
+        pc_ref = pc_secs[-1]
+        x_vals = pc_secs - pc_ref
+        idx_i, idx_j = np.triu_indices(len(x_vals), k=1)
+        x_diff = x_vals[idx_j] - x_vals[idx_i]
+        valid = x_diff > 0
+        if valid.any():
+            drift = np.median((offsets[idx_j] - offsets[idx_i])[valid] / x_diff[valid])
+        else:
+            drift = 0.0
+        offset_ref = np.median(offsets - drift * x_vals)
+
+        fit = (pc_ref, float(offset_ref), float(drift))
+        with self._lock:
+            if generation == self._generation:
+                self._fit = fit
+        return fit
+
+
+def _to_secs(timestamp: datetime) -> float:
+    """Seconds since epoch, treating naive datetimes as UTC."""
+    return (timestamp.replace(tzinfo=None) - EPOCH).total_seconds()
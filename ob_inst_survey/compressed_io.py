@@ -0,0 +1,113 @@
+"""Read and write log files that may be gzip, bzip2 or xz compressed.
+
+Files are compressed or decompressed transparently according to the suffix of
+their filename (".gz", ".bz2" or ".xz"), so archived logs may be replayed and
+reprocessed without first being decompressed.
+
+LogWriter appends lines to a log. A compressed log is written as a series of
+compressed streams, each ended every flush_interval seconds, so that if
+logging ends unexpectedly all but the last few seconds may still be read.
+Readers of all three formats read such files as a single stream.
+"""
+
+import bz2
+import gzip
+import lzma
+from pathlib import Path
+from time import monotonic
+from typing import IO
+
+COMPRESSORS = {".gz": gzip, ".bz2": bz2, ".xz": lzma}
+FLUSH_INTERVAL = 60.0  # Seconds between ends of compressed streams.
+
+
+def open_logfile(
+    filename: Path,
+    mode: str = "rt",
+    encoding: str = "utf-8",
+    newline: str = None,
+) -> IO:
+    """Open a log file, compressed according to the suffix of its filename.
+
+    Args:
+        filename (Path): Log file.
+        mode (str, optional): As for open(), eg "rb" or "a". Defaults to "rt".
+        encoding (str, optional): Encoding of text modes. Defaults to "utf-8".
+        newline (str, optional): As for open(), for text modes. Defaults to
+            None.
+    """
+    compressor = COMPRESSORS.get(Path(filename).suffix.lower())
+    if "b" in mode:
+        if compressor:
+            return compressor.open(filename, mode)
+        return open(filename, mode)
+    if compressor:
+        mode = mode if "t" in mode else f"{mode}t"
+        return compressor.open(filename, mode, encoding=encoding, newline=newline)
+    return open(filename, mode, encoding=encoding, newline=newline)
+
+
+def compressed_filename(filename: Path, compression: str = None) -> Path:
+    """Returns filename with the suffix of the compression (eg "gz") appended."""
+    filename = Path(filename)
+    if not compression:
+        return filename
+    return filename.with_name(f"{filename.name}.{compression}")
+
+
+def uncompressed_filename(filename: Path) -> Path:
+    """Returns filename without the suffix of any compression."""
+    filename = Path(filename)
+    if filename.suffix.lower() in COMPRESSORS:
+        return filename.with_suffix("")
+    return filename
+
+
+class LogWriter:
+    """Append text to a log file, optionally compressed.
+
+    The file is opened on the first write. Uncompressed logs are flushed after
+    each write, compressed logs every flush_interval seconds.
+    """
+
+    def __init__(self, filename: Path, flush_interval: float = FLUSH_INTERVAL):
+        """Initialise the writer (the file is not yet opened).
+
+        Args:
+            filename (Path): Log file, compressed if its suffix is ".gz",
+                ".bz2" or ".xz".
+            flush_interval (float, optional): Seconds between ends of the
+                compressed streams of a compressed log. Defaults to
+                FLUSH_INTERVAL.
+        """
+        self.filename = Path(filename)
+        self.flush_interval = flush_interval
+        self.compressed = self.filename.suffix.lower() in COMPRESSORS
+        self._file: IO = None
+        self._next_flush: float = None
+
+    def __enter__(self):
+        """Return the writer for use in a with statement."""
+        return self
+
+    def __exit__(self, *exc):
+        """Close the log at the end of a with statement."""
+        self.close()
+
+    def write(self, text: str):
+        """Append text to the log."""
+        if self._file is None:
+            self._file = open_logfile(self.filename, "a", newline="")
+            self._next_flush = monotonic() + self.flush_interval
+        self._file.write(text)
+        if not self.compressed:
+            self._file.flush()
+        elif monotonic() >= self._next_flush:
+            # End the compressed stream. The next write starts another.
+            self.close()
+
+    def close(self):
+        """Close the log (it is reopened by the next write)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,257 @@
+"""Send scheduled commands to an EdgeTech 8011M deckbox in host mode.
+
+EtechCommander runs a thread that owns the deckbox serial port. Commands are
+sent in order of when they are due, each written one character at a time with
+a configurable delay between characters, as the deckbox does not reliably
+receive characters sent back to back. A command is complete when the deckbox
+replies with a line ending in a prompt ("*" success, "#" error, "S" range
+received), which may follow echoed text, or when its timeout expires, and only
+then is the next command sent. Commands may be repeated at an interval, eg for
+unattended range interrogations.
+
+Responses are read as they arrive without blocking the sending of commands.
+Each "RNG:" response is put in edgetech_q as a tuple of (response, datetime of
+first byte), as by etech_serial_stream(), so automated ranging may feed a
+ranging survey directly. The prompt and all lines received in reply to each
+command are put in the responses queue.
+"""
+
+import heapq
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from itertools import count
+from pathlib import Path
+from queue import Queue
+from threading import Lock
+from time import monotonic, sleep
+
+from serial import Serial
+
+import ob_inst_survey as obsurv
+
+PROMPTS = ("*", "#", "S")
+RANGE_MARGIN = 0.5  # Seconds after the upper range gate to wait for a reply.
+CHAR_DELAY = 0.001  # Seconds between characters of a command.
+POLL_INTERVAL = 0.01  # Maximum seconds to wait for a response to be received.
+LISTEN_DOTS = 9  # Dots indicating the deckbox is listening for a BACS command.
+
+
+@dataclass(order=True)
+class _ScheduledCommand:
+    """A command waiting in the schedule."""
+
+    due: float  # time.monotonic() when the command is due to be sent.
+    seq: int  # Preserves order of commands due at the same time.
+    command: str = field(compare=False)
+    interval: float = field(compare=False, default=None)  # Repeat interval.
+    timeout: float = field(compare=False, default=1.0)  # Seconds to wait for reply.
+
+
+class EtechCommander:
+    """Send scheduled commands to an EdgeTech deckbox and parse its responses."""
+
+    def __init__(
+        self,
+        ser_conn: obsurv.SerParam,
+        edgetech_q: Queue = None,
+        char_delay: float = CHAR_DELAY,
+        logfile: Path = None,
+        echo: bool = False,
+    ):
+        """Initialise the commander (the serial port is opened by start()).
+
+        Args:
+            ser_conn (obsurv.SerParam): Serial connection parameters.
+            edgetech_q (Queue, optional): Queue for "RNG:" responses.
+                Defaults to None.
+            char_delay (float, optional): Seconds between characters of a
+                command. Defaults to CHAR_DELAY.
+            logfile (Path, optional): Text file to which each command and
+                response is appended with a timestamp, compressed if its
+                suffix is ".gz", ".bz2" or ".xz". Defaults to None.
+            echo (bool, optional): Print each command and response. Defaults
+                to False.
+        """
+        self.ser_conn = ser_conn
+        self.edgetech_q = edgetech_q
+        self.char_delay = char_delay
+        self.logfile = logfile
+        self._log_writer = obsurv.LogWriter(logfile) if logfile else None
+        self.echo = echo
+        self.responses: Queue[tuple[str, str, list[str]]] = Queue()
+        self.handle: obsurv.StreamHandle = None
+        self._schedule: list[_ScheduledCommand] = []
+        self._lock = Lock()
+        self._seq = count()
+
+    def start(self) -> obsurv.StreamHandle:
+        """Open the serial port and start sending commands in a background thread.
+
+        Returns a StreamHandle for stopping the commander, whose stats count
+        the lines received.
+        """
+        self.handle = obsurv.StreamHandle(
+            name=f"EdgeTech commands {self.ser_conn.port}", target=self._run
+        ).start()
+        return self.handle
+
+    def schedule(
+        self,
+        command: str,
+        interval: float = None,
+        delay: float = 0.0,
+        timeout: float = 1.0,
+    ):
+        """Schedule a command.
+
+        Args:
+            command (str): Command, without terminator. An empty command
+                (<CR> only) puts the deckbox in host mode.
+            interval (float, optional): Repeat the command this many seconds
+                after each is sent, or as soon as the previous reply if that
+                is later (0 for as soon as possible). Defaults to None (once).
+            delay (float, optional): Seconds until first sent. Defaults to 0.
+            timeout (float, optional): Seconds to wait for a reply. Defaults
+                to 1.
+        """
+        with self._lock:
+            heapq.heappush(
+                self._schedule,
+                _ScheduledCommand(
+                    monotonic() + delay,
+                    next(self._seq),
+                    command.strip().upper(),
+                    interval,
+                    timeout,
+                ),
+            )
+
+    def send(self, command: str, timeout: float = 1.0):
+        """Send a command once, after any that are already due."""
+        self.schedule(command, timeout=timeout)
+
+    def schedule_ranging(
+        self,
+        range_command: str,
+        interval: float = 0.0,
+        upper_gate: int = 3500,
+    ):
+        """Put the deckbox in host mode and interrogate repeatedly.
+
+        Each interrogation waits for the reply, or for the upper range gate
+        to expire, so with an interval of 0 ranges are obtained as fast as
+        the acoustic geometry allows.
+
+        Args:
+            range_command (str): Host mode command that interrogates the
+                transponder, as configured for the deckbox and transponder.
+            interval (float, optional): Minimum seconds between
+                interrogations. Defaults to 0.
+            upper_gate (int, optional): Upper range gate (ms). Defaults to
+                3500.
+        """
+        self.send("", timeout=0.5)
+        self.send(f"UG{upper_gate:05d}")
+        self.schedule(
+            range_command,
+            interval=interval,
+            timeout=upper_gate / 1000 + RANGE_MARGIN,
+        )
+
+    def cancel(self):
+        """Remove all scheduled commands."""
+        with self._lock:
+            self._schedule.clear()
+
+    def _next_due(self, now: float) -> _ScheduledCommand:
+        with self._lock:
+            if self._schedule and self._schedule[0].due <= now:
+                return heapq.heappop(self._schedule)
+        return None
+
+    def _run(self, handle: obsurv.StreamHandle):
+        try:
+            self._command_loop(handle)
+        finally:
+            if self._log_writer:
+                self._log_writer.close()
+
+    def _command_loop(self, handle: obsurv.StreamHandle):
+        with Serial(
+            port=self.ser_conn.port,
+            baudrate=self.ser_conn.baud,
+            parity=self.ser_conn.parity,
+            stopbits=self.ser_conn.stop,
+            bytesize=self.ser_conn.bytesize,
+            timeout=POLL_INTERVAL,
+        ) as ser:
+            print(
+                f"Connected to EdgeTech deckbox: {ser.portstr} at {ser.baudrate} baud."
+            )
+            reader = obsurv.SerialLineReader(
+                ser, tx_correction=self.ser_conn.tx_correction
+            )
+            current: _ScheduledCommand = None
+            output = b""  # Characters of the current command still to be sent.
+            next_char = 0.0
+            deadline = None
+            sent_time = None
+            reply: list[str] = []
+            dots = 0
+
+            while not handle.stopped:
+                now = monotonic()
+                if current is None:
+                    current = self._next_due(now)
+                    if current:
+                        output = f"{current.command}\r".encode("ascii")
+                        reply, dots = [], 0
+                        self._log(f"Command: {current.command}")
+                if output and now >= next_char:
+                    ser.write(output[:1])
+                    output = output[1:]
+                    next_char = now + self.char_delay
+                    if not output:
+                        sent_time = now
+                        deadline = now + current.timeout
+                if output and not ser.in_waiting:
+                    sleep(max(next_char - monotonic(), 0))
+                    continue
+
+                flag = None
+                for line, received in reader.read_lines():
+                    text = line.decode("UTF-8", errors="replace").strip()
+                    if not text:
+                        continue
+                    handle.stats.record(len(line))
+                    self._log(text, received)
+                    if text.startswith("RNG:") and self.edgetech_q is not None:
+                        self.edgetech_q.put((text, received))
+                    if current is None or output:
+                        continue
+                    reply.append(text)
+                    dots = dots + len(text) if set(text) == {"."} else 0
+                    if text.endswith(PROMPTS):
+                        flag = text[-1]
+                    elif dots >= LISTEN_DOTS:
+                        ser.write(b" ")  # Cancel listening for BACS command.
+                        flag = "."
+
+                if current and not output and (flag or monotonic() > deadline):
+                    # "T" if the timeout expired with no prompt.
+                    self.responses.put((current.command, flag or "T", reply))
+                    if current.interval is not None:
+                        current.due = max(sent_time + current.interval, monotonic())
+                        current.seq = next(self._seq)
+                        with self._lock:
+                            heapq.heappush(self._schedule, current)
+                    current = None
+
+    def _log(self, text: str, timestamp: datetime = None):
+        timestamp = timestamp or datetime.now(UTC)
+        if self.echo:
+            print(text)
+        if self._log_writer:
+            self._log_writer.write(
+                f"{timestamp.strftime('%Y-%m-%dT%H-%M-%S.%f')} {text}\n"
+            )
@@ -1,10 +1,14 @@
 """Simulates a serial stream from a saved EdgeTech deckbox streamed text file."""
 
 import re
-from datetime import datetime, timedelta, timezone
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
 from queue import Queue
-from threading import Thread
-from time import sleep
+from typing import BinaryIO
+
+import ob_inst_survey as obsurv
+
+PARSER_VERSION = 1  # Version of the cached responses of each file.
 
 
 def etech_replay_textfile(
@@ -14,9 +18,20 @@ def etech_replay_textfile(
     timestamp_start: datetime = None,
     spd_fctr: int = 1,
     timestamp_offset: int = 0,
-):
-    """Initiate a queue simulating an EdgeTech data stream from a text file."""
-    Thread(
+    context: obsurv.SurveyContext = None,
+) -> obsurv.StreamHandle:
+    """Initiate a queue simulating an EdgeTech data stream from a text file.
+
+    Replay is timed relative to actltime_start, which defaults to the start
+    time of the survey context (if provided) so that all replayed streams of
+    the session are synchronised, otherwise to the current time.
+
+    Returns a StreamHandle which may be used to stop the replay.
+    """
+    if not actltime_start and context:
+        actltime_start = context.start_time
+    return obsurv.StreamHandle(
+        name=f"EdgeTech replay {filename}",
         target=__etech_from_file,
         args=(
             filename,
@@ -26,11 +41,133 @@ def etech_replay_textfile(
             spd_fctr,
             timestamp_offset,
         ),
-        daemon=True,
     ).start()
 
 
+def parse_etech_timestamp(sentence: str) -> datetime:
+    """Returns the timestamp at the start of a logged response, or None."""
+    # Attempt to extract the timestamp from the beginning of each senetence of
+    # the file replay.
+    timestamp_pattern = (
+        r"^\d{4}[:_-]\d{2}[:_-]\d{2}[Tt :_-]"
+        r"\d{2}[:_-]\d{2}[:_-]\d{2}\.\d{0,6}"
+    )
+    timestamp = re.match(timestamp_pattern, sentence.strip())
+    if not timestamp:
+        return None
+    timestamp = re.sub(r"[Tt :_-]", r"_", timestamp.group())
+    return datetime.strptime(timestamp, r"%Y_%m_%d_%H_%M_%S.%f")
+
+
+def read_etech_textfile(
+    filename: str,
+    timestamp_offset: float = 0,
+    stats: obsurv.StreamStats = None,
+    timestamp_start: datetime = None,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    """Yield (timestamp, response, bytes, byte offset) for each logged response.
+
+    The date of each timestamp is ignored because, when syncing with NMEA,
+    NMEA sentences do not include dates. Each timestamp is therefore the time
+    of day plus timestamp_offset seconds on 1900-01-01, advanced a day at
+    each midnight. The timestamp is removed from the response. Lines without
+    a valid timestamp are skipped, and counted as parse errors in stats.
+
+    If timestamp_start is given, reading starts from the time index entry
+    preceding it (see replay_index()) and earlier responses are skipped.
+
+    The filename may also be a directory or glob of rotated log files (see
+    replay_files()), which are read as one continuous stream. Once a file has
+    been read to the end its responses are cached (see parse_cache), so it is
+    only parsed again if it changes.
+    """
+    files = obsurv.replay_files(filename)
+    if len(files) > 1:
+        yield from obsurv.read_replay_files(
+            files,
+            "etech",
+            lambda etech_file, start: _read_etech_file(
+                etech_file, timestamp_offset, stats, start
+            ),
+            timestamp_start,
+            timestamp_offset,
+        )
+    else:
+        yield from _read_etech_file(files[0], timestamp_offset, stats, timestamp_start)
+
+
+def _read_etech_file(
+    filename: str,
+    timestamp_offset: float,
+    stats: obsurv.StreamStats,
+    timestamp_start: datetime,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    offset = 0
+    timestamp_date = datetime(1900, 1, 1)
+    if timestamp_start:
+        index = obsurv.replay_index(filename, "etech")
+        timestamp_start = index.virtual_timestamp(timestamp_start)
+        offset, timestamp_date = index.seek(
+            timestamp_start - timedelta(seconds=timestamp_offset)
+        )
+    # Day rollovers depend on the offset, so responses are cached with it.
+    kind = f"etech lines {timestamp_offset:+g}"
+    cached = obsurv.load_cached_table(filename, kind, PARSER_VERSION)
+    if cached is not None:
+        yield from obsurv.cached_lines(cached, stats, offset, timestamp_start)
+        return
+    with obsurv.open_logfile(filename, "rb") as etech_file:
+        etech_file.seek(offset)
+        counter = stats or obsurv.StreamStats()
+        lines = _etech_lines(
+            etech_file, offset, timestamp_date, timestamp_offset, counter
+        )
+        if not offset:
+            lines = obsurv.caching_lines(filename, kind, PARSER_VERSION, lines, counter)
+        for line in lines:
+            if timestamp_start and line[0] < timestamp_start:
+                continue
+            yield line
+
+
+def _etech_lines(
+    etech_file: BinaryIO,
+    offset: int,
+    timestamp_date: datetime,
+    timestamp_offset: float,
+    stats: obsurv.StreamStats,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    timestamp_prev = None
+    for line in etech_file:
+        line_offset = offset
+        offset += len(line)
+        sentence = line.decode("utf-8").strip()
+        timestamp_curr = parse_etech_timestamp(sentence)
+        if not timestamp_curr:
+            # If no valid timestamp continue with next response line.
+            if sentence and stats:
+                stats.parse_errors += 1
+            continue
+        secs = (
+            timestamp_curr.hour * 3600
+            + timestamp_curr.minute * 60
+            + timestamp_curr.second
+            + timestamp_curr.microsecond / 1e6
+        ) + timestamp_offset
+        timestamp_curr = timestamp_date + timedelta(seconds=secs)
+        if timestamp_prev and timestamp_curr.hour < timestamp_prev.hour:
+            timestamp_date = timestamp_date + timedelta(days=1)
+            timestamp_curr = timestamp_curr + timedelta(days=1)
+        timestamp_prev = timestamp_curr
+
+        # Remove timestamp and enclosing characters from EdgeTech response
+        # sentence.
+        sentence = re.sub(r"^.*([A-Z]{3}.*?)(\\r\\n')?$", r"\g<1>", sentence)
+        yield timestamp_curr, sentence, len(line), line_offset
+
+
 def __etech_from_file(
+    handle: obsurv.StreamHandle,
     filename: str,
     edgetech_q: Queue[str, datetime],
     actltime_start: datetime,
@@ -38,61 +175,31 @@ def __etech_from_file(
     spd_fctr: int,
     timestamp_offset: int = 0,
 ):
-    timestamp_prev = timestamp_start
-    timestamp_date = None
     if not actltime_start:
-        actltime_start = datetime.now(timezone.utc)
-    with open(filename, encoding="utf-8") as etech_file:
-        for sentence in etech_file:
-            sentence = sentence.strip()
-            try:
-                # Attempt to extract the timestamp from the beginning of each
-                # senetence of the file replay.
-                timestamp_pattern = (
-                    r"^\d{4}[:_-]\d{2}[:_-]\d{2}[Tt :_-]"
-                    r"\d{2}[:_-]\d{2}[:_-]\d{2}\.\d{0,6}"
-                )
-                timestamp_curr = re.match(timestamp_pattern, sentence).group()
-                timestamp_curr = re.sub(r"[Tt :_-]", r"_", timestamp_curr)
-                timestamp_curr = datetime.strptime(
-                    timestamp_curr, r"%Y_%m_%d_%H_%M_%S.%f"
-                )
-            except AttributeError:
-                # If no valid timestamp continue with next response line.
-                continue
-            # Ignore date portion of timestamp because when syncing with NMEA,
-            # NMEA strings do not include dates.
-            secs = (
-                timestamp_curr.hour * 3600
-                + timestamp_curr.minute * 60
-                + timestamp_curr.second
-                + timestamp_curr.microsecond / 1e6
-            ) + timestamp_offset
-            timestamp_delta = timedelta(seconds=secs)
-            if not timestamp_date:
-                timestamp_date = datetime(1900, 1, 1)
-            timestamp_curr = timestamp_date + timestamp_delta
-            if not timestamp_start:
-                timestamp_start = timestamp_curr
-                timestamp_prev = timestamp_start
-            if timestamp_curr.hour < timestamp_prev.hour:
-                timestamp_date = timestamp_date + timedelta(days=1)
-            timestamp_prev = timestamp_curr
-            timestamp_diff = timestamp_curr - timestamp_start
-
-            # Remove timestamp and enclosing characters from EdgeTech response
-            # sentence.
-            sentence = re.sub(r"^.*([A-Z]{3}.*?)(\\r\\n')?$", r"\g<1>", sentence)
-
-            # Add "replay" flag at end of sentence.
-            sentence = f"{sentence} replay"
-
-            while True:
-                # Pause until time for next EdgeTech sentence
-                sleep(0.000001)  # Prevents idle loop from 100% CPU thread usage.
-                actltime_diff = (datetime.now(timezone.utc) - actltime_start) * spd_fctr
-                if actltime_diff >= timestamp_diff:
-                    break
-            edgetech_q.put((sentence, timestamp_curr))
-
-        edgetech_q.put(("EOF", None))
+        actltime_start = datetime.now(UTC)
+    if timestamp_start:
+        timestamp_start = obsurv.replay_index(filename, "etech").virtual_timestamp(
+            timestamp_start
+        )
+    for timestamp_curr, sentence, nbytes, _ in read_etech_textfile(
+        filename, timestamp_offset, handle.stats, timestamp_start
+    ):
+        if handle.stopped:
+            return
+        if not timestamp_start:
+            timestamp_start = timestamp_curr
+        timestamp_diff = timestamp_curr - timestamp_start
+
+        # Add "replay" flag at end of sentence.
+        sentence = f"{sentence} replay"
+
+        if spd_fctr:
+            # Pause until time for next EdgeTech sentence
+            due = actltime_start + timestamp_diff / spd_fctr
+            delay = (due - datetime.now(UTC)).total_seconds()
+            if delay > 0 and handle.wait(delay):
+                return
+        edgetech_q.put((sentence, timestamp_curr))
+        handle.stats.record(nbytes)
+
+    edgetech_q.put(("EOF", None))
@@ -3,15 +3,22 @@
 Populates the specified Queue with tuples. Each tuple conatins (str, datetime),
 where str is the Edgetech response senstence and timedate is the time the
 response was received.
+
+Bytes are read as they become available and split into lines at the deckbox's
+<CR><LF> terminator, so a response is queued as soon as its terminator is
+received. Each response is timestamped with the arrival time of its first byte,
+which may optionally be corrected for the time taken to transmit the bytes
+received with it at the configured baud rate.
 """
 
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import UTC, datetime, timedelta
 from queue import Queue
-from threading import Thread
 
 from serial import Serial
 
+import ob_inst_survey as obsurv
+
 
 @dataclass
 class SerParam:
@@ -23,14 +30,26 @@ class SerParam:
     parity: str = "N"
     bytesize: int = 8
     timeout: float = 0.05
+    tx_correction: bool = False  # Correct timestamps for transmission time.
+
 
+def etech_serial_stream(
+    ser_conn: SerParam, edgetech_q: Queue[str, datetime]
+) -> obsurv.StreamHandle:
+    """Initiate a queue receiving an EdgeTech deckbox data stream.
 
-def etech_serial_stream(ser_conn: SerParam, edgetech_q: Queue[str, datetime]):
-    """Initiate a queue receiving an EdgeTech deckbox data stream."""
-    Thread(target=__receive_serial, args=(ser_conn, edgetech_q), daemon=True).start()
+    Returns a StreamHandle which may be used to stop the stream.
+    """
+    return obsurv.StreamHandle(
+        name=f"EdgeTech {ser_conn.port}",
+        target=__receive_serial,
+        args=(ser_conn, edgetech_q),
+    ).start()
 
 
-def __receive_serial(ser_conn: SerParam, edgetech_q: Queue[str, datetime]):
+def __receive_serial(
+    handle: obsurv.StreamHandle, ser_conn: SerParam, edgetech_q: Queue[str, datetime]
+):
     with Serial(
         port=ser_conn.port,
         baudrate=ser_conn.baud,
@@ -41,20 +60,78 @@ def __receive_serial(ser_conn: SerParam, edgetech_q: Queue[str, datetime]):
     ) as ser:
         print(f"Connected to EdgeTech deckbox: {ser.portstr} at {ser.baudrate} baud.")
 
+        reader = SerialLineReader(ser, tx_correction=ser_conn.tx_correction)
+        while not handle.stopped:
+            for response_line, received in reader.read_lines():
+                handle.stats.record(len(response_line))
+                response_line = response_line.decode("UTF-8", errors="replace").strip()
+                if response_line:
+                    edgetech_q.put((response_line, received))
+
+
+class SerialLineReader:
+    """Read lines from a serial port, timestamped at arrival of their first byte.
+
+    All bytes waiting are read with a single call. A line without a terminator
+    (eg a prompt) is returned once nothing further is received within the
+    serial timeout.
+    """
+
+    def __init__(
+        self, ser: Serial, terminator: bytes = b"\r\n", tx_correction: bool = False
+    ):
+        """Initialise the reader.
+
+        Args:
+            ser (Serial): Open serial port. Its timeout is the maximum time
+                read_lines() waits for data.
+            terminator (bytes, optional): Line terminator. Defaults to <CR><LF>.
+            tx_correction (bool, optional): Back-date the arrival time of the
+                bytes of each read by their transmission time at the port's
+                baud rate, rather than taking all to arrive at the time of the
+                read. Defaults to False.
+        """
+        self.ser = ser
+        self.terminator = terminator
+        self._buffer = bytearray()
+        self._first_time: datetime = None  # Arrival of first byte in buffer.
+        self._char_time = timedelta(0)
+        if tx_correction:
+            # Start bit, data bits, parity bit (if any) and stop bit(s).
+            bits = 1 + ser.bytesize + (ser.parity != "N") + ser.stopbits
+            self._char_time = timedelta(seconds=bits / ser.baudrate)
+
+    def read_lines(self) -> list[tuple[bytes, datetime]]:
+        """Return (line, datetime of first byte) for each line received.
+
+        Waits up to the serial timeout for the first byte if none is waiting.
+        Lines are returned without their terminator.
+        """
+        data = self.ser.read(self.ser.in_waiting or 1)
+        now = datetime.now(UTC)
+        if not data:
+            if not self._buffer:
+                return []
+            line = (bytes(self._buffer), self._first_time)
+            self._buffer.clear()
+            return [line]
+
+        offset = len(self._buffer)  # Index of the first byte of data.
+        if not offset:
+            self._first_time = self._arrival(now, 0, len(data))
+        self._buffer += data
+        lines = []
+        start = 0
         while True:
-            response_line = _get_response(ser)
-            if response_line != b"":
-                now = datetime.now(timezone.utc)
-                response_line = response_line.decode("UTF-8").strip()
-                edgetech_q.put((response_line, now))
-
-
-def _get_response(ser) -> str:
-    response = []
-    byte_next = ser.read(1)
-    while byte_next != b"":  # next_byte will be "" after ser.timeout
-        response.append(byte_next)
-        # print(byte_next.decode("UTF-8"), end="", flush=True)
-        byte_next = ser.read(1)
-    response = b"".join(response)
-    return response
+            end = self._buffer.find(self.terminator, start)
+            if end < 0:
+                break
+            lines.append((bytes(self._buffer[start:end]), self._first_time))
+            start = end + len(self.terminator)
+            self._first_time = self._arrival(now, start - offset, len(data))
+        del self._buffer[:start]
+        return lines
+
+    def _arrival(self, now: datetime, index: int, length: int) -> datetime:
+        """Estimated arrival time of byte index of length bytes read at now."""
+        return now - self._char_time * (length - 1 - max(index, 0))
@@ -0,0 +1,312 @@
+"""Simulate an EdgeTech 8011M deckbox on a pseudo-terminal (Linux/Unix only).
+
+DeckboxSimulator opens a pseudo-terminal pair and emulates a deckbox on it. The
+slave device (eg "/dev/pts/3") is then used as the serial port of
+etech_serial_stream(), log_etech_to_file.py or command_etech_to_file.py, so the
+serial ingestion path can be tested and benchmarked without hardware.
+
+When free running the simulator emits a "RNG:" response at a regular rate, or
+at the times listed in a scenario file. Range times are either taken from the
+scenario file or computed from a synthetic geometry of a ship circling an
+instrument on the seafloor. Optionally responses are delayed by random jitter,
+some are malformed, and the output is paced at the serial baud rate.
+
+Host mode is entered by sending <CR>, and accepts the commands:
+    <CR>        "*" on entering host mode, "#" if already in host mode.
+    UGnnnnn     Set the upper range gate (ms, 0 for none). Replies "*".
+    LGnnnnn     Set the lower range gate (ms). Replies "*".
+    TXff.ff     Set the transmit frequency (kHz). Replies "*".
+    RXff.ff     Set the receive frequency (kHz). Replies "*".
+    RNG         Interrogate. After the range time (or the upper range gate if
+                there is no reply) replies with a "RNG:" response then "S".
+    EXIT        Leave host mode and resume free running. Replies "*".
+Any other command replies "#". Responses and prompts end with <CR><LF>.
+
+Scenario files contain a line for each response of "<seconds> <range time>",
+where seconds is the time since the simulator started and range time is the
+two way travel time in seconds, or "--.---" for no reply. Lines starting with
+"#" are ignored.
+"""
+
+import heapq
+import math
+import os
+import random
+import select
+from dataclasses import dataclass
+from pathlib import Path
+from time import monotonic
+
+import ob_inst_survey as obsurv
+
+COMMAND_TERMINATOR = b"\r"
+
+
+@dataclass
+class SimGeometry:
+    """Dataclass for a ship circling an instrument on the seafloor.
+
+    The circle is centred offset metres horizontally from the instrument.
+    """
+
+    depth: float = 2000.0  # Depth of instrument below transducer (m).
+    radius: float = 1000.0  # Radius of ship's circle (m).
+    offset: float = 200.0  # Horizontal distance of instrument from centre (m).
+    speed: float = 4.0  # Ship speed (knots).
+    snd_spd: float = 1500.0  # Speed of sound in water (m/s).
+    turn_time: float = 12.5  # Delay in ms for reply from transducer.
+
+    def range_time(self, elapsed: float) -> float:
+        """Two way travel time (s) at elapsed seconds after starting."""
+        angle = self.speed * 1852 / 3600 * elapsed / self.radius
+        east = self.radius * math.cos(angle) - self.offset
+        north = self.radius * math.sin(angle)
+        slant = math.sqrt(east**2 + north**2 + self.depth**2)
+        return 2 * slant / self.snd_spd + self.turn_time / 1000
+
+
+@dataclass
+class SimParam:
+    """Dataclass for specifying deckbox simulator behaviour."""
+
+    rate: float = 0.1  # Free running responses per second.
+    jitter: float = 0.0  # Maximum random delay (s) added to each response.
+    malformed: float = 0.0  # Fraction of responses that are malformed.
+    baud: int = 9600  # Pace output at this baud rate. None or 0 = unpaced.
+    tx_freq: float = 12.0  # Transmit frequency (kHz).
+    rx_freq: float = 11.0  # Receive frequency (kHz).
+    free_running: bool = True  # Emit responses when not in host mode.
+    seed: int = None  # Random seed, for repeatable jitter and malformed lines.
+
+
+def read_scenario(filename: Path) -> list[tuple[float, float]]:
+    """Read a scenario file as a list of (seconds, range time or None)."""
+    scenario = []
+    with open(filename, encoding="utf-8") as scenario_file:
+        for line in scenario_file:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            try:
+                range_time = float(fields[1])
+            except ValueError:
+                range_time = None
+            scenario.append((float(fields[0]), range_time))
+    return scenario
+
+
+class DeckboxSimulator:
+    """Emulate an EdgeTech 8011M deckbox on a pseudo-terminal."""
+
+    def __init__(
+        self,
+        param: SimParam = None,
+        geometry: SimGeometry = None,
+        scenario: list[tuple[float, float]] = None,
+    ):
+        """Open the pseudo-terminal (the simulator is not yet started).
+
+        Args:
+            param (SimParam, optional): Simulator behaviour. Defaults to
+                SimParam().
+            geometry (SimGeometry, optional): Geometry from which range times
+                are computed. Defaults to SimGeometry().
+            scenario (list[tuple[float, float]], optional): Times and range
+                times of free running responses, as returned by
+                read_scenario(). Overrides param.rate and geometry. Defaults
+                to None.
+        """
+        import tty  # Not available on Windows.
+
+        self.param = param or SimParam()
+        self.geometry = geometry or SimGeometry()
+        self.scenario = scenario
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        os.set_blocking(self._master, False)
+        self.port = os.ttyname(self._slave)
+        self.handle: obsurv.StreamHandle = None
+
+        self.host_mode = False
+        self.upper_gate = 0  # ms, 0 for none.
+        self.lower_gate = 0  # ms
+        self._random = random.Random(self.param.seed)
+        self._start = None
+        self._scenario_idx = 0  # Index of next scenario response.
+        self._scheduled = []  # Heap of (due time, sequence, bytes).
+        self._sequence = 0
+        self._command = bytearray()
+
+    def start(self) -> obsurv.StreamHandle:
+        """Start emulating the deckbox in a background thread.
+
+        Returns a StreamHandle for stopping the simulator, whose stats count
+        the lines written.
+        """
+        self.handle = obsurv.StreamHandle(
+            name=f"Deckbox simulator {self.port}", target=self._run
+        ).start()
+        return self.handle
+
+    def close(self):
+        """Stop the simulator and close the pseudo-terminal."""
+        if self.handle:
+            self.handle.stop()
+            self.handle.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def range_line(self, range_time: float) -> str:
+        """Format a "RNG:" response for a range time (None for no reply)."""
+        range_text = "--.---" if range_time is None else f"{range_time:.3f}"
+        return (
+            f"RNG: Tx Freq {self.param.tx_freq:.2f} Rx Freq "
+            f"{self.param.rx_freq:.2f} Range Time {range_text} sec"
+        )
+
+    def _run(self, handle: obsurv.StreamHandle):
+        self._start = monotonic()
+        self._scenario_idx = 0
+        pending = bytearray()
+        char_time = 0.0
+        if self.param.baud:
+            char_time = 10 / self.param.baud  # Start, 8 data & stop bits.
+        last_tx = self._start
+        next_response = self._next_response(0)
+
+        while not handle.stopped:
+            now = monotonic()
+            elapsed = now - self._start
+            while next_response is not None and elapsed >= next_response[0]:
+                if self.param.free_running and not self.host_mode:
+                    self._respond(next_response[1], now)
+                next_response = self._next_response(next_response[0])
+            while self._scheduled and self._scheduled[0][0] <= now:
+                line = heapq.heappop(self._scheduled)[2]
+                pending += line
+                handle.stats.record(len(line))
+
+            if pending:
+                if char_time:
+                    # Write only the bytes that could have been transmitted.
+                    nbytes = min(len(pending), int((now - last_tx) / char_time))
+                else:
+                    nbytes = len(pending)
+                if nbytes:
+                    try:
+                        nbytes = os.write(self._master, pending[:nbytes])
+                    except BlockingIOError:
+                        nbytes = 0  # Reader is not keeping up.
+                    del pending[:nbytes]
+                    last_tx += nbytes * char_time
+            else:
+                last_tx = now
+
+            timeout = 0.05
+            if pending:
+                timeout = max(char_time, 0.0005)
+            if self._scheduled:
+                timeout = min(timeout, max(self._scheduled[0][0] - now, 0))
+            if next_response is not None:
+                timeout = min(timeout, max(next_response[0] - elapsed, 0))
+            readable, _, _ = select.select([self._master], [], [], timeout)
+            if readable:
+                try:
+                    data = os.read(self._master, 1024)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    # Eg EIO once the slave side is closed, after which the
+                    # master is always readable.
+                    break
+                self._receive(data, monotonic())
+
+    def _next_response(self, previous: float) -> tuple[float, float]:
+        """Return (seconds, range time) of the next free running response."""
+        if self.scenario is not None:
+            if self._scenario_idx >= len(self.scenario):
+                return None
+            self._scenario_idx += 1
+            return self.scenario[self._scenario_idx - 1]
+        if not self.param.rate:
+            return None
+        seconds = previous + 1 / self.param.rate
+        return seconds, self.geometry.range_time(seconds)
+
+    def _respond(self, range_time: float, now: float, prompt: str = ""):
+        """Schedule a range response, subject to the range gates and jitter."""
+        if range_time is not None and not (
+            self.lower_gate / 1000
+            <= range_time
+            <= (self.upper_gate / 1000 if self.upper_gate else math.inf)
+        ):
+            range_time = None
+        line = self.range_line(range_time)
+        if self.param.malformed and self._random.random() < self.param.malformed:
+            line = self._malform(line)
+        delay = self._random.uniform(0, self.param.jitter) if self.param.jitter else 0
+        self._schedule(f"{line}\r\n{prompt}", now + delay)
+
+    def _malform(self, line: str) -> str:
+        """Truncate the line, or replace it with noise."""
+        if self._random.random() < 0.5:
+            return line[: self._random.randrange(1, len(line))]
+        return "".join(chr(self._random.randrange(33, 127)) for _ in range(20))
+
+    def _schedule(self, text: str, due: float):
+        self._sequence += 1
+        heapq.heappush(self._scheduled, (due, self._sequence, text.encode("ascii")))
+
+    def _receive(self, data: bytes, now: float):
+        """Process bytes received from the host, one command per <CR>."""
+        self._command += data.replace(b"\n", b"")
+        while COMMAND_TERMINATOR in self._command:
+            end = self._command.index(COMMAND_TERMINATOR)
+            command = self._command[:end].decode("ascii", errors="replace")
+            del self._command[: end + 1]
+            self._host_command(command.strip().upper(), now)
+
+    def _host_command(self, command: str, now: float):
+        if not command:
+            self._schedule("#\r\n" if self.host_mode else "*\r\n", now)
+            self.host_mode = True
+            return
+        if not self.host_mode:
+            return  # Commands are ignored until in host mode.
+
+        try:
+            if command.startswith("UG"):
+                self.upper_gate = int(command[2:])
+            elif command.startswith("LG"):
+                self.lower_gate = int(command[2:])
+            elif command.startswith("TX"):
+                self.param.tx_freq = float(command[2:])
+            elif command.startswith("RX"):
+                self.param.rx_freq = float(command[2:])
+            elif command == "RNG":
+                self._interrogate(now)
+                return
+            elif command == "EXIT":
+                self.host_mode = False
+            else:
+                raise ValueError(command)
+        except ValueError:
+            self._schedule("#\r\n", now)
+            return
+        self._schedule("*\r\n", now)
+
+    def _interrogate(self, now: float):
+        """Reply to a range command after the two way travel time."""
+        elapsed = now - self._start
+        if self.scenario:
+            # Range time of the scenario response nearest in time.
+            range_time = min(self.scenario, key=lambda item: abs(item[0] - elapsed))[1]
+        else:
+            range_time = self.geometry.range_time(elapsed)
+        if range_time is None and not self.upper_gate:
+            return  # Without an upper range gate the deckbox never times out.
+        in_gate = range_time is not None and (
+            not self.upper_gate or range_time <= self.upper_gate / 1000
+        )
+        delay = range_time if in_gate else self.upper_gate / 1000
+        self._respond(range_time if in_gate else None, now + delay, prompt="S\r\n")
@@ -1,25 +1,137 @@
-"""Verify checksum for an NMEA secntence."""
+"""Verify checksum for an NMEA secntence.
+
+nmea_checksum() validates a single sentence. nmea_checksum_block() validates
+every line of a block of bytes at once using NumPy, and nmea_checksum_file()
+applies it to a whole file in large chunks.
+
+The checksum is the XOR of all characters between the "$" and the "*",
+expressed as two hexadecimal digits following the "*".
+"""
 
 import re
+from collections.abc import Iterator
+from pathlib import Path
+
+import numpy as np
+
+import ob_inst_survey as obsurv
+
+SENTENCE_PATTERN = re.compile(rb"\$([^*]*)\*([0-9A-Fa-f]{2})")
+
+# Value of each byte as a hexadecimal digit, or -1 if not a hexadecimal digit.
+HEX_TABLE = np.full(256, -1, dtype=np.int16)
+for _digit in b"0123456789":
+    HEX_TABLE[_digit] = _digit - ord("0")
+for _digit in b"ABCDEF":
+    HEX_TABLE[_digit] = HEX_TABLE[_digit + 32] = _digit - ord("A") + 10
 
 
-def nmea_checksum(sentence: str) -> bool:
+def nmea_checksum(sentence: str | bytes) -> bool:
     """Returns True if NMEA sentence checksum is valid, otherwise False."""
-    sentence_match = re.match(r"\$(.*)\*(.{2})", sentence)
-    try:
-        chksumdata = sentence_match[1]
-    except TypeError:
+    if isinstance(sentence, str):
+        sentence = sentence.encode("latin-1", errors="replace")
+    sentence_match = SENTENCE_PATTERN.match(sentence)
+    if not sentence_match:
         return False
-    chksum = int(sentence_match[2], 16)  # convert from hex string
-    check = 0
-
-    # For each char in chksumdata, XOR against the previous XOR'd char.
-    # The final XOR of the last char will be our checksum to verify
-    # against the checksum we sliced off the NMEA sentence.
-    for char in chksumdata:
-        # XOR'ing value of csum against the next char in line
-        # and storing the new XOR value in csum
-        check ^= ord(char)
-
-    # Do we have a validated sentence?
-    return check == chksum
+    return _xor_bytes(sentence_match[1]) == int(sentence_match[2], 16)
+
+
+def _xor_bytes(data: bytes) -> int:
+    """Return the XOR of all bytes.
+
+    Rather than XOR each byte in turn, the bytes are treated as one integer
+    (zero padded to a power of two bytes) which is repeatedly XOR'd with its
+    upper half, until the lowest byte holds the XOR of all bytes.
+    """
+    value = int.from_bytes(data, "little")
+    shift = 4 * (1 << (len(data) - 1).bit_length())  # Bits in half padded length.
+    while shift >= 8:
+        value ^= value >> shift
+        shift >>= 1
+    return value & 0xFF
+
+
+def nmea_checksum_block(block: bytes) -> np.ndarray:
+    r"""Validate the checksum of every line in a block of NMEA data.
+
+    Lines are separated by "\n". The sentence in each line begins at its last
+    "$" (so lines may be prefixed, eg by a timestamp) and ends at the first "*"
+    that follows.
+
+    Returns a boolean array with an element for each line, True if its
+    checksum is valid. A final empty line (after a trailing "\n", or an empty
+    block) is excluded.
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    newlines = np.flatnonzero(data == ord("\n"))
+    line_starts = np.concatenate(([0], newlines + 1))
+    line_ends = np.concatenate((newlines, [len(data)]))
+    if not block or block.endswith(b"\n"):
+        line_starts, line_ends = line_starts[:-1], line_ends[:-1]
+    valid = np.zeros(len(line_starts), dtype=bool)
+    if not len(data):
+        return valid
+
+    # Cumulative XOR allows the XOR of any range of bytes to be found from
+    # its two end points.
+    cum_xor = np.bitwise_xor.accumulate(data)
+    dollars = np.flatnonzero(data == ord("$"))
+    stars = np.flatnonzero(data == ord("*"))
+    if not len(dollars) or not len(stars):
+        return valid
+
+    # Last "$" of each line, and the first "*" following it.
+    dollar_idx = np.searchsorted(dollars, line_ends) - 1
+    has_dollar = dollar_idx >= 0
+    dollar = dollars[np.maximum(dollar_idx, 0)]
+    has_dollar &= dollar >= line_starts
+    star_idx = np.searchsorted(stars, dollar)
+    has_star = star_idx < len(stars)
+    star = stars[np.minimum(star_idx, len(stars) - 1)]
+    # Two checksum digits must follow the "*" within the line.
+    has_star &= star + 2 < line_ends
+    candidate = has_dollar & has_star
+    dollar, star = dollar[candidate], star[candidate]
+
+    check = cum_xor[star - 1] ^ cum_xor[dollar]
+    digit_hi = HEX_TABLE[data[star + 1]]
+    digit_lo = HEX_TABLE[data[star + 2]]
+    valid[candidate] = (
+        (digit_hi >= 0) & (digit_lo >= 0) & (check == digit_hi * 16 + digit_lo)
+    )
+    return valid
+
+
+def nmea_checksum_file(
+    filename: Path, chunk_size: int = 16 * 2**20
+) -> Iterator[tuple[list[bytes], np.ndarray]]:
+    """Validate the checksum of every line in an NMEA text file.
+
+    The file is read in chunks of approximately chunk_size bytes. For each
+    chunk yields a tuple of (lines, valid), where lines is a list of the
+    lines as bytes (without line terminators) and valid is a boolean array
+    as returned by nmea_checksum_block().
+    """
+    remainder = b""
+    with obsurv.open_logfile(filename, "rb") as nmea_file:
+        while True:
+            chunk = nmea_file.read(chunk_size)
+            if not chunk:
+                break
+            block = remainder + chunk
+            last_newline = block.rfind(b"\n")
+            if last_newline < 0:
+                remainder = block
+                continue
+            remainder = block[last_newline + 1 :]
+            block = block[: last_newline + 1]
+            yield _split_lines(block), nmea_checksum_block(block)
+    if remainder:
+        yield _split_lines(remainder), nmea_checksum_block(remainder)
+
+
+def _split_lines(block: bytes) -> list[bytes]:
+    lines = block.split(b"\n")
+    if lines[-1] == b"":
+        lines.pop()
+    return [line.rstrip(b"\r") for line in lines]
@@ -0,0 +1,266 @@
+"""Parse NMEA sentences into compact, typed fix records.
+
+FixParser assembles the sentences of each NMEA epoch into a FixRecord as they
+are received. An epoch starts at each GGA, RMC or SHR sentence with a
+different timestamp from the previous one, and includes the VTG and HDT
+sentences following it. Each sentence is parsed straight into the numeric
+fields of the record, so no sentences or strings are kept. Text such as the
+formatted latitude and longitude is only produced by FixRecord.obsvn_fields(),
+when the fix is paired with a range.
+
+Within an epoch the position is taken from GGA (or RMC if there is no GGA),
+course and speed from VTG (or RMC), and heading from SHR (or HDT).
+"""
+
+import math
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+NAN = float("nan")
+TIMED_TYPES = ("GGA", "RMC", "SHR")  # Types including a timestamp.
+FIELD_COUNTS = {"GGA": 13, "RMC": 9, "VTG": 6, "HDT": 2, "SHR": 7}
+
+# Description of each GGA fix quality indicator.
+FIX_QUALITY = (
+    "Invalid",
+    "GPS fix - (Standard Positioning Service)",
+    "DGPS fix",
+    "PPS fix",
+    "Real Time Kinematic",
+    "Float RTK",
+    "Estimated (dead reckoning)",
+    "Manual input mode",
+    "Simulation mode",
+)
+
+
+@dataclass(slots=True)
+class FixRecord:
+    """Dataclass for the fix of an NMEA epoch. Missing values are NaN (or -1)."""
+
+    seconds: float = NAN  # Timestamp as seconds after midnight (UTC).
+    lat: float = NAN  # Decimal degrees, negative if south.
+    lon: float = NAN  # Decimal degrees, negative if west.
+    quality: int = -1  # GGA fix quality indicator (see FIX_QUALITY).
+    sats: int = -1  # Number of satellites in use.
+    hdop: float = NAN  # Horizontal dilution of precision.
+    ht_amsl: float = NAN  # Antenna height above mean sea level.
+    ht_unit: str = ""  # Unit of ht_amsl.
+    geoid_sep: float = NAN  # Geoid separation.
+    geoid_unit: str = ""  # Unit of geoid_sep.
+    cog: float = NAN  # Course over ground (degrees true).
+    sog_kt: float = NAN  # Speed over ground (knots).
+    heading: float = NAN  # Heading (degrees true).
+    roll: float = NAN  # Roll (degrees).
+    pitch: float = NAN  # Pitch (degrees).
+    heave: float = NAN  # Heave (metres).
+    pc_time: datetime = None  # PC time of receipt of the first sentence.
+    src: str = ""  # Label of the source of the position sentence.
+    time_decimals: int = 0  # Decimal places of the seconds of the timestamp.
+    lat_decimals: int = 0  # Decimal places of the minutes of latitude.
+    lon_decimals: int = 0  # Decimal places of the minutes of longitude.
+
+    @property
+    def valid(self) -> bool:
+        """True if the timestamp and position are known."""
+        return not (
+            math.isnan(self.seconds) or math.isnan(self.lat) or math.isnan(self.lon)
+        )
+
+    def utc_datetime(self, near: datetime) -> datetime:
+        """Returns the (naive) date and time of the fix nearest to near."""
+        nmea_time = datetime(near.year, near.month, near.day) + timedelta(
+            seconds=self.seconds % 86400
+        )
+        if nmea_time.hour > near.hour + 6:
+            nmea_time = nmea_time - timedelta(days=1)
+        elif nmea_time.hour + 6 < near.hour:
+            nmea_time = nmea_time + timedelta(days=1)
+        return nmea_time
+
+    def obsvn_fields(self) -> dict:
+        """Returns the fields of an observation, missing values being ""."""
+        qlty = ""
+        if 0 <= self.quality < len(FIX_QUALITY):
+            qlty = FIX_QUALITY[self.quality]
+        return {
+            "utcTime": _format_time(self.seconds, self.time_decimals),
+            "lat": _format_ordinate(self.lat, 2, self.lat_decimals, "NS"),
+            "latDec": _value(self.lat),
+            "lon": _format_ordinate(self.lon, 3, self.lon_decimals, "EW"),
+            "lonDec": _value(self.lon),
+            "qlty": qlty,
+            "noSats": "" if self.sats < 0 else self.sats,
+            "hdop": _value(self.hdop),
+            "htAmsl": _value(self.ht_amsl),
+            "htAmslUnit": self.ht_unit,
+            "geiodSep": _value(self.geoid_sep),
+            "geiodSepUnit": self.geoid_unit,
+            "cog": _value(self.cog),
+            "sogKt": _value(self.sog_kt),
+            "heading": _value(self.heading),
+            "roll": _value(self.roll),
+            "pitch": _value(self.pitch),
+            "heave": _value(self.heave),
+            "flag": None,
+            "nmeaSrc": self.src,
+        }
+
+
+class FixParser:
+    """Assemble NMEA sentences into a FixRecord for each epoch."""
+
+    def __init__(self, src: str = ""):
+        """Initialise the parser.
+
+        Args:
+            src (str, optional): Label of the source of sentences added without
+                one. Defaults to "".
+        """
+        self.src = src
+        self._fix = FixRecord()  # Fix of the current epoch.
+        self._timestamp: str = None  # Timestamp of the current epoch.
+        self._types: set[str] = set()  # Sentence types of the current epoch.
+
+    def parse(self, sentence: str, pc_time: datetime, src: str = None) -> FixRecord:
+        """Add an NMEA sentence (with a valid checksum) to the current epoch.
+
+        Args:
+            sentence (str): NMEA sentence.
+            pc_time (datetime): PC time of receipt of the sentence.
+            src (str, optional): Label of the source of the sentence. Defaults
+                to that of the parser.
+
+        Returns:
+            FixRecord: The fix of the previous epoch if the sentence starts a
+                new epoch and the previous epoch included a position, otherwise
+                None.
+        """
+        start = sentence.find("$") + 1
+        end = sentence.rfind("*")
+        fields = sentence[start : end if end >= 0 else None].split(",")
+        msg_type = fields[0][2:]
+        field_count = FIELD_COUNTS.get(msg_type)
+        if field_count is None:
+            return None
+        if len(fields) < field_count:
+            fields.extend([""] * (field_count - len(fields)))
+        if src is None:
+            src = self.src
+
+        completed = None
+        if msg_type in TIMED_TYPES:
+            timestamp = fields[1][:8]
+            if self._timestamp is not None and timestamp != self._timestamp:
+                if "GGA" in self._types or "RMC" in self._types:
+                    completed = self._fix
+                self._fix = FixRecord(pc_time=pc_time)
+                self._types = set()
+            elif self._timestamp is None:
+                self._fix.pc_time = pc_time
+            self._timestamp = timestamp
+        elif self._fix.pc_time is None:
+            self._fix.pc_time = pc_time
+
+        fix = self._fix
+        if msg_type == "GGA":
+            _set_position(fix, fields[1], fields[2], fields[3], fields[4], fields[5])
+            fix.src = src
+            fix.quality = _int(fields[6])
+            fix.sats = _int(fields[7])
+            fix.hdop = _float(fields[8])
+            fix.ht_amsl = _float(fields[9])
+            fix.ht_unit = fields[10].upper()
+            fix.geoid_sep = _float(fields[11])
+            fix.geoid_unit = fields[12].upper()
+        elif msg_type == "RMC":
+            if "GGA" not in self._types:
+                _set_position(
+                    fix, fields[1], fields[3], fields[4], fields[5], fields[6]
+                )
+                fix.src = src
+            if "VTG" not in self._types:
+                fix.sog_kt = _float(fields[7])
+                fix.cog = _float(fields[8])
+        elif msg_type == "VTG":
+            fix.cog = _float(fields[1])
+            fix.sog_kt = _float(fields[5])
+        elif msg_type == "HDT":
+            if "SHR" not in self._types:
+                fix.heading = _float(fields[1])
+        elif msg_type == "SHR":
+            fix.heading = _float(fields[2])
+            fix.roll = _float(fields[4])
+            fix.pitch = _float(fields[5])
+            fix.heave = _float(fields[6])
+        self._types.add(msg_type)
+        return completed
+
+
+def _set_position(
+    fix: FixRecord, time: str, lat: str, lat_hemi: str, lon: str, lon_hemi: str
+):
+    """Set the timestamp and position of a fix from the fields of a sentence."""
+    try:
+        fix.seconds = int(time[0:2]) * 3600 + int(time[2:4]) * 60 + float(time[4:])
+        fix.time_decimals = _decimals(time)
+    except ValueError:
+        fix.seconds = NAN
+    fix.lat, fix.lat_decimals = _ordinate(lat, 2, lat_hemi, "S")
+    fix.lon, fix.lon_decimals = _ordinate(lon, 3, lon_hemi, "W")
+
+
+def _ordinate(text: str, deg_digits: int, hemi: str, negative: str) -> tuple:
+    """Returns the decimal degrees and decimal places of minutes of an ordinate."""
+    minutes = text[deg_digits : deg_digits + 9]
+    try:
+        value = int(text[0:deg_digits]) + float(minutes) / 60
+    except ValueError:
+        return NAN, 0
+    if hemi.upper() == negative:
+        value = -value
+    return value, _decimals(minutes)
+
+
+def _decimals(text: str) -> int:
+    point = text.find(".")
+    return 0 if point < 0 else len(text) - point - 1
+
+
+def _float(text: str) -> float:
+    try:
+        return float(text)
+    except ValueError:
+        return NAN
+
+
+def _int(text: str) -> int:
+    try:
+        return int(text)
+    except ValueError:
+        return -1
+
+
+def _value(value: float):
+    return "" if math.isnan(value) else value
+
+
+def _format_time(seconds: float, decimals: int) -> str:
+    """Format seconds after midnight as "HH:MM:SS.ss"."""
+    if math.isnan(seconds):
+        return ""
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    width = decimals + 3 if decimals else 2
+    return f"{int(hours):02d}:{int(minutes):02d}:{seconds:0{width}.{decimals}f}"
+
+
+def _format_ordinate(value: float, deg_digits: int, decimals: int, hemis: str) -> str:
+    """Format decimal degrees as degrees and minutes, eg 38°14.00004'S."""
+    if math.isnan(value):
+        return ""
+    hemi = hemis[1] if math.copysign(1, value) < 0 else hemis[0]
+    degrees, minutes = divmod(abs(value), 1)
+    minutes *= 60
+    width = decimals + 3 if decimals else 2
+    return f"{int(degrees):0{deg_digits}d}°{minutes:0{width}.{decimals}f}'{hemi}"
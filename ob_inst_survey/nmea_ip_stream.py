@@ -2,13 +2,38 @@
 
 Initiates a thread that connects to an NMEA data stream via UDP or TCP and
 populates the specified Queue with NMEA strings.
+
+Data is received into a preallocated buffer, and sentences split across
+successive TCP segments are reassembled before being queued. Optionally only
+sentences of specified types and/or talker IDs are queued, which is decided
+from the raw bytes before any decoding or checksum validation.
+
+Several UDP sources (unicast or multicast) may be received together by a single
+thread. Their sentences are merged in order of arrival and each queue element
+is then a tuple of (sentence, datetime received, source label).
+
+nmea_failover_stream() receives a primary and a standby source. Sentences from
+the primary are queued exactly as by nmea_ip_stream(). A monitor thread checks
+the primary periodically and, if it has been silent for longer than the
+staleness window, queues the standby's sentences (tagged with its label)
+instead, until the primary resumes.
 """
 
+import random
 import re
+import selectors
 import socket
-from dataclasses import dataclass
-from queue import Queue
-from threading import Thread
+import sys
+from dataclasses import dataclass, replace
+from datetime import UTC, datetime
+from queue import Empty, Queue
+from time import monotonic
+
+import ob_inst_survey as obsurv
+
+SOCKET_TIMEOUT = 0.5  # Interval (seconds) for checking if stream is stopped.
+RECONNECT_DELAY = 0.5  # Initial delay (seconds) between TCP reconnect attempts.
+RECONNECT_DELAY_MAX = 30.0  # Maximum delay (seconds) between reconnect attempts.
 
 
 @dataclass
@@ -22,14 +47,29 @@ class IpParam:
       socket.gethostbyname(socket.gethostname())
       If more than one local NIC then the IP address of the actual NIC to be
       used for receiving UDP stream is required.
+    For UDP multicast the group address is also required, and the IP address
+    selects the local NIC that will join the group.
+    If no IP address is given it defaults to "127.0.0.1", or for multicast to
+    "0.0.0.0" (INADDR_ANY, ie the NIC chosen by the operating system).
     """
 
     port: int = 50001
-    addr: str = "127.0.0.1"  # local for UDP / remote for TCP
+    addr: str = None  # local for UDP / remote for TCP / NIC for multicast
     prot: str = "UDP"
     buffer: int = 2048
+    rcvbuf: int = None  # Socket receive buffer (SO_RCVBUF) bytes. None = OS default.
+    sentences: tuple[str] = None  # Sentence types to accept (eg "GGA"). None = all.
+    talkers: tuple[str] = None  # Talker IDs to accept (eg "GP"). None = all.
+    group: str = None  # UDP multicast group address. None = unicast.
+    label: str = ""  # Identifies the source. Defaults to "<addr>:<port>".
+    outage: float = 0  # TCP seconds without data before "TimeoutError". 0 = never.
 
     def __post_init__(self):
+        if self.sentences:
+            self.sentences = tuple(item.upper() for item in self.sentences)
+        if self.talkers:
+            self.talkers = tuple(item.upper() for item in self.talkers)
+
         # Validate IP Protocol
         self.prot = self.prot.upper()
         if self.prot not in ("UDP", "TCP"):
@@ -38,6 +78,8 @@ class IpParam:
             )
 
         # Validate IP address
+        if not self.addr:
+            self.addr = "0.0.0.0" if self.group else "127.0.0.1"
         if not re.match(
             r"^(([01]\d{0,2})|[2-9]\d?|(2(([0-4]\d)|(5[0-5]))))"
             r"(\.(([01]\d{0,2})|[2-9]\d?|(2(([0-4]\d)|(5[0-5]))))){3}$",
@@ -45,108 +87,451 @@ class IpParam:
         ):
             raise ValueError(f"{self.addr} is not a valid IP address.")
 
+        # Validate multicast group address
+        if self.group and not (
+            self.prot == "UDP" and 224 <= socket.inet_aton(self.group)[0] <= 239
+        ):
+            raise ValueError(f"{self.group} is not a valid UDP multicast group.")
+
+        if not self.label:
+            self.label = f"{self.group or self.addr}:{self.port}"
 
-def nmea_ip_stream(ip_conn: IpParam, nmea_q: Queue[str]):
-    """Initiate a queue receiving an NMEA data stream."""
-    if ip_conn.prot == "UDP":
-        Thread(target=_receive_udp, args=(ip_conn, nmea_q), daemon=True).start()
-    elif ip_conn.prot == "TCP":
-        Thread(target=_receive_tcp, args=(ip_conn, nmea_q), daemon=True).start()
 
+def nmea_ip_stream(
+    ip_conn: IpParam | list[IpParam],
+    nmea_q: Queue[str],
+    tag_source: bool = None,
+) -> obsurv.StreamHandle:
+    """Initiate a queue receiving an NMEA data stream.
 
-def _receive_udp(udp_conn: IpParam, nmea_q: Queue[str]):
-    """Listen on UDP port and populate queue with NMEA stream."""
-    with socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM) as nmea_server:
-        nmea_server.bind((udp_conn.addr, udp_conn.port))
+    If a list of more than one UDP connection is provided, all are received
+    by one thread and each queue element is a tuple of (sentence, datetime
+    received, source label).
+
+    Args:
+        ip_conn (IpParam | list[IpParam]): Connection parameters.
+        nmea_q (Queue[str]): Queue to be populated with NMEA sentences.
+        tag_source (bool, optional): Queue tuples of (sentence, datetime
+            received, source label) rather than sentences. Defaults to None,
+            which tags only if there is more than one source.
+
+    Returns:
+        obsurv.StreamHandle: Handle which may be used to stop the stream.
+    """
+    if not isinstance(ip_conn, (list, tuple)):
+        ip_conn = [ip_conn]
+    if len(ip_conn) > 1 and any(conn.prot != "UDP" for conn in ip_conn):
+        sys.exit("Multiple NMEA sources may only be received by UDP.")
+    if tag_source is None:
+        tag_source = len(ip_conn) > 1
+
+    if ip_conn[0].prot == "UDP":
+        target = _receive_udp
+        args = (ip_conn, nmea_q, tag_source)
+    elif ip_conn[0].prot == "TCP":
+        target = _receive_tcp
+        args = (ip_conn[0], nmea_q, tag_source)
+    return obsurv.StreamHandle(
+        name=f"NMEA {ip_conn[0].prot} {', '.join(conn.label for conn in ip_conn)}",
+        target=target,
+        args=args,
+    ).start()
+
+
+def _receive_udp(
+    handle: obsurv.StreamHandle,
+    udp_conns: list[IpParam],
+    nmea_q: Queue[str],
+    tag_source: bool,
+):
+    """Listen on UDP port(s) and populate queue with NMEA stream."""
+    with selectors.DefaultSelector() as selector:
+        try:
+            for udp_conn in udp_conns:
+                framer = NmeaFramer(
+                    udp_conn.buffer, handle.stats, udp_conn.sentences, udp_conn.talkers
+                )
+                selector.register(
+                    _open_udp_socket(udp_conn),
+                    selectors.EVENT_READ,
+                    (udp_conn.label, framer),
+                )
+
+            # Listen for incomming datagrams
+            while not handle.stopped:
+                for key, _ in selector.select(timeout=SOCKET_TIMEOUT):
+                    label, framer = key.data
+                    try:
+                        nbytes = framer.recv_into(key.fileobj)
+                    except BlockingIOError:
+                        continue
+                    if not nbytes:
+                        continue
+                    # Each datagram contains only complete sentences, which
+                    # may not be terminated by <CR><LF>.
+                    sentences = framer.sentences(final=True)
+                    if tag_source:
+                        sentences = _tag(sentences, label)
+                    _put_many(nmea_q, sentences)
+        finally:
+            for key in list(selector.get_map().values()):
+                key.fileobj.close()
+
+
+def _open_udp_socket(udp_conn: IpParam) -> socket.socket:
+    """Bind a UDP socket, joining the multicast group if specified."""
+    nmea_server = socket.socket(family=socket.AF_INET, type=socket.SOCK_DGRAM)
+    _set_rcvbuf(nmea_server, udp_conn.rcvbuf)
+    if udp_conn.group:
+        # Allow other applications to receive the same multicast group.
+        nmea_server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        nmea_server.bind(("", udp_conn.port))
+        membership = socket.inet_aton(udp_conn.group) + socket.inet_aton(udp_conn.addr)
+        nmea_server.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
         print(
-            f"Listening for UDP stream locally on "
-            f"{udp_conn.addr}:{udp_conn.port}..."
+            f"Listening for UDP multicast stream {udp_conn.group}:{udp_conn.port} "
+            f"on {udp_conn.addr}..."
         )
-
-        # Listen for incomming datagrams
-        while True:
-            message = nmea_server.recv(udp_conn.buffer)
-            if message:
-                nmea_lines = _msg_to_sentences(message)
-                for line in nmea_lines:
-                    nmea_q.put(line)
+    else:
+        nmea_server.bind((udp_conn.addr, udp_conn.port))
+        print(f"Listening for UDP stream locally on {udp_conn.addr}:{udp_conn.port}...")
+    nmea_server.setblocking(False)
+    return nmea_server
 
 
-def _receive_tcp(tcp_conn: IpParam, nmea_q: Queue[str]):
+def _receive_tcp(
+    handle: obsurv.StreamHandle,
+    tcp_conn: IpParam,
+    nmea_q: Queue[str],
+    tag_source: bool = False,
+):
     """Connect to TCP server and populate nmea_q with NMEA sentences.
 
-    If a TCP timeout error it will populate nmea_q with str "TimeoutError".
+    If the server is unavailable or the connection is lost, the first attempt
+    to reconnect is immediate, then the delay between attempts doubles (with
+    random jitter) up to RECONNECT_DELAY_MAX. Reconnections and failed
+    connection attempts are counted in handle.stats. The delay is only reset
+    once data is received, so a server that accepts connections and then
+    closes them is not reconnected to in a tight loop.
+
+    If tcp_conn.outage is set and no data is received for that many seconds
+    it will populate nmea_q with str "TimeoutError".
     """
-    timeout_notified = False
-    oserr_notified = False
-    while True:
+    attempt = 0  # Number of consecutive connection attempts without data.
+    connected_before = False
+    failure_reported = False
+    last_data = monotonic()
+    timeout_queued = False
+    while not handle.stopped:
+        delay = _reconnect_delay(attempt)
+        while delay > 0 and not handle.wait(min(delay, SOCKET_TIMEOUT)):
+            delay -= SOCKET_TIMEOUT
+            timeout_queued = timeout_queued or _queue_outage(
+                tcp_conn, nmea_q, last_data
+            )
+        if handle.stopped:
+            break
         try:
             with socket.socket(
                 family=socket.AF_INET, type=socket.SOCK_STREAM
             ) as nmea_client:
-                conn_rfsd_notified = False
-                while True:
+                _set_rcvbuf(nmea_client, tcp_conn.rcvbuf)
+                nmea_client.settimeout(5)
+                nmea_client.connect((tcp_conn.addr, tcp_conn.port))
+                nmea_client.settimeout(SOCKET_TIMEOUT)
+                if connected_before:
+                    handle.stats.reconnects += 1
+                connected_before = True
+                failure_reported = False
+                print(
+                    f"*** Connected to TCP server at {tcp_conn.addr}:{tcp_conn.port}."
+                )
+
+                # Listen for incomming data stream
+                framer = NmeaFramer(
+                    tcp_conn.buffer, handle.stats, tcp_conn.sentences, tcp_conn.talkers
+                )
+                while not handle.stopped:
                     try:
-                        nmea_client.settimeout(5)
-                        nmea_client.connect((tcp_conn.addr, tcp_conn.port))
-                        nmea_client.settimeout(None)
+                        nbytes = framer.recv_into(nmea_client)
+                    except TimeoutError:
+                        timeout_queued = timeout_queued or _queue_outage(
+                            tcp_conn, nmea_q, last_data
+                        )
+                        continue
+                    if not nbytes:
+                        print(
+                            f"*** TCP server {tcp_conn.addr}:{tcp_conn.port} "
+                            f"closed the connection. Reconnecting..."
+                        )
                         break
+                    last_data = monotonic()
+                    timeout_queued = False
+                    attempt = 0
+                    sentences = framer.sentences()
+                    if tag_source:
+                        sentences = _tag(sentences, tcp_conn.label)
+                    _put_many(nmea_q, sentences)
 
-                    except (ConnectionRefusedError, ConnectionAbortedError):
-                        if not conn_rfsd_notified:
-                            print(
-                                f"*** TCP server {tcp_conn.addr}:{tcp_conn.port} is "
-                                f"not currently providing a connection. Waiting..."
-                            )
-                            conn_rfsd_notified = True
+        except OSError as error:
+            # Includes refused, aborted and timed out connections, and network
+            # disconnection.
+            handle.stats.connect_failures += 1
+            if not failure_reported:
                 print(
-                    f"*** Connected to TCP server at "
-                    f"{tcp_conn.addr}:{tcp_conn.port}."
+                    f"*** TCP server {tcp_conn.addr}:{tcp_conn.port} is not "
+                    f"available ({error}). Retrying..."
                 )
+                failure_reported = True
+        attempt += 1
+        timeout_queued = timeout_queued or _queue_outage(tcp_conn, nmea_q, last_data)
+
+
+def _reconnect_delay(attempt: int) -> float:
+    """Return delay before the next connection attempt, with random jitter."""
+    if attempt <= 1:
+        return 0.0
+    delay = min(RECONNECT_DELAY * 2 ** (attempt - 2), RECONNECT_DELAY_MAX)
+    return delay * random.uniform(0.5, 1.0)
 
-                # Listen for incomming data stream
-                conn_rfsd_notified = False
-                no_nmea_notified = False
-                oserr_notified = False
-                while True:
-                    message = nmea_client.recv(tcp_conn.buffer)
-                    if message:
-                        nmea_lines = _msg_to_sentences(message)
-                        for line in nmea_lines:
-                            nmea_q.put(line)
-                        no_nmea_notified = False
-                    else:
-                        if not no_nmea_notified:
-                            print(
-                                f"*** Waiting for NMEA message from TCP server."
-                                f"{tcp_conn.addr}:{tcp_conn.port}."
-                            )
-                            no_nmea_notified = True
-
-        except ConnectionAbortedError:
-            print(
-                f"Connection to TCP server {tcp_conn.addr}:{tcp_conn.port} was "
-                f"aborted. Attempting to reconnect..."
-            )
 
-        except TimeoutError:
-            if not timeout_notified:
+def _queue_outage(tcp_conn: IpParam, nmea_q: Queue[str], last_data: float) -> bool:
+    """Queue "TimeoutError" if no data has been received for the outage time."""
+    if not tcp_conn.outage or monotonic() - last_data < tcp_conn.outage:
+        return False
+    print(
+        f"*** No data from TCP server {tcp_conn.addr}:{tcp_conn.port} for "
+        f"{tcp_conn.outage} seconds."
+    )
+    nmea_q.put("TimeoutError")
+    return True
+
+
+class NmeaFramer:
+    """Split a stream of received bytes into NMEA sentences.
+
+    Bytes are received directly into a preallocated buffer. Complete sentences
+    are extracted, and any partial sentence at the end of the buffer is kept
+    until the remainder is received.
+
+    Sentence types are the characters of the address field following the
+    two character talker ID (eg "GGA" for "$GPGGA", "SHR" for "$PASHR").
+    """
+
+    def __init__(
+        self,
+        size: int = 2048,
+        stats: obsurv.StreamStats = None,
+        sentences: tuple[str] = None,
+        talkers: tuple[str] = None,
+    ):
+        """Initialise the framer.
+
+        Args:
+            size (int, optional): Maximum bytes received by each read. The
+                buffer also retains up to this many bytes of partial sentence.
+                Defaults to 2048.
+            stats (obsurv.StreamStats, optional): Counters to be updated with
+                bytes and sentences received. Defaults to None.
+            sentences (tuple[str], optional): Sentence types to accept.
+                Defaults to None (all types).
+            talkers (tuple[str], optional): Talker IDs to accept. Defaults
+                to None (all talkers).
+        """
+        self.size = size
+        self.stats = stats
+        self._types = None
+        if sentences:
+            self._types = frozenset(item.upper().encode("ascii") for item in sentences)
+        self._talkers = None
+        if talkers:
+            self._talkers = frozenset(item.upper().encode("ascii") for item in talkers)
+        self._buffer = bytearray(2 * size)
+        self._view = memoryview(self._buffer)
+        self._end = 0  # Number of bytes held in the buffer.
+
+    def recv_into(self, sock: socket.socket) -> int:
+        """Receive from socket into the buffer, returning number of bytes."""
+        nbytes = sock.recv_into(self._view[self._end : self._end + self.size])
+        self._end += nbytes
+        if self.stats:
+            self.stats.bytes += nbytes
+        return nbytes
+
+    def sentences(self, final: bool = False) -> list[str]:
+        """Return the complete sentences held in the buffer.
+
+        Args:
+            final (bool, optional): If True the end of the buffer is also
+                treated as the end of a sentence (eg for a UDP datagram).
+                Defaults to False.
+        """
+        sentences = []
+        buffer = self._buffer
+        start = 0
+        while True:
+            eol = buffer.find(b"\n", start, self._end)
+            if eol < 0:
+                break
+            if eol > start and self._accept(start, eol):
+                sentences.append(self._decode(start, eol))
+            start = eol + 1
+
+        if final:
+            if self._end > start and self._accept(start, self._end):
+                sentences.append(self._decode(start, self._end))
+            self._end = 0
+        elif start:
+            # Move the partial sentence to the beginning of the buffer.
+            remaining = self._end - start
+            self._view[:remaining] = self._view[start : self._end]
+            self._end = remaining
+        elif self._end > self.size:
+            # No sentence terminator found. Discard as invalid data.
+            self._end = 0
+            if self.stats:
+                self.stats.parse_errors += 1
+
+        sentences = [sentence for sentence in sentences if sentence]
+        if self.stats and sentences:
+            self.stats.record(sentences=len(sentences))
+        return sentences
+
+    def _accept(self, start: int, end: int) -> bool:
+        """Return True if the sentence type and talker are to be accepted."""
+        if self._types is None and self._talkers is None:
+            return True
+        begin = self._buffer.find(b"$", start, end) + 1
+        if begin:
+            addr_end = self._buffer.find(b",", begin, end)
+            if addr_end < 0:
+                addr_end = end
+            address = bytes(self._view[begin:addr_end])
+            if (self._talkers is None or address[:2] in self._talkers) and (
+                self._types is None or address[2:] in self._types
+            ):
+                return True
+        if self.stats:
+            self.stats.filtered += 1
+        return False
+
+    def _decode(self, start: int, end: int) -> str:
+        return str(self._view[start:end], "utf-8", errors="replace").strip()
+
+
+def nmea_failover_stream(
+    primary_conn: IpParam,
+    standby_conn: IpParam,
+    nmea_q: Queue[str],
+    window: float = 1.5,
+    tag_source: bool = False,
+) -> obsurv.StreamHandle:
+    """Initiate a queue receiving NMEA from a primary source, or a standby.
+
+    Sentences from the primary source are queued as by nmea_ip_stream(), with
+    no additional processing, tagged as by nmea_ip_stream() if tag_source is
+    True. If no sentence has been received from the
+    primary for longer than window seconds (and the standby is receiving),
+    sentences from the standby are queued instead until the primary resumes.
+    Standby sentences are queued as tuples of (sentence, datetime received,
+    source label).
+
+    The window must be longer than the interval between the primary's
+    sentences. A few hundred milliseconds is sufficient for a receiver
+    outputting at 5 Hz or more, but at 1 Hz it must exceed one second.
+
+    The TCP outage of both sources is disabled, so "TimeoutError" is never
+    queued.
+
+    Returns a StreamHandle which may be used to stop the stream. The primary
+    and standby streams are its children.
+    """
+    return obsurv.StreamHandle(
+        name=f"NMEA failover {primary_conn.label} / {standby_conn.label}",
+        target=_monitor_failover,
+        args=(nmea_q, primary_conn, standby_conn, window, tag_source),
+    ).start()
+
+
+def _monitor_failover(
+    handle: obsurv.StreamHandle,
+    nmea_q: Queue[str],
+    primary_conn: IpParam,
+    standby_conn: IpParam,
+    window: float,
+    tag_source: bool,
+):
+    """Switch between the primary and standby NMEA sources.
+
+    While the primary is active this only checks the age of its last sentence
+    every quarter window, and discards sentences received from the standby.
+    While the standby is active its sentences are forwarded to nmea_q, and
+    counted in handle.stats.
+    """
+    primary = nmea_ip_stream(
+        replace(primary_conn, outage=0), nmea_q, tag_source=tag_source
+    )
+    standby_q: Queue[tuple] = Queue()
+    standby = nmea_ip_stream(
+        replace(standby_conn, outage=0), standby_q, tag_source=True
+    )
+    handle.children.extend((primary, standby))
+
+    on_standby = False
+    failover_time = None
+    while not handle.stopped:
+        if not on_standby:
+            handle.wait(window / 4)
+            _discard(standby_q)
+            if _age(primary.stats) > window and _age(standby.stats) <= window:
+                on_standby = True
+                failover_time = primary.stats.last_msg_time
                 print(
-                    f"TCP server {tcp_conn.addr}:{tcp_conn.port} is not "
-                    f"available. Waiting..."
+                    f"!!! No NMEA from {primary_conn.label} for "
+                    f"{window} seconds. Switched to standby {standby_conn.label}."
                 )
-                timeout_notified = True
+            continue
+
+        if primary.stats.last_msg_time != failover_time:
+            on_standby = False
+            print(f"*** NMEA from {primary_conn.label} resumed. Switched from standby.")
+            continue
+        try:
+            items = [standby_q.get(timeout=0.05)]
+        except Empty:
+            continue
+        items.extend(_discard(standby_q))
+        _put_many(nmea_q, items)
+        handle.stats.record(sentences=len(items))
+
+
+def _age(stats: obsurv.StreamStats) -> float:
+    """Seconds since the last sentence (infinite if none received)."""
+    age = stats.last_msg_age
+    return float("inf") if age is None else age
+
+
+def _discard(queue: Queue) -> list:
+    """Remove and return all items from the queue."""
+    with queue.mutex:
+        items = list(queue.queue)
+        queue.queue.clear()
+    return items
+
+
+def _tag(sentences: list[str], label: str) -> list[tuple[str, datetime, str]]:
+    """Tag sentences with the time received and their source label."""
+    received = datetime.now(UTC)
+    return [(sentence, received, label) for sentence in sentences]
 
-        except OSError:
-            if not oserr_notified:
-                print("Network has been disconnected.")
-            oserr_notified = True
 
+def _set_rcvbuf(sock: socket.socket, rcvbuf: int):
+    """Set the socket receive buffer size if specified."""
+    if rcvbuf:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
 
-def _msg_to_sentences(message: str) -> list[str]:
-    message = message.decode("utf-8")
-    nmea_sentences = []
-    for sentence in message.splitlines():
-        nmea_sentences.append(sentence.strip())
 
-    return nmea_sentences
+def _put_many(queue: Queue, items: list):
+    """Put each of the items in the queue, respecting its maxsize."""
+    for item in items:
+        queue.put(item)
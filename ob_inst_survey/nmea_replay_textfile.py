@@ -1,10 +1,14 @@
 """Simulates an NMEA stream from a previously saved NMEA text file."""
 
 import re
-from datetime import datetime, timedelta, timezone
+from collections.abc import Iterator
+from datetime import UTC, datetime, timedelta
 from queue import Queue
-from threading import Thread
-from time import sleep
+from typing import BinaryIO
+
+import ob_inst_survey as obsurv
+
+PARSER_VERSION = 1  # Version of the cached sentences of each file.
 
 
 def nmea_replay_textfile(
@@ -13,61 +17,156 @@ def nmea_replay_textfile(
     actltime_start: datetime = None,
     timestamp_start: datetime = None,
     spd_fctr: float = 1,
-):
-    """Initiate a queue simulating an NMEA data stream from a text file."""
-    Thread(
+    context: obsurv.SurveyContext = None,
+) -> obsurv.StreamHandle:
+    """Initiate a queue simulating an NMEA data stream from a text file.
+
+    Replay is timed relative to actltime_start, which defaults to the start
+    time of the survey context (if provided) so that all replayed streams of
+    the session are synchronised, otherwise to the current time.
+
+    Returns a StreamHandle which may be used to stop the replay.
+    """
+    if not actltime_start and context:
+        actltime_start = context.start_time
+    return obsurv.StreamHandle(
+        name=f"NMEA replay {filename}",
         target=__nmea_from_file,
         args=(filename, nmea_q, actltime_start, timestamp_start, spd_fctr),
-        daemon=True,
     ).start()
 
 
+def read_nmea_textfile(
+    filename: str,
+    stats: obsurv.StreamStats = None,
+    timestamp_start: datetime = None,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    """Yield (timestamp, sentence, bytes, byte offset) for each NMEA sentence.
+
+    NMEA timestamps do not include the date, so each is the time of day on
+    1900-01-01, advanced a day at each midnight. Sentences without a
+    timestamp take that of the preceding sentence (or of the first timestamp
+    for those before it). Lines that are not NMEA sentences are counted as
+    parse errors in stats.
+
+    If timestamp_start is given, reading starts from the time index entry
+    preceding it (see replay_index()) and earlier sentences are skipped.
+
+    The filename may also be a directory or glob of rotated log files (see
+    replay_files()), which are read as one continuous stream. Once a file has
+    been read to the end its sentences are cached (see parse_cache), so it is
+    only parsed again if it changes.
+    """
+    files = obsurv.replay_files(filename)
+    if len(files) > 1:
+        yield from obsurv.read_replay_files(
+            files,
+            "nmea",
+            lambda nmea_file, start: _read_nmea_file(nmea_file, stats, start),
+            timestamp_start,
+        )
+    else:
+        yield from _read_nmea_file(files[0], stats, timestamp_start)
+
+
+def _read_nmea_file(
+    filename: str,
+    stats: obsurv.StreamStats,
+    timestamp_start: datetime,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    offset = 0
+    timestamp_date = datetime(1900, 1, 1)
+    if timestamp_start:
+        index = obsurv.replay_index(filename, "nmea")
+        timestamp_start = index.virtual_timestamp(timestamp_start)
+        offset, timestamp_date = index.seek(timestamp_start)
+    cached = obsurv.load_cached_table(filename, "nmea lines", PARSER_VERSION)
+    if cached is not None:
+        yield from obsurv.cached_lines(cached, stats, offset, timestamp_start)
+        return
+    with obsurv.open_logfile(filename, "rb") as nmea_file:
+        nmea_file.seek(offset)
+        counter = stats or obsurv.StreamStats()
+        lines = _nmea_lines(nmea_file, offset, timestamp_date, counter)
+        if not offset:
+            lines = obsurv.caching_lines(
+                filename, "nmea lines", PARSER_VERSION, lines, counter
+            )
+        for line in lines:
+            if timestamp_start and line[0] < timestamp_start:
+                continue
+            yield line
+
+
+def _nmea_lines(
+    nmea_file: BinaryIO,
+    offset: int,
+    timestamp_date: datetime,
+    stats: obsurv.StreamStats,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    timestamp_prev = None
+    pending = []  # Sentences preceding the first timestamp.
+    for line in nmea_file:
+        line_offset = offset
+        offset += len(line)
+        sentence = re.sub(r"^.*\$", "$", line.decode("utf-8").strip())
+        nmea_items = sentence.split(sep=",")
+        if len(nmea_items) < 2:
+            if stats:
+                stats.parse_errors += 1
+            continue
+        if re.match(r"\d{6}\.\d{0,4}", nmea_items[1]):
+            if nmea_items[1][:6] == "240000":
+                # At UTC midnight timestamp may incorrectly show hrs as 24.
+                nmea_items[1] = "000000.000"
+            time_of_day = datetime.strptime(nmea_items[1], "%H%M%S.%f")
+            timestamp_curr = datetime.combine(timestamp_date, time_of_day.time())
+            if timestamp_prev and timestamp_curr.hour < timestamp_prev.hour:
+                timestamp_date = timestamp_date + timedelta(days=1)
+                timestamp_curr = timestamp_curr + timedelta(days=1)
+            timestamp_prev = timestamp_curr
+            for pending_line in pending:
+                yield timestamp_curr, *pending_line
+            pending = []
+        if timestamp_prev is None:
+            pending.append((sentence, len(line), line_offset))
+            continue
+        yield timestamp_prev, sentence, len(line), line_offset
+    for pending_line in pending:
+        yield timestamp_date, *pending_line
+
+
 def __nmea_from_file(
+    handle: obsurv.StreamHandle,
     filename: str,
     nmea_q: Queue[str],
     actltime_start: datetime,
     timestamp_start: datetime,
     spd_fctr: int,
 ):
-    timestamp_prev = timestamp_start
-    timestamp_date = None
     if not actltime_start:
-        actltime_start = datetime.now(timezone.utc)
-    with open(filename, encoding="utf-8") as nmea_file:
-        for sentence in nmea_file:
-            sentence = re.sub(r"^.*\$", "$", sentence.strip())
-            nmea_items = sentence.split(sep=",")
-            if re.match(r"\d{6}\.\d{0,4}", nmea_items[1]):
-                if nmea_items[1][:6] == "240000":
-                    # At UTC midnight timestamp may incorrectly show hrs as 24.
-                    nmea_items[1] = "000000.000"
-                timestamp_curr = datetime.strptime(nmea_items[1], "%H%M%S.%f")
-                secs = (
-                    timestamp_curr.hour * 3600
-                    + timestamp_curr.minute * 60
-                    + timestamp_curr.second
-                    + timestamp_curr.microsecond / 1e6
-                )
-                timestamp_delta = timedelta(seconds=secs)
-                if not timestamp_date:
-                    timestamp_date = datetime(1900, 1, 1)
-                timestamp_curr = timestamp_date + timestamp_delta
-                if not timestamp_start:
-                    timestamp_start = timestamp_curr
-                    timestamp_prev = timestamp_start
-                if timestamp_curr.hour < timestamp_prev.hour:
-                    timestamp_date = timestamp_date + timedelta(days=1)
-                timestamp_prev = timestamp_curr
-                timestamp_diff = timestamp_curr - timestamp_start
-
-                while True:
-                    # Pause until time for next NMEA sentence
-                    sleep(0.000001)  # Prevents idle loop from 100% CPU thread usage.
-                    now = datetime.now(timezone.utc)
-                    actltime_diff = (now - actltime_start) * spd_fctr
-                    if actltime_diff >= timestamp_diff:
-                        break
-            nmea_q.put(sentence)
+        actltime_start = datetime.now(UTC)
+    if timestamp_start:
+        timestamp_start = obsurv.replay_index(filename, "nmea").virtual_timestamp(
+            timestamp_start
+        )
+    for timestamp_curr, sentence, nbytes, _ in read_nmea_textfile(
+        filename, handle.stats, timestamp_start
+    ):
+        if handle.stopped:
+            return
+        if not timestamp_start:
+            timestamp_start = timestamp_curr
+        timestamp_diff = timestamp_curr - timestamp_start
+
+        if spd_fctr:
+            # Pause until time for next NMEA sentence
+            due = actltime_start + timestamp_diff / spd_fctr
+            delay = (due - datetime.now(UTC)).total_seconds()
+            if delay > 0 and handle.wait(delay):
+                return
+        nmea_q.put(sentence)
+        handle.stats.record(nbytes)
 
     nmea_q.put("EOF")
 
@@ -0,0 +1,426 @@
+"""Convert raw NMEA and EdgeTech logs to ranging observations in bulk.
+
+Rather than replaying the logs through ranging_survey_stream(), each log is
+parsed at once into a table: the NMEA log into a table of fixes (one per
+epoch) and each EdgeTech log into a table of range responses. Each range is
+then paired with a fix by an as-of merge on time, so a whole survey is
+converted in seconds. The observations have the columns OBSVN_COLS of
+ranging_survey_stream(), with missing values left blank.
+
+As in the stream, the sentences of an epoch are those following the first
+GGA, RMC or SHR sentence with its timestamp, including any VTG and HDT
+sentences. Epochs without a GGA or RMC position (or with an invalid one), and
+epochs with a timestamp no later than a preceding fix, are skipped. Each range
+is paired with the first fix at or after the time of the range response, or if
+interpolate is True with a position interpolated between the fixes either side
+of it.
+
+NMEA timestamps do not include the date, so the NMEA log is taken to start on
+the same date as the first range response, unless their times of day are more
+than 12 hours apart (in which case the adjacent date).
+
+The parsed table of each log is cached (see parse_cache), so logs are only
+parsed again if they change.
+"""
+
+import csv
+import io
+from pathlib import Path
+
+import pandas as pd
+
+import ob_inst_survey as obsurv
+
+# Fields read as text (rather than numbers) of each sentence type used.
+SENTENCE_TYPES = {
+    b"GGA,": (0, 1, 2, 3, 4, 5, 10, 12),
+    b"RMC,": (0, 1, 3, 4, 5, 6),
+    b"VTG,": (0,),
+    b"HDT,": (0,),
+    b"SHR,": (0,),
+}
+TIMED_TYPES = (b"GGA,", b"RMC,", b"SHR,")  # Types including a timestamp.
+NMEA_FIELDS = 24  # Maximum fields of a sentence. Longer sentences are ignored.
+FIX_COLS = (
+    "utcTime",
+    "lat",
+    "latDec",
+    "lon",
+    "lonDec",
+    "qlty",
+    "noSats",
+    "hdop",
+    "htAmsl",
+    "htAmslUnit",
+    "geiodSep",
+    "geiodSepUnit",
+    "cog",
+    "sogKt",
+    "heading",
+    "roll",
+    "pitch",
+    "heave",
+    "nmeaSrc",
+    "fixSeconds",
+)
+RANGE_COLS = (
+    "rangeTime",
+    "range",
+    "turnTime",
+    "sndSpd",
+    "tx",
+    "rx",
+    "rngSrc",
+    "rangeDatetime",
+)
+PARSER_VERSION = 2  # Version of the cached fix and range tables.
+ETECH_TIMESTAMP = (
+    r"^\s*(\d{4}[:_-]\d{2}[:_-]\d{2}[Tt :_-]\d{2}[:_-]\d{2}[:_-]\d{2}\.\d{0,6})"
+)
+
+
+def convert_raw_logs(
+    nmea_filename: Path,
+    etech_filename: Path | list[Path],
+    etech_conn: obsurv.EtechParam | list[obsurv.EtechParam] = None,
+    timestamp_offset: float = 0.0,
+    interpolate: bool = False,
+) -> pd.DataFrame:
+    """Convert raw NMEA and EdgeTech logs to a table of observations.
+
+    Args:
+        nmea_filename (Path): NMEA log.
+        etech_filename (Path | list[Path]): EdgeTech log of each ranging
+            source.
+        etech_conn (obsurv.EtechParam | list[obsurv.EtechParam], optional):
+            Acoustic parameters and label of each ranging source, as for
+            ranging_survey_stream(). Defaults to EtechParam().
+        timestamp_offset (float, optional): Seconds added to EdgeTech
+            timestamps to bring them in sync with NMEA. Defaults to 0.
+        interpolate (bool, optional): Interpolate the position of each range
+            between the fixes either side of it, rather than using the first
+            fix at or after it. Defaults to False.
+
+    Returns:
+        pd.DataFrame: An observation for each range paired with a fix, in
+            order of time, with the columns OBSVN_COLS.
+    """
+    if not isinstance(etech_filename, (list, tuple)):
+        etech_filename = [etech_filename]
+    if etech_conn is None:
+        etech_conn = [obsurv.EtechParam()]
+    if not isinstance(etech_conn, (list, tuple)):
+        etech_conn = [etech_conn]
+
+    ranges = []
+    for idx, filename in enumerate(etech_filename):
+        # Use acoustic parameters of matching connection if provided,
+        # otherwise those of the first connection.
+        conn = etech_conn[idx] if idx < len(etech_conn) else etech_conn[0]
+        label = conn.label if idx < len(etech_conn) and conn.label else ""
+        ranges.append(
+            read_range_table(
+                filename,
+                conn,
+                label or obsurv.uncompressed_filename(filename).stem,
+                timestamp_offset,
+            )
+        )
+    range_df = pd.concat(ranges, ignore_index=True)
+    range_df = range_df.sort_values("rangeDatetime", kind="stable")
+    fix_df = read_fix_table(nmea_filename)
+    if range_df.empty or fix_df.empty:
+        return pd.DataFrame(columns=obsurv.OBSVN_COLS)
+
+    fix_df["fixDatetime"] = _fix_datetimes(
+        fix_df["fixSeconds"], range_df["rangeDatetime"].iloc[0]
+    )
+    obsvn_df = pd.merge_asof(
+        range_df,
+        fix_df,
+        left_on="rangeDatetime",
+        right_on="fixDatetime",
+        direction="forward",
+    )
+    if interpolate:
+        obsvn_df = _interpolate_position(obsvn_df, fix_df)
+    obsvn_df = obsvn_df.dropna(subset=["fixDatetime"])
+    obsvn_df["flag"] = "replay"
+    return obsvn_df.loc[:, list(obsurv.OBSVN_COLS)].reset_index(drop=True)
+
+
+def read_fix_table(filename: Path, nmea_src: str = None) -> pd.DataFrame:
+    """Parse an NMEA log into a table with a row for each fix.
+
+    Sentences with an invalid checksum are ignored. Columns are the NMEA
+    fields of OBSVN_COLS, plus "fixSeconds", the seconds from midnight of
+    the first day of the log.
+
+    Args:
+        filename (Path): NMEA log, which may be compressed.
+        nmea_src (str, optional): Value of "nmeaSrc". Defaults to the name of
+            the file.
+    """
+    if nmea_src is None:
+        nmea_src = obsurv.uncompressed_filename(filename).stem
+    fix_df = obsurv.cached_table(
+        filename, "fixes", PARSER_VERSION, lambda: _parse_fixes(filename)
+    )
+    fix_df["nmeaSrc"] = nmea_src
+    return fix_df.loc[:, list(FIX_COLS)]
+
+
+def _parse_fixes(filename: Path) -> pd.DataFrame:
+    """Parse the fixes of an NMEA log, without their source."""
+    with obsurv.open_logfile(filename, "rb") as nmea_file:
+        block = nmea_file.read()
+
+    # Keep the body (between "$" and "*") of each valid sentence of interest,
+    # prefixed by the number of its epoch. A new epoch starts at each timed
+    # sentence with a different timestamp from the previous timed sentence.
+    bodies = {nmea_type: [] for nmea_type in SENTENCE_TYPES}
+    epoch, ts_prev = 0, None
+    lines = block.split(b"\n")
+    if not block or block.endswith(b"\n"):
+        lines.pop()  # Final empty line, excluded by nmea_checksum_block().
+    for line, valid in zip(lines, obsurv.nmea_checksum_block(block), strict=True):
+        if not valid:
+            continue
+        start = line.rfind(b"$") + 1
+        nmea_type = line[start + 2 : start + 6]
+        if nmea_type not in bodies:
+            continue
+        if nmea_type in TIMED_TYPES:
+            ts_msg = line[start + 6 : start + 14].split(b",")[0]
+            if ts_msg != ts_prev:
+                epoch += 1
+                ts_prev = ts_msg
+        # Sentences before the first timestamp belong to the first epoch.
+        bodies[nmea_type].append(
+            b"%d,%s" % (max(epoch, 1), line[start : line.index(b"*", start)])
+        )
+
+    # Split the sentences of each type into fields at once, and keep the
+    # last sentence of each type in each epoch.
+    sentences = {
+        nmea_type.decode()[:3]: _read_fields(lines, SENTENCE_TYPES[nmea_type])
+        for nmea_type, lines in bodies.items()
+    }
+    gga, rmc = sentences["GGA"], sentences["RMC"]
+    epochs = gga.index.union(rmc.index)
+    if epochs.empty:
+        return pd.DataFrame(columns=FIX_COLS)
+    gga = gga.reindex(epochs)
+    rmc = rmc.reindex(epochs)
+    vtg = sentences["VTG"].reindex(epochs)
+    hdt = sentences["HDT"].reindex(epochs)
+    shr = sentences["SHR"].reindex(epochs)
+    has_gga = gga[0].notna()
+
+    fix_df = pd.DataFrame(index=epochs)
+    # A timestamp of 24:00:00 (as at UTC midnight) is 86400 seconds, so is
+    # correctly followed by a rollover to the next day.
+    time = gga[1].where(has_gga, rmc[1]).fillna("")
+    fix_df["utcTime"] = time.str[0:2] + ":" + time.str[2:4] + ":" + time.str[4:]
+    time = _numeric(time)
+    fix_df["fixSeconds"] = (
+        (time // 10000) * 3600 + (time // 100 % 100) * 60 + time % 100
+    )
+    lat = gga[2].where(has_gga, rmc[3]).fillna("")
+    lat_hemi = gga[3].where(has_gga, rmc[4]).fillna("")
+    lon = gga[4].where(has_gga, rmc[5]).fillna("")
+    lon_hemi = gga[5].where(has_gga, rmc[6]).fillna("")
+    lat_deg, lat_min = lat.str[0:2], lat.str[2:11]
+    lon_deg, lon_min = lon.str[0:3], lon.str[3:12]
+    fix_df["lat"] = lat_deg + "°" + lat_min + "'" + lat_hemi
+    fix_df["latDec"] = _numeric(lat_deg) + _numeric(lat_min) / 60
+    fix_df["latDec"] = fix_df["latDec"].where(
+        lat_hemi.str.upper() != "S", -fix_df["latDec"]
+    )
+    fix_df["lon"] = lon_deg + "°" + lon_min + "'" + lon_hemi
+    fix_df["lonDec"] = _numeric(lon_deg) + _numeric(lon_min) / 60
+    fix_df["lonDec"] = fix_df["lonDec"].where(
+        lon_hemi.str.upper() != "W", -fix_df["lonDec"]
+    )
+
+    fix_df["qlty"] = _numeric(gga[6]).map(dict(enumerate(obsurv.FIX_QUALITY)))
+    fix_df["noSats"] = _numeric(gga[7]).round().astype("Int64")
+    fix_df["hdop"] = _numeric(gga[8])
+    fix_df["htAmsl"] = _numeric(gga[9])
+    fix_df["htAmslUnit"] = gga[10].fillna("").str.upper()
+    fix_df["geiodSep"] = _numeric(gga[11])
+    fix_df["geiodSepUnit"] = gga[12].fillna("").str.upper()
+
+    has_vtg = vtg[0].notna()
+    fix_df["cog"] = _numeric(vtg[1]).where(has_vtg, _numeric(rmc[8]))
+    fix_df["sogKt"] = _numeric(vtg[5]).where(has_vtg, _numeric(rmc[7]))
+    has_shr = shr[0].notna()
+    fix_df["heading"] = _numeric(shr[2]).where(has_shr, _numeric(hdt[1]))
+    fix_df["roll"] = _numeric(shr[4])
+    fix_df["pitch"] = _numeric(shr[5])
+    fix_df["heave"] = _numeric(shr[6])
+
+    fix_df = fix_df.dropna(subset=["fixSeconds", "latDec", "lonDec"])
+    # Count days from the start of the log, advancing at each midnight.
+    rollovers = (fix_df["fixSeconds"].diff() < -43200).cumsum()
+    fix_df["fixSeconds"] = fix_df["fixSeconds"] + rollovers * 86400
+    # Drop fixes with a timestamp stepping backwards (other than at midnight),
+    # so the fixes are in order of time for pairing with ranges.
+    latest = fix_df["fixSeconds"].cummax().shift(fill_value=float("-inf"))
+    fix_df = fix_df[fix_df["fixSeconds"] > latest]
+    return fix_df.reset_index(drop=True)
+
+
+def read_range_table(
+    filename: Path,
+    etech_conn: obsurv.EtechParam = None,
+    label: str = None,
+    timestamp_offset: float = 0.0,
+) -> pd.DataFrame:
+    """Parse an EdgeTech log into a table with a row for each range response.
+
+    Lines without a valid timestamp, and responses that are incomplete, are
+    ignored. Columns are the ranging fields of OBSVN_COLS, plus
+    "rangeDatetime", the timestamp of the response plus timestamp_offset.
+
+    Args:
+        filename (Path): EdgeTech log, which may be compressed.
+        etech_conn (obsurv.EtechParam, optional): Turn time and speed of
+            sound. Defaults to EtechParam().
+        label (str, optional): Value of "rngSrc". Defaults to the name of the
+            file.
+        timestamp_offset (float, optional): Seconds added to EdgeTech
+            timestamps to bring them in sync with NMEA. Defaults to 0.
+    """
+    if etech_conn is None:
+        etech_conn = obsurv.EtechParam()
+    if label is None:
+        label = obsurv.uncompressed_filename(filename).stem
+    range_df = obsurv.cached_table(
+        filename, "ranges", PARSER_VERSION, lambda: _parse_ranges(filename)
+    )
+    range_df["rangeDatetime"] += pd.Timedelta(seconds=timestamp_offset)
+    range_df["turnTime"] = etech_conn.turn_time
+    range_df["sndSpd"] = etech_conn.snd_spd
+    range_df["range"] = (range_df["rangeTime"] / 2) * range_df["sndSpd"]
+    range_df["rngSrc"] = label
+    return range_df.loc[:, list(RANGE_COLS)]
+
+
+def _parse_ranges(filename: Path) -> pd.DataFrame:
+    """Parse the time, frequencies and range time of each range response."""
+    with obsurv.open_logfile(filename, "rb") as etech_file:
+        lines = pd.Series(etech_file.read().decode("utf-8").splitlines())
+
+    lines = pd.DataFrame(
+        {
+            "timestamp": lines.str.extract(ETECH_TIMESTAMP)[0],
+            "response": lines.str.extract(r"(RNG: .*?)(?:\\r\\n')?\s*$")[0],
+        }
+    ).dropna()
+    items = lines["response"].str.split(" ", expand=True)
+    range_df = pd.DataFrame(
+        {
+            "rangeDatetime": pd.Series(dtype="datetime64[ns]"),
+            "tx": pd.Series(dtype=float),
+            "rx": pd.Series(dtype=float),
+            "rangeTime": pd.Series(dtype=float),
+        }
+    )
+    if items.shape[1] < 10:
+        return range_df
+
+    range_df = range_df.reindex(lines.index)
+    timestamp = lines["timestamp"].str.replace(r"[Tt :_-]", "_", regex=True)
+    range_df["rangeDatetime"] = pd.to_datetime(
+        timestamp, format="%Y_%m_%d_%H_%M_%S.%f"
+    ).astype("datetime64[ns]")
+    range_df["tx"] = _numeric(items[3])
+    range_df["rx"] = _numeric(items[6])
+    # Returns '--.---' if no range received.
+    range_df["rangeTime"] = _numeric(items[9]).fillna(0.0)
+    range_df = range_df[
+        items[9].notna() & range_df["tx"].notna() & range_df["rx"].notna()
+    ]
+    return range_df.reset_index(drop=True)
+
+
+def _fix_datetimes(fix_seconds: pd.Series, first_range: pd.Timestamp) -> pd.Series:
+    """Date the fixes from the date of the first range response."""
+    log_date = first_range.normalize()
+    first_fix = log_date + pd.Timedelta(seconds=fix_seconds.iloc[0])
+    if first_fix - first_range > pd.Timedelta(hours=12):
+        log_date -= pd.Timedelta(days=1)
+    elif first_range - first_fix > pd.Timedelta(hours=12):
+        log_date += pd.Timedelta(days=1)
+    return log_date + pd.to_timedelta(fix_seconds, unit="s")
+
+
+def _interpolate_position(obsvn_df: pd.DataFrame, fix_df: pd.DataFrame):
+    """Interpolate position to the time of each range from the fixes either side."""
+    prev_df = pd.merge_asof(
+        obsvn_df[["rangeDatetime"]],
+        fix_df[["fixDatetime", "latDec", "lonDec", "htAmsl"]],
+        left_on="rangeDatetime",
+        right_on="fixDatetime",
+        direction="backward",
+    )
+    interval = (obsvn_df["fixDatetime"] - prev_df["fixDatetime"]).dt.total_seconds()
+    elapsed = (obsvn_df["rangeDatetime"] - prev_df["fixDatetime"]).dt.total_seconds()
+    fraction = (elapsed / interval.where(interval > 0)).fillna(1.0)
+    fraction.index = obsvn_df.index
+
+    lat = prev_df["latDec"].values + fraction * (
+        obsvn_df["latDec"] - prev_df["latDec"].values
+    )
+    # Longitude difference is taken the short way round the antimeridian.
+    dlon = (obsvn_df["lonDec"] - prev_df["lonDec"].values + 180) % 360 - 180
+    lon = (prev_df["lonDec"].values + fraction * dlon + 180) % 360 - 180
+    height = prev_df["htAmsl"].values + fraction * (
+        obsvn_df["htAmsl"] - prev_df["htAmsl"].values
+    )
+    interpolated = fraction < 1
+    obsvn_df["latDec"] = lat.where(interpolated, obsvn_df["latDec"])
+    obsvn_df["lonDec"] = lon.where(interpolated, obsvn_df["lonDec"])
+    obsvn_df["htAmsl"] = height.where(interpolated & height.notna(), obsvn_df["htAmsl"])
+    obsvn_df.loc[interpolated, "lat"] = [
+        _format_ordinate(value, 2, "NS") for value in lat[interpolated]
+    ]
+    obsvn_df.loc[interpolated, "lon"] = [
+        _format_ordinate(value, 3, "EW") for value in lon[interpolated]
+    ]
+    obsvn_df.loc[interpolated, "utcTime"] = (
+        obsvn_df.loc[interpolated, "rangeDatetime"].dt.strftime("%H:%M:%S.%f").str[:11]
+    )
+    return obsvn_df
+
+
+def _format_ordinate(value: float, deg_digits: int, hemispheres: str) -> str:
+    """Format decimal degrees as in NMEA "lat" and "lon" values."""
+    hemi = hemispheres[0] if value >= 0 else hemispheres[1]
+    degrees, minutes = divmod(abs(value) * 60, 60)
+    return f"{int(degrees):0{deg_digits}d}°{minutes:08.5f}'{hemi}"
+
+
+def _read_fields(bodies: list[bytes], text_fields: tuple[int]) -> pd.DataFrame:
+    """Split sentences (each prefixed by its epoch) into a table of fields.
+
+    The table is indexed by epoch, with only the last sentence of each epoch.
+    """
+    fields = pd.read_csv(
+        io.BytesIO(b"\n".join(bodies)),
+        header=None,
+        names=["epoch", *range(NMEA_FIELDS)],
+        dtype={field: object for field in text_fields},
+        keep_default_na=False,
+        na_values=[""],
+        quoting=csv.QUOTE_NONE,
+        float_precision="round_trip",
+        on_bad_lines="skip",
+        encoding_errors="replace",
+    )
+    return fields.drop_duplicates("epoch", keep="last").set_index("epoch")
+
+
+def _numeric(values: pd.Series) -> pd.Series:
+    return pd.to_numeric(values, errors="coerce")
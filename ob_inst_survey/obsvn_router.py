@@ -0,0 +1,115 @@
+"""Route ranging observations to stations by transponder code.
+
+When several instruments are ranged during one transit, the TX/RX codes of
+each EdgeTech response identify which instrument answered. A station file maps
+these codes to a station name and (optionally) an apriori coordinate.
+
+The station file is in CSV format with a header row containing the columns
+'station', 'tx', 'rx', and optionally 'startlon', 'startlat' and 'startdepth'.
+A blank 'tx' or 'rx' value will match any code.
+"""
+
+import csv
+import math
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+
+@dataclass
+class StationParam:
+    """Dataclass for specifying a station and its transponder codes."""
+
+    name: str
+    tx: float = None  # Transmit code. None matches any value.
+    rx: float = None  # Receive code. None matches any value.
+    lon: float = None  # Apriori longitude (decimal degrees).
+    lat: float = None  # Apriori latitude (decimal degrees).
+    depth: float = None  # Apriori depth (metres below MSL).
+
+    def apriori_coord(self) -> pd.Series:
+        """Return the apriori coordinate, or an empty Series if not specified."""
+        if None in (self.lon, self.lat, self.depth):
+            return pd.Series(dtype=float)
+        return pd.Series(
+            (self.lon, self.lat, -self.depth), ("lonDec", "latDec", "htAmsl")
+        )
+
+    def matches(self, tx: float, rx: float) -> bool:
+        """Return True if the TX/RX codes belong to this station."""
+        return _code_matches(self.tx, tx) and _code_matches(self.rx, rx)
+
+
+class ObsvnRouter:
+    """Determine the station to which each ranging observation belongs."""
+
+    def __init__(self, stations: list[StationParam]):
+        """Initialise the router with a list of stations."""
+        self.stations = stations
+
+    def route(self, obsvn: dict) -> StationParam:
+        """Return the station matching the observation TX/RX codes, or None."""
+        for station in self.stations:
+            if station.matches(obsvn.get("tx"), obsvn.get("rx")):
+                return station
+        return None
+
+    def route_table(self, obsvn_df: pd.DataFrame) -> pd.Series:
+        """Return the name of the station matching each observation, or None."""
+        names = pd.Series(None, index=obsvn_df.index, dtype=object)
+        # Assign in reverse so that the first matching station takes precedence.
+        for station in reversed(self.stations):
+            matches = _codes_match(station.tx, obsvn_df["tx"]) & _codes_match(
+                station.rx, obsvn_df["rx"]
+            )
+            names[matches] = station.name
+        return names
+
+
+def read_station_file(filename: Path) -> list[StationParam]:
+    """Read stations and their transponder codes from a CSV file."""
+    try:
+        with open(filename, newline="", encoding="utf-8") as station_file:
+            rows = list(csv.DictReader(station_file))
+    except FileNotFoundError:
+        sys.exit(f"Station file '{filename}' does not exist!")
+
+    stations = []
+    for row in rows:
+        row = {key.strip().lower(): value.strip() for key, value in row.items()}
+        try:
+            stations.append(
+                StationParam(
+                    name=row["station"],
+                    tx=_optional_float(row.get("tx")),
+                    rx=_optional_float(row.get("rx")),
+                    lon=_optional_float(row.get("startlon")),
+                    lat=_optional_float(row.get("startlat")),
+                    depth=_optional_float(row.get("startdepth")),
+                )
+            )
+        except (KeyError, ValueError) as error:
+            sys.exit(f"Invalid station file '{filename}': {error} in row {row}")
+    return stations
+
+
+def _optional_float(value: str) -> float:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _codes_match(station_code: float, obsvn_codes: pd.Series) -> pd.Series:
+    if station_code is None:
+        return pd.Series(True, index=obsvn_codes.index)
+    return (obsvn_codes - station_code).abs() <= 0.005
+
+
+def _code_matches(station_code: float, obsvn_code: float) -> bool:
+    if station_code is None:
+        return True
+    if obsvn_code is None:
+        return False
+    return math.isclose(station_code, obsvn_code, abs_tol=0.005)
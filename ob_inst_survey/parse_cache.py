@@ -0,0 +1,343 @@
+"""On-disk cache of the parsed contents of log and observation files.
+
+Parsing NMEA and EdgeTech logs (and observation files) is repeated whenever a
+survey is replayed or reprocessed. The parsed table of each file is therefore
+saved in a cache directory, in numpy's .npz format, and loaded instead of
+parsing the file again. Entries are keyed by the path, size and modification
+time of the file and by the kind and version of the parser, so a file is
+parsed again whenever it or the parser changes.
+
+The cache directory is CACHE_DIR unless the environment variable named by
+CACHE_ENV is set, to another directory or to "" (or "off") to disable the
+cache. Whenever an entry is saved, the least recently used entries are
+deleted to keep the cache within CACHE_MAX_BYTES.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from collections.abc import Callable, Iterator
+from datetime import datetime
+from pathlib import Path
+from tempfile import NamedTemporaryFile, TemporaryFile
+from typing import BinaryIO
+from zipfile import ZIP_STORED, BadZipFile, ZipFile
+
+import numpy as np
+import pandas as pd
+
+import ob_inst_survey as obsurv
+
+CACHE_ENV = "OB_INST_SURVEY_CACHE"
+CACHE_DIR = Path.home() / ".cache" / "ob_inst_survey"
+CACHE_MAX_BYTES = 1024**3
+TEXT_SEP = "\0"  # Separator of the values of a text column.
+SPOOL_ROWS = 65536  # Replay lines held in memory before spooling to disk.
+LINE_COLS = (  # Name and dtype of the columns of cached replay lines.
+    ("timestamp", "datetime64[us]"),
+    ("line", "object"),
+    ("nbytes", "int64"),
+    ("offset", "int64"),
+    ("errors", "int64"),
+)
+
+
+def cache_dir() -> Path:
+    """Returns the cache directory, or None if the cache is disabled."""
+    directory = os.environ.get(CACHE_ENV)
+    if directory is None:
+        return CACHE_DIR
+    if directory.strip().lower() in ("", "off"):
+        return None
+    return Path(directory)
+
+
+def cached_table(
+    filename: Path,
+    kind: str,
+    version: int,
+    parse: Callable[[], pd.DataFrame],
+) -> pd.DataFrame:
+    """Return the parsed table of a file from the cache, or parse and cache it.
+
+    Args:
+        filename (Path): File parsed.
+        kind (str): Kind of table, including any parameters of the parser
+            that change it.
+        version (int): Version of the parser, to be incremented whenever its
+            output changes.
+        parse (Callable): Returns the table of the file.
+    """
+    table = load_cached_table(filename, kind, version)
+    if table is None:
+        table = parse()
+        save_cached_table(filename, kind, version, table)
+    return table
+
+
+def load_cached_table(filename: Path, kind: str, version: int) -> pd.DataFrame:
+    """Returns the cached table of a file, or None if not cached."""
+    entry = _entry_filename(filename, kind, version)
+    if not entry:
+        return None
+    try:
+        table = _load_table(entry)
+        os.utime(entry)  # Mark as recently used.
+    except (OSError, ValueError, KeyError, BadZipFile):
+        return None
+    return table
+
+
+def save_cached_table(filename: Path, kind: str, version: int, table: pd.DataFrame):
+    """Save the table of a file in the cache, if the cache is enabled.
+
+    Tables with columns other than numbers, datetimes and text are not cached.
+    """
+    entry = _entry_filename(filename, kind, version)
+    if entry:
+        _write_entry(entry, lambda file: _save_table(file, table))
+
+
+def evict_cache(directory: Path = None, max_bytes: int = CACHE_MAX_BYTES):
+    """Delete the least recently used entries until within max_bytes."""
+    directory = directory or cache_dir()
+    if not directory:
+        return
+    entries = []
+    for entry in Path(directory).glob("*.npz"):
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, entry))
+    total = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes:
+            break
+        entry.unlink(missing_ok=True)
+        total -= size
+
+
+def caching_lines(
+    filename: Path,
+    kind: str,
+    version: int,
+    lines: Iterator[tuple],
+    stats: obsurv.StreamStats,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    """Yield replay lines, and cache them once all have been read.
+
+    The lines are spooled to temporary files as they are read, so that
+    caching a long log does not hold it in memory. If not all lines are read
+    (eg the replay is stopped) nothing is cached.
+
+    Args:
+        filename (Path): Replay file, read from the start.
+        kind (str): Kind of table, as for cached_table().
+        version (int): Version of the parser, as for cached_table().
+        lines (Iterator): (timestamp, line, bytes, byte offset) of each line.
+        stats (obsurv.StreamStats): Counters in which lines counts parse
+            errors, which are cached with the following line.
+    """
+    entry = _entry_filename(filename, kind, version)
+    if not entry:
+        yield from lines
+        return
+    spool = _LineSpool()
+    try:
+        errors = stats.parse_errors
+        for line in lines:
+            spool.append(line, stats.parse_errors - errors)
+            errors = stats.parse_errors
+            yield line
+        spool.flush()
+        attrs = {"errors": stats.parse_errors - errors}
+        _write_entry(entry, lambda file: spool.save(file, attrs))
+    finally:
+        spool.close()
+
+
+def cached_lines(
+    table: pd.DataFrame,
+    stats: obsurv.StreamStats = None,
+    offset: int = 0,
+    timestamp_start: datetime = None,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    """Yield the replay lines of a table saved by caching_lines().
+
+    Lines before byte offset, or earlier than timestamp_start, are skipped.
+    """
+    rows = table["offset"] >= offset
+    if timestamp_start:
+        rows &= table["timestamp"] >= timestamp_start
+    table = table[rows]
+    for timestamp, line, nbytes, line_offset, errors in zip(
+        table["timestamp"].to_numpy().astype("datetime64[us]").tolist(),
+        table["line"].tolist(),
+        table["nbytes"].tolist(),
+        table["offset"].tolist(),
+        table["errors"].tolist(),
+        strict=True,
+    ):
+        if errors and stats:
+            stats.parse_errors += errors
+        yield timestamp, line, nbytes, line_offset
+    if stats:
+        stats.parse_errors += table.attrs.get("errors", 0)
+
+
+class _LineSpool:
+    """Replay lines appended to temporary column files, saved as a table."""
+
+    def __init__(self):
+        self.rows = 0
+        self._pending = []
+        self._files = [TemporaryFile() for _ in LINE_COLS]
+
+    def append(self, line: tuple, errors: int):
+        """Add a (timestamp, line, bytes, byte offset) line and its errors."""
+        self._pending.append((*line, errors))
+        if len(self._pending) >= SPOOL_ROWS:
+            self.flush()
+
+    def flush(self):
+        """Write the pending lines to the column files."""
+        if not self._pending:
+            return
+        columns = list(zip(*self._pending, strict=True))
+        for (_, dtype), file, values in zip(
+            LINE_COLS, self._files, columns, strict=True
+        ):
+            if dtype == "object":
+                text = TEXT_SEP.join(values)
+                if self.rows:
+                    text = TEXT_SEP + text
+                file.write(text.encode("utf-8"))
+            else:
+                file.write(np.array(values, dtype=dtype).tobytes())
+        self.rows += len(self._pending)
+        self._pending = []
+
+    def save(self, file: BinaryIO, attrs: dict):
+        """Save the flushed lines as by _save_table(), without loading them."""
+        columns = []
+        with ZipFile(file, "w", ZIP_STORED, allowZip64=True) as npz:
+            for col, ((name, dtype), spool) in enumerate(
+                zip(LINE_COLS, self._files, strict=True)
+            ):
+                if dtype == "object":
+                    data_dtype, encoding = np.dtype(np.uint8), "text"
+                else:
+                    data_dtype, encoding = np.dtype(dtype), "array"
+                size = spool.seek(0, os.SEEK_END)
+                spool.seek(0)
+                length = size // data_dtype.itemsize
+                with _npy_member(npz, f"data{col}", data_dtype, length) as member:
+                    shutil.copyfileobj(spool, member)
+                with _npy_member(
+                    npz, f"mask{col}", np.dtype(bool), self.rows
+                ) as member:
+                    for start in range(0, self.rows, SPOOL_ROWS):
+                        member.write(bytes(min(SPOOL_ROWS, self.rows - start)))
+                columns.append([name, encoding, dtype])
+            meta = {"columns": columns, "rows": self.rows, "attrs": attrs}
+            meta = json.dumps(meta).encode("utf-8")
+            with _npy_member(npz, "meta", np.dtype(np.uint8), len(meta)) as member:
+                member.write(meta)
+
+    def close(self):
+        """Delete the temporary column files."""
+        for file in self._files:
+            file.close()
+
+
+def _npy_member(npz: ZipFile, name: str, dtype: np.dtype, length: int) -> BinaryIO:
+    """Open a member of an .npz file for a 1-D array, with its header written."""
+    member = npz.open(f"{name}.npy", "w", force_zip64=True)
+    np.lib.format.write_array_header_1_0(
+        member,
+        {
+            "descr": np.lib.format.dtype_to_descr(dtype),
+            "fortran_order": False,
+            "shape": (length,),
+        },
+    )
+    return member
+
+
+def _write_entry(entry: Path, write: Callable[[BinaryIO], None]):
+    """Write a cache entry with write(file), then evict old entries."""
+    tmp = None
+    try:
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        with NamedTemporaryFile(dir=entry.parent, suffix=".tmp", delete=False) as tmp:
+            write(tmp)
+        os.replace(tmp.name, entry)
+    except (OSError, TypeError):
+        # Eg an unwritable cache directory. The file is parsed again next time.
+        if tmp:
+            Path(tmp.name).unlink(missing_ok=True)
+        return
+    evict_cache(entry.parent)
+
+
+def _entry_filename(filename: Path, kind: str, version: int) -> Path:
+    """Filename of the cache entry of a file, or None if it cannot be cached."""
+    directory = cache_dir()
+    if not directory:
+        return None
+    try:
+        filename = Path(filename).resolve()
+        stat = filename.stat()
+    except OSError:
+        return None
+    key = json.dumps([kind, version, str(filename), stat.st_size, stat.st_mtime_ns])
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return directory / f"{filename.name}-{digest}.npz"
+
+
+def _save_table(file, table: pd.DataFrame):
+    """Save a table as arrays of an .npz file, without pickling."""
+    arrays, columns = {}, []
+    for col, (name, values) in enumerate(table.items()):
+        mask = values.isna().to_numpy()
+        if pd.api.types.is_string_dtype(values):
+            text = TEXT_SEP.join(values.where(~mask, "").astype(str))
+            data, encoding = np.frombuffer(text.encode("utf-8"), np.uint8), "text"
+        elif isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+            numpy_dtype = getattr(values.dtype, "numpy_dtype", None)
+            if numpy_dtype is None or numpy_dtype.kind not in "biuf":
+                raise TypeError(f"Column {name} of dtype {values.dtype}")
+            data, encoding = values.to_numpy(numpy_dtype, na_value=0), "masked"
+        elif values.dtype.kind in "biufmM":
+            data, encoding = values.to_numpy(), "array"
+        else:
+            raise TypeError(f"Column {name} of dtype {values.dtype}")
+        arrays[f"data{col}"] = data
+        arrays[f"mask{col}"] = mask
+        columns.append([name, encoding, str(values.dtype)])
+    meta = {"columns": columns, "rows": len(table), "attrs": table.attrs}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode("utf-8"), np.uint8)
+    np.savez(file, **arrays)
+
+
+def _load_table(filename: Path) -> pd.DataFrame:
+    """Load a table saved by _save_table()."""
+    with np.load(filename, allow_pickle=False) as arrays:
+        meta = json.loads(arrays["meta"].tobytes().decode("utf-8"))
+        table = {}
+        for col, (name, encoding, dtype) in enumerate(meta["columns"]):
+            data, mask = arrays[f"data{col}"], arrays[f"mask{col}"]
+            if encoding == "text":
+                text = data.tobytes().decode("utf-8")
+                values = text.split(TEXT_SEP) if meta["rows"] else []
+                values = pd.Series(values, dtype=object).mask(mask)
+                table[name] = values if dtype == "object" else values.astype(dtype)
+            elif encoding == "masked":
+                table[name] = pd.Series(data, dtype=dtype).mask(mask)
+            else:
+                table[name] = pd.Series(data)
+    table = pd.DataFrame(table, columns=[name for name, _, _ in meta["columns"]])
+    table.attrs.update(meta["attrs"])
+    return table
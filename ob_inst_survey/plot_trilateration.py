@@ -32,6 +32,8 @@ def plot_trilateration(
     if plotfile_path and plotfile_name:
         plotfile = plotfile_path / f"{plotfile_name}.png"
 
+    # Make this the current figure, as there may be one figure per station.
+    plt.figure(fig.number)
     plt.clf()
     # Define Transverse Mercator
     local_tm = TransverseMercatorConversion(
@@ -114,9 +116,7 @@ def plot_trilateration(
     )
 
     drift_text = (
-        f"Drift:\n"
-        f"{final_coord['driftBrg']:03.0f}°\n"
-        f"{final_coord['driftDist']:3.1f}m"
+        f"Drift:\n{final_coord['driftBrg']:03.0f}°\n{final_coord['driftDist']:3.1f}m"
     )
     if final_coord["driftBrg"] <= 180:
         txt_brg = final_coord["driftBrg"]
@@ -150,8 +150,8 @@ def plot_trilateration(
         f"Error circle plotted x{err_circle_plot_scale:d}"
     )
     ax1.text(
-        (100./4200),
-        (100./4200),
+        (100.0 / 4200),
+        (100.0 / 4200),
         result_text,
         horizontalalignment="left",
         multialignment="left",
@@ -167,8 +167,8 @@ def plot_trilateration(
         f"Depth: {-apriori_coord['htAmsl']:3.1f}m"
     )
     ax1.text(
-        (4100./4200),
-        (100./4200),
+        (4100.0 / 4200),
+        (100.0 / 4200),
         apriori_text,
         horizontalalignment="right",
         multialignment="left",
@@ -239,12 +239,8 @@ def plot_trilateration(
     label_style = {"size": 8, "color": "blue", "rotation": 45}
     grdlns.xlabel_style = label_style
     grdlns.ylabel_style = label_style
-    grdlns.xlocator = FixedLocator(
-        np.arange(lon_min, lon_max + intvl_degs, intvl_degs)
-    )
-    grdlns.ylocator = FixedLocator(
-        np.arange(lat_min, lat_max + intvl_degs, intvl_degs)
-    )
+    grdlns.xlocator = FixedLocator(np.arange(lon_min, lon_max + intvl_degs, intvl_degs))
+    grdlns.ylocator = FixedLocator(np.arange(lat_min, lat_max + intvl_degs, intvl_degs))
 
     if plotfile:
         plt.savefig(plotfile, dpi=150, format="png")
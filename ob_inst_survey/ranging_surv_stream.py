@@ -8,13 +8,11 @@ It then populates the specified Queue with a dict for each range response. This
 dict will contain a union of NMEA and Range data fields.
 """
 
-import re
 import sys
-from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
 from pathlib import Path
 from queue import Queue
-from threading import Thread
 from time import sleep
 
 import ob_inst_survey as obsurv
@@ -45,11 +43,10 @@ OBSVN_COLS = (
     "sndSpd",
     "tx",
     "rx",
+    "rngSrc",
+    "nmeaSrc",
 )
 
-STARTTIME = datetime.now(timezone.utc)
-STARTTIME = STARTTIME + timedelta(seconds=1)  # Allow time for startup.
-
 
 @dataclass
 class EtechParam(obsurv.SerParam):
@@ -57,36 +54,109 @@ class EtechParam(obsurv.SerParam):
 
     turn_time: float = 12.5  # Delay in ms for reply from BPR transducer.
     snd_spd: int = 1500  # Speed of sound in water (typical 1450 to 1570 m/sec)
+    label: str = ""  # Identifies the ranging source. Defaults to port name.
+    range_interval: float = None  # Seconds between automated interrogations.
+    upper_gate: int = 3500  # Upper range gate (ms) for automated interrogations.
+    range_command: str = None  # Host mode command to interrogate the transponder.
+
+
+@dataclass
+class _RangeSource:
+    """State of a single EdgeTech ranging source within the survey stream."""
+
+    label: str
+    conn: EtechParam
+    filename: Path = None
+    rangefile_log: obsurv.LogWriter = None
+    edgetech_q: Queue = field(default_factory=Queue)
+    range_dict: dict = field(default_factory=dict)
+    eof: bool = False
+    handle: obsurv.StreamHandle = None
+    stats: obsurv.StreamStats = None
 
 
 def ranging_survey_stream(
     obsvn_q: Queue[dict],
-    nmea_conn: obsurv.IpParam = obsurv.IpParam(),
-    etech_conn: EtechParam = EtechParam(),
+    nmea_conn: obsurv.IpParam | list[obsurv.IpParam] = obsurv.IpParam(),
+    etech_conn: EtechParam | list[EtechParam] = None,
     nmea_filename: Path = None,
-    etech_filename: Path = None,
+    etech_filename: Path | list[Path] = None,
     replay_start: datetime = None,
     spd_fctr: float = 1,
     timestamp_offset: float = 0.0,
-    rawfile_path: Path = None,
-    rawfile_prefix: str = None,
-):
+    clock: obsurv.ClockDiscipline = None,
+    context: obsurv.SurveyContext = None,
+    capture_proc: bool = False,
+    stall_timeout: float = 5.0,
+    nmea_standby: obsurv.IpParam = None,
+    failover_window: float = 1.5,
+) -> obsurv.StreamHandle:
     """Initiate ranging survey stream.
 
     Initiate a queue that populates with dicts of ranging obseravtions.
     Either provide parameters for both NMEA and EdgeTech deckbox data streams,
     or provide input file details for replaying streams previously recorded.
+    More than one EdgeTech source may be provided, in which case each is read
+    concurrently and the label of the source is recorded in "rngSrc". If the
+    range_interval of an EdgeTech source is specified, the deckbox is
+    interrogated automatically at that interval (0 for as fast as the upper
+    range gate allows) with its range_command, otherwise its responses are
+    only received. The
+    label of the NMEA source of each position is recorded in "nmeaSrc".
 
     Args:
         obsvn_q (Queue[dict]): _description_
-        nmea_conn (obsurv.IpParam, optional): _description_. Defaults to None.
-        etech_conn (obsurv.SerParam, optional): _description_. Defaults to None.
+        nmea_conn (obsurv.IpParam | list[obsurv.IpParam], optional):
+            _description_. Defaults to None. More than one UDP source may be
+            provided, eg position and attitude from separate ports. All
+            sentences are received (and logged raw) unless the sentence types
+            of a source are specified.
+        etech_conn (EtechParam | list[EtechParam], optional): _description_.
+            Defaults to None.
         nmea_filename (Path, optional): _description_. Defaults to None.
-        etech_filename (Path, optional): _description_. Defaults to None.
+        etech_filename (Path | list[Path], optional): _description_.
+            Defaults to None.
         replay_start (datetime, optional): _description_. Defaults to None.
         spd_fctr (float, optional): _description_. Defaults to 1.
+        timestamp_offset (float, optional): Seconds added to replayed
+            EdgeTech timestamps to bring them in sync with NMEA. Defaults to 0.
+        clock (obsurv.ClockDiscipline, optional): If provided, the PC clock
+            offset from NMEA time will be continuously estimated and applied
+            to live EdgeTech timestamps. Defaults to None.
+        context (obsurv.SurveyContext, optional): Survey session providing the
+            start time, raw log path and prefix, and EdgeTech parameters (if
+            etech_conn is not specified). The stream is added to its streams.
+            Defaults to a new session without raw logging.
+        capture_proc (bool, optional): If True, live NMEA and EdgeTech streams
+            are received and timestamped in a separate capture process.
+            Defaults to False.
+        stall_timeout (float, optional): Seconds without NMEA data after which
+            a dict with flag "Stalled" is put in obsvn_q (and one with flag
+            "Recovered" when data resumes). None disables. Defaults to 5.
+        nmea_standby (obsurv.IpParam, optional): Standby NMEA source, used
+            while the (single) nmea_conn source is silent for longer than
+            failover_window. Defaults to None.
+        failover_window (float, optional): Seconds without NMEA from the
+            primary source before switching to the standby. Must exceed the
+            interval between the primary's epochs. Defaults to 1.5.
+
+    Returns:
+        obsurv.StreamHandle: Handle for stopping the survey stream. The NMEA
+            and EdgeTech streams and the watchdog are its children. Their
+            health statistics are available from context.telemetry, and are
+            logged to "<prefix>_<timestamp>_TELEMETRY.csv" in
+            context.outfile_path if specified.
     """
-    timestamp_start = STARTTIME.strftime("%Y-%m-%d_%H-%M")
+    if context is None:
+        context = obsurv.SurveyContext()
+    if etech_conn is None:
+        etech_conn = context.etech_conn or [EtechParam()]
+    if not isinstance(etech_conn, (list, tuple)):
+        etech_conn = [etech_conn]
+    context.etech_conn = list(etech_conn)
+    timestamp_start = context.timestamp_start
+    rawfile_path = context.rawfile_path
+    rawfile_prefix = context.outfile_prefix
 
     if (nmea_filename or etech_filename) and not (nmea_filename and etech_filename):
         sys.exit(
@@ -99,67 +169,157 @@ def ranging_survey_stream(
             "response data streams!"
         )
 
+    rng_sources = _init_range_sources(etech_conn, etech_filename)
+    if nmea_conn and not isinstance(nmea_conn, (list, tuple)):
+        nmea_conn = [nmea_conn]
+    if nmea_standby and not nmea_filename:
+        if len(nmea_conn) > 1:
+            sys.exit("A standby NMEA source requires a single primary source.")
+        if capture_proc:
+            sys.exit("A standby NMEA source cannot be used with a capture process.")
+    if capture_proc and not etech_filename:
+        if any(conn.range_interval is not None for conn in etech_conn):
+            sys.exit("Automated ranging cannot be used with a capture process.")
+    if not etech_filename and any(
+        conn.range_interval is not None and not conn.range_command
+        for conn in etech_conn
+    ):
+        sys.exit("Automated ranging requires the command to interrogate.")
+
     # Create directories for logging raw NMEA and Ranging streams if specified.
-    rangefile_log = None
     nmeafile_log = None
+    raw_logs = []
     if rawfile_path:
-        rangefile_log: str = (
-            rawfile_path / f"rng/{rawfile_prefix}_{timestamp_start}_RNG.txt"
-        )
-        rangefile_log.parents[0].mkdir(parents=True, exist_ok=True)
-        nmeafile_log: str = (
-            rawfile_path / f"nmea/{rawfile_prefix}_{timestamp_start}_NMEA.txt"
+        for rng_source in rng_sources:
+            if len(rng_sources) > 1:
+                rangefile_name = (
+                    f"{rawfile_prefix}_{timestamp_start}_{rng_source.label}_RNG.txt"
+                )
+            else:
+                rangefile_name = f"{rawfile_prefix}_{timestamp_start}_RNG.txt"
+            rangefile_name = obsurv.compressed_filename(
+                rawfile_path / f"rng/{rangefile_name}", context.raw_compression
+            )
+            rangefile_name.parents[0].mkdir(parents=True, exist_ok=True)
+            rng_source.rangefile_log = obsurv.LogWriter(rangefile_name)
+        nmeafile_name = obsurv.compressed_filename(
+            rawfile_path / f"nmea/{rawfile_prefix}_{timestamp_start}_NMEA.txt",
+            context.raw_compression,
         )
-        nmeafile_log.parents[0].mkdir(parents=True, exist_ok=True)
+        nmeafile_name.parents[0].mkdir(parents=True, exist_ok=True)
+        nmeafile_log = obsurv.LogWriter(nmeafile_name)
+        raw_logs = [nmeafile_log, *(src.rangefile_log for src in rng_sources)]
 
-    Thread(
+    handle = obsurv.StreamHandle(
+        name=f"Ranging survey {timestamp_start}",
         target=_get_ranging_dict,
         args=(
+            raw_logs,
             obsvn_q,
             nmea_conn,
-            etech_conn,
+            rng_sources,
             nmea_filename,
-            etech_filename,
             replay_start,
             spd_fctr,
             timestamp_offset,
-            rangefile_log,
             nmeafile_log,
+            clock,
+            context,
+            capture_proc,
+            stall_timeout,
+            nmea_standby,
+            failover_window,
         ),
-        daemon=True,
-    ).start()
+    )
+    return context.add_stream(handle.start())
+
+
+def _init_range_sources(
+    etech_conn: list[EtechParam],
+    etech_filename: Path | list[Path],
+) -> list[_RangeSource]:
+    """Pair each EdgeTech connection (or replay file) with a unique label."""
+    if etech_filename and not isinstance(etech_filename, (list, tuple)):
+        etech_filename = [etech_filename]
+
+    rng_sources = []
+    if etech_filename:
+        for idx, filename in enumerate(etech_filename):
+            # Use acoustic parameters of matching connection if provided,
+            # otherwise those of the first connection.
+            conn = etech_conn[idx] if idx < len(etech_conn) else etech_conn[0]
+            label = conn.label if idx < len(etech_conn) and conn.label else ""
+            rng_sources.append(
+                _RangeSource(
+                    label=label or obsurv.uncompressed_filename(filename).stem,
+                    conn=conn,
+                    filename=filename,
+                )
+            )
+    else:
+        for conn in etech_conn:
+            rng_sources.append(_RangeSource(label=conn.label or conn.port, conn=conn))
+
+    labels = [rng_source.label for rng_source in rng_sources]
+    if len(set(labels)) != len(labels):
+        sys.exit(f"Each EdgeTech ranging source must have a unique label: {labels}")
+    return rng_sources
 
 
 def _get_ranging_dict(
+    handle: obsurv.StreamHandle,
+    raw_logs: list[obsurv.LogWriter],
+    *args,
+):
+    """Merge the survey streams, closing the raw logs when the stream ends."""
+    try:
+        _merge_streams(handle, *args)
+    finally:
+        for raw_log in raw_logs:
+            raw_log.close()
+
+
+def _merge_streams(
+    handle: obsurv.StreamHandle,
     obsvn_q: Queue[dict],
     nmea_conn: obsurv.IpParam,
-    etech_conn: EtechParam,
+    rng_sources: list[_RangeSource],
     nmea_filename: Path,
-    etech_filename: Path,
     replay_start: datetime,
     spd_fctr: float,
     timestamp_offset: float,
-    rangefile_log: Path,
-    nmeafile_log: Path,
+    nmeafile_log: obsurv.LogWriter,
+    clock: obsurv.ClockDiscipline,
+    context: obsurv.SurveyContext,
+    capture_proc: bool,
+    stall_timeout: float,
+    nmea_standby: obsurv.IpParam,
+    failover_window: float,
 ):
-    """summary.
+    """Merge each EdgeTech ranging source with the shared NMEA stream.
 
     Args:
-        nmea_conn (obsurv.IpParam, optional): _description_. Defaults to None.
-        etech_conn (obsurv.SerParam, optional): _description_. Defaults to None.
-        nmea_filename (Path, optional): _description_. Defaults to None.
-        etech_filename (Path, optional): _description_. Defaults to None.
-        replay_start (datetime, optional): _description_. Defaults to None.
-        spd_fctr (float, optional): _description_. Defaults to 1.
-
-    Returns:
-        dict: _description_
+        handle (obsurv.StreamHandle): Handle of the survey stream, to which
+            the NMEA, EdgeTech and watchdog handles are added as children.
+        obsvn_q (Queue[dict]): Queue to be populated with observations.
+        nmea_conn (list[obsurv.IpParam]): NMEA connection of each source.
+        rng_sources (list[_RangeSource]): EdgeTech ranging sources.
+        nmea_filename (Path): NMEA file to replay, or None for live streams.
+        replay_start (datetime): Time from which to replay, or None.
+        spd_fctr (float): Replay speed factor.
+        timestamp_offset (float): Seconds added to replayed EdgeTech
+            timestamps to bring them in sync with NMEA.
+        nmeafile_log (obsurv.LogWriter): Raw NMEA log, or None.
+        clock (obsurv.ClockDiscipline): Estimates PC clock offset, or None.
+        context (obsurv.SurveyContext): Survey session, whose start time
+            synchronises replayed streams.
+        capture_proc (bool): Receive live streams in a capture process.
+        stall_timeout (float): Seconds without NMEA data before flagging a
+            stall, or None.
+        nmea_standby (obsurv.IpParam): Standby NMEA source, or None.
+        failover_window (float): Seconds without NMEA from the primary source
+            before switching to the standby.
     """
-    accou = {
-        "turnTime": etech_conn.turn_time,
-        "sndSpd": etech_conn.snd_spd,
-    }
-
     # If replay text files are specified then the stream will be simulated by
     # 'replaying' the files. Otherwise assume streaming over the specified UDP
     # or TCP network connection.
@@ -167,86 +327,238 @@ def _get_ranging_dict(
     # Start thread that will populate NMEA queue
     nmea_q: Queue[str] = Queue()
     if nmea_filename:
-        obsurv.nmea_replay_textfile(
-            nmea_filename, nmea_q, STARTTIME, replay_start, spd_fctr
+        # A single thread replays the NMEA and all EdgeTech files in order of
+        # timestamp. Each NMEA sentence is only queued once the previous one
+        # has been taken, so that the observations do not depend on timing.
+        nmea_q = Queue(maxsize=1)
+        for rng_source in rng_sources:
+            rng_source.stats = obsurv.StreamStats()
+        nmea_handle = obsurv.replay_merged_textfiles(
+            nmea_filename,
+            nmea_q,
+            [rng_source.filename for rng_source in rng_sources],
+            [rng_source.edgetech_q for rng_source in rng_sources],
+            timestamp_start=replay_start,
+            spd_fctr=spd_fctr,
+            timestamp_offset=timestamp_offset,
+            etech_stats=[rng_source.stats for rng_source in rng_sources],
+            context=context,
+        )
+        nmea_src = obsurv.uncompressed_filename(nmea_filename).stem
+    elif capture_proc:
+        # A single capture process receives both NMEA and EdgeTech streams,
+        # counting each in separate stats.
+        for rng_source in rng_sources:
+            rng_source.stats = obsurv.StreamStats()
+        nmea_handle = obsurv.capture_process_stream(
+            nmea_conn,
+            nmea_q,
+            [rng_source.conn for rng_source in rng_sources],
+            [rng_source.edgetech_q for rng_source in rng_sources],
+            etech_stats=[rng_source.stats for rng_source in rng_sources],
+        )
+    elif nmea_standby:
+        nmea_handle = obsurv.nmea_failover_stream(
+            nmea_conn[0], nmea_standby, nmea_q, failover_window, tag_source=True
         )
     else:
-        obsurv.nmea_ip_stream(nmea_conn, nmea_q)
+        # Sentences are stamped with the time received by the receiving
+        # thread, so the clock offset does not include queueing delays.
+        nmea_handle = obsurv.nmea_ip_stream(nmea_conn, nmea_q, tag_source=True)
+    if not nmea_filename:
+        # Label of sentences from the first (or primary) source.
+        nmea_src = nmea_conn[0].label
+    handle.children.append(nmea_handle)
+
+    # Wait for the first fix, with which to pair ranges.
+    parser = obsurv.FixParser(nmea_src)
+    fix = _get_next_fix(nmea_q, nmeafile_log, parser, handle)
+    while isinstance(fix, str):
+        obsvn_q.put({"flag": fix})
+        if fix == "EOF":
+            return
+        fix = _get_next_fix(nmea_q, nmeafile_log, parser, handle)
+    if handle.stopped:
+        return
+
+    # Clock discipline only applies to live streams. Replayed EdgeTech files are
+    # already synchronised to NMEA time by their timestamps.
+    if nmea_filename:
+        clock = None
 
-    # If we are replaying from files then we need to have the timestamp from
-    # the first NMEA record before starting Edgetech file replay to provide
-    # synchronisation.
-    nmea_dict = _get_next_nmea_dict(nmea_q, nmeafile_log)
+    # Start threads that will populate each live EdgeTech ranging queue
+    for rng_source in rng_sources:
+        if rng_source.filename or capture_proc:
+            continue
+        if rng_source.conn.range_interval is not None:
+            commander = obsurv.EtechCommander(rng_source.conn, rng_source.edgetech_q)
+            commander.schedule_ranging(
+                rng_source.conn.range_command,
+                rng_source.conn.range_interval,
+                rng_source.conn.upper_gate,
+            )
+            rng_source.handle = commander.start()
+        else:
+            rng_source.handle = obsurv.etech_serial_stream(
+                rng_source.conn, rng_source.edgetech_q
+            )
+        rng_source.stats = rng_source.handle.stats
+        handle.children.append(rng_source.handle)
 
-    # Start thread that will populate EdgeTech ranging queue
-    edgetech_q: Queue[str] = Queue()
-    if nmea_filename:
-        if not replay_start:
-            replay_start = datetime.strptime(nmea_dict["utcTime"], "%H:%M:%S.%f")
-        obsurv.etech_replay_textfile(
-            etech_filename,
-            edgetech_q,
-            STARTTIME,
-            replay_start,
-            spd_fctr,
-            timestamp_offset,
-        )
-    else:
-        obsurv.etech_serial_stream(etech_conn, edgetech_q)
+    _start_watchdog(handle, obsvn_q, nmea_q, rng_sources, context, stall_timeout)
 
-    range_dict = {}
-    while True:
+    while not handle.stopped:
         if nmea_q.empty():
             sleep(0.000001)  # Prevents idle loop from 100% CPU thread usage.
         else:
-            nmea_dict = _get_next_nmea_dict(nmea_q, nmeafile_log)
-            if nmea_dict:
-                if nmea_dict["flag"] in ("TimeoutError", "EOF"):
-                    obsvn_q.put(nmea_dict)
-        if not range_dict and not edgetech_q.empty():
-            range_dict = _get_next_edgetech_dict(edgetech_q, accou, rangefile_log)
-
-        if range_dict:
-            if range_dict["flag"] in ["TimeoutError", "EOF"]:
-                obsvn_q.put(range_dict)
-                range_dict = {}
-            else:
-                range_dt = datetime.strptime(
-                    range_dict["timestamp"], "%Y-%m-%dT%H-%M-%S.%f"
-                )
-                nmea_datetime = get_nmea_datetime(
-                    nmea_dict["utcTime"],
-                    range_dt,
-                )
+            next_fix = _get_next_fix(nmea_q, nmeafile_log, parser, handle)
+            if handle.stopped:
+                return
+            if isinstance(next_fix, str):
+                obsvn_q.put({"flag": next_fix})
+            elif next_fix:
+                fix = next_fix
+                if clock:
+                    clock.update(fix.pc_time, fix.utc_datetime(fix.pc_time))
+
+        for rng_source in rng_sources:
+            # Pair every response already queued with the current NMEA fix,
+            # rather than one per loop, so that the fix paired with each does
+            # not depend on when it was taken from the queue.
+            while True:
+                # When disciplining the clock, hold EdgeTech responses in the
+                # queue until there are enough NMEA fixes to estimate the
+                # clock offset.
+                if (
+                    not rng_source.range_dict
+                    and not rng_source.eof
+                    and not rng_source.edgetech_q.empty()
+                    and (clock is None or clock.ready)
+                ):
+                    rng_source.range_dict = _get_next_edgetech_dict(
+                        rng_source.edgetech_q,
+                        rng_source.conn,
+                        rng_source.rangefile_log,
+                        clock,
+                        rng_source.stats,
+                    )
+                    if rng_source.range_dict.get("flag") == "EOF":
+                        # Only end the survey once all ranging sources have
+                        # ended.
+                        rng_source.eof = True
+                        if not all(source.eof for source in rng_sources):
+                            rng_source.range_dict = {}
+                    elif rng_source.range_dict.get("flag") in ("live", "replay"):
+                        rng_source.range_dict["rngSrc"] = rng_source.label
+                elif not rng_source.range_dict:
+                    break
+
+                if rng_source.range_dict:
+                    flag = rng_source.range_dict["flag"]
+                    rng_source.range_dict = _pair_range_with_nmea(
+                        rng_source.range_dict, fix, obsvn_q, clock
+                    )
+                    if not rng_source.range_dict and flag in ("live", "replay"):
+                        handle.stats.record()
+                    elif rng_source.range_dict:
+                        break  # Waiting for a later NMEA fix.
+
+
+def _start_watchdog(
+    handle: obsurv.StreamHandle,
+    obsvn_q: Queue[dict],
+    nmea_q: Queue,
+    rng_sources: list[_RangeSource],
+    context: obsurv.SurveyContext,
+    stall_timeout: float,
+):
+    """Monitor the health of the survey streams in the session telemetry."""
+    telemetry = context.telemetry
+    nmea_handle = handle.children[0]
+    if nmea_handle.children:
+        # Primary and standby of a failover source are monitored separately.
+        for child in nmea_handle.children:
+            telemetry.add_source(child.name, child.stats, stall_timeout=stall_timeout)
+    else:
+        telemetry.add_source("NMEA", nmea_handle.stats, nmea_q, stall_timeout)
+    for rng_source in rng_sources:
+        # Ranges are only received when the deckbox is interrogating, so
+        # silence is not flagged as a stall.
+        if rng_source.stats:
+            telemetry.add_source(
+                f"RNG {rng_source.label}",
+                rng_source.stats,
+                rng_source.edgetech_q,
+            )
+    telemetry.add_source("Observations", handle.stats, obsvn_q)
+    logfile = None
+    if context.outfile_path:
+        logfile = (
+            context.outfile_path
+            / f"{context.outfile_prefix}_{context.timestamp_start}_TELEMETRY.csv"
+        )
+    handle.children.append(telemetry.watchdog(obsvn_q, logfile=logfile))
+
+
+def _pair_range_with_nmea(
+    range_dict: dict,
+    fix: obsurv.FixRecord,
+    obsvn_q: Queue[dict],
+    clock: obsurv.ClockDiscipline,
+) -> dict:
+    """Merge range with NMEA fix and add to observation queue when due.
+
+    Returns the range dict if it is still waiting for a later NMEA fix,
+    otherwise an empty dict.
+    """
+    if range_dict["flag"] in ["TimeoutError", "EOF"]:
+        obsvn_q.put(range_dict)
+        return {}
+
+    range_dt = datetime.strptime(range_dict["timestamp"], "%Y-%m-%dT%H-%M-%S.%f")
+    nmea_datetime = fix.utc_datetime(range_dt)
+
+    ### Need to identify if this is realtime or replay.
+    if range_dict["flag"] == "live" and clock:
+        # Timestamp has been corrected to NMEA time, so pair with the first
+        # fix at or after the time of the range.
+        if nmea_datetime >= range_dt:
+            obsvn_q.put({**fix.obsvn_fields(), **range_dict})
+            return {}
+    elif range_dict["flag"] == "live":
+        if (
+            not nmea_datetime - timedelta(seconds=15)
+            < range_dt
+            < nmea_datetime + timedelta(seconds=15)
+        ):
+            print(
+                f"NMEA time and PC time are not in sync. Set the PC "
+                f"time to within 15 seconds of NMEA time and restart:\n"
+                f"NMEA time: {nmea_datetime}\n"
+                f"PC time:   {range_dt}"
+            )
+            range_dict["flag"] = "EOF"
+            obsvn_q.put(range_dict)
+        else:
+            obsvn_q.put({**fix.obsvn_fields(), **range_dict})
+        return {}
+    elif range_dict["flag"] == "replay" and nmea_datetime >= range_dt:
+        obsvn_q.put({**fix.obsvn_fields(), **range_dict})
+        return {}
+    return range_dict
 
-                ### Need to identify if this is realtime or replay.
-                if range_dict["flag"] == "live":
-                    if (
-                        not nmea_datetime - timedelta(seconds=15)
-                        < range_dt
-                        < nmea_datetime + timedelta(seconds=15)
-                    ):
-                        print(
-                            f"NMEA time and PC time are not in sync. Set the PC "
-                            f"time to within 15 seconds of NMEA time and restart:\n"
-                            f"NMEA time: {nmea_datetime}\n"
-                            f"PC time:   {range_dt}"
-                        )
-                        range_dict["flag"] = "EOF"
-                        obsvn_q.put(range_dict)
-                        range_dict = {}
-                    else:
-                        range_dict = {**nmea_dict, **range_dict}
-                        obsvn_q.put(range_dict)
-                        range_dict = {}
-                elif range_dict["flag"] == "replay" and nmea_datetime >= range_dt:
-                    range_dict = {**nmea_dict, **range_dict}
-                    obsvn_q.put(range_dict)
-                    range_dict = {}
-
-
-def _get_next_edgetech_dict(edgetech_q: Queue, accou: dict, rangefile_log: Path):
-    """Get next element from queue and process as Edgetech sentence."""
+
+def _get_next_edgetech_dict(
+    edgetech_q: Queue,
+    etech_conn: EtechParam,
+    rangefile_log: obsurv.LogWriter,
+    clock: obsurv.ClockDiscipline = None,
+    stats: obsurv.StreamStats = None,
+):
+    """Get next element from queue and process as Edgetech sentence.
+
+    Incomplete range responses are counted as parse errors in stats.
+    """
     range_dict = {}
     if edgetech_q.empty():
         return range_dict
@@ -255,10 +567,14 @@ def _get_next_edgetech_dict(edgetech_q: Queue, accou: dict, rangefile_log: Path)
         range_dict["flag"] = edgetech_str
         return range_dict
 
+    clock_offset = None
+    if clock and not edgetech_str.endswith(" replay"):
+        clock_offset = clock.offset(timestamp)
+        timestamp = timestamp + clock_offset
+
     timestamp = timestamp.strftime("%Y-%m-%dT%H-%M-%S.%f")
     if rangefile_log:
-        with open(rangefile_log, "a+", newline="", encoding="utf-8") as rng_file:
-            rng_file.write(f"{timestamp} {edgetech_str}\n")
+        rangefile_log.write(f"{timestamp} {edgetech_str}\n")
 
     edgetech_item = edgetech_str.split(" ")
 
@@ -276,207 +592,73 @@ def _get_next_edgetech_dict(edgetech_q: Queue, accou: dict, rangefile_log: Path)
             except ValueError:
                 # Returns '--.---' if no range received.
                 range_dict["rangeTime"] = 0.0
-            range_dict["turnTime"] = accou["turnTime"]
-            range_dict["sndSpd"] = accou["sndSpd"]
+            range_dict["turnTime"] = etech_conn.turn_time
+            range_dict["sndSpd"] = etech_conn.snd_spd
             range_dict["range"] = (range_dict["rangeTime"] / 2) * range_dict["sndSpd"]
+            if clock_offset is not None:
+                range_dict["clockOffset"] = clock_offset.total_seconds()
         except IndexError:
             print(
                 f"Serial range response string was incomplete. No "
                 f"range has been logged.\n"
                 f"String received: {edgetech_str}"
             )
+            if stats:
+                stats.parse_errors += 1
+            range_dict = {}
     return range_dict
 
 
-def _get_next_nmea_dict(nmea_q: Queue, nmeafile_log: Path):
-    """Get next element from queue and process as NMEA sentence."""
-    gga = []  # Global Positioning System Fix Data
-    # $<TalkerID>GGA,<Timestamp>,<Lat>,<N/S>,<Long>,<E/W>,<GPSQual>,
-    # <Sats>,<HDOP>,<Alt>,<AltVal>,<GeoSep>,<GeoVal>,<DGPSAge>,
-    # <DGPSRef>*<checksum><CR><LF>
-    vtg = []  # Track made good and speed over ground
-    # $<TalkerID>VTG,<COGtrue>,T,<COGmag>,M,<SOGknt>,N,<SOGkph>,K,
-    # <mode-A/D/E/M/S/N>*<checksum><CR><LF>
-    rmc = []  # Recommended minimum specific GPS/Transit data
-    # $<TalkerID>RMC,<Timestamp>,<Status>,<Lat>,<N/S>,<Long>,<E/W>,<SOG>,
-    # <COG>,<Date>,<MagVar>,<MagVarDir>,<mode>,<NavStatus>*<checksum><CR><LF>
-    hdt = []  # True heading.
-    # $<TalkerID>RMC,<TrueHeading>,T*<checksum><CR><LF>
-    shr = []  # Inertial Attitude Data
-    # $<TalkerID>SHR,<Timestamp>,<TrueHeading>,T,<Roll>,<Pitch>,<Heave>,
-    # <RollAccy>,<PitchAccy>,<HeadingAccy>,<GPSQlty>,<INSStatus>*<checksum><CR><LF>
-
-    ts_start = None
-    nmea_dict = {}
-
-    while True:
+def _get_next_fix(
+    nmea_q: Queue,
+    nmeafile_log: obsurv.LogWriter,
+    parser: obsurv.FixParser,
+    handle: obsurv.StreamHandle = None,
+) -> obsurv.FixRecord | str:
+    """Get elements from queue until an NMEA epoch is complete.
+
+    Queue elements are tuples of (sentence, datetime received), optionally
+    followed by the source label, as queued by all NMEA streams of the survey.
+    Plain NMEA sentences (from other producers) are stamped when taken from
+    the queue. The label of the source of the
+    position sentence is recorded in the fix, and is that of the parser for
+    sentences without a label.
+
+    Returns the fix of the epoch, or the flag "TimeoutError" or "EOF". Epochs
+    without a valid position are skipped. If a handle is provided, returns
+    None once it has been stopped, and counts invalid checksums as parse
+    errors of its NMEA stream.
+    """
+    while not (handle and handle.stopped):
         if nmea_q.empty():
             sleep(0.000001)  # Prevents idle loop from 100% CPU thread usage.
             continue
 
         nmea_str = nmea_q.get(block=False)
+        sentence_src = None
+        if isinstance(nmea_str, tuple):
+            sentence_src = nmea_str[2] if len(nmea_str) > 2 else None
+            nmea_str, pc_time = nmea_str[:2]
+        else:
+            pc_time = datetime.now(UTC)
         if nmeafile_log:
-            with open(nmeafile_log, "a+", newline="", encoding="utf-8") as nmea_file:
-                nmea_file.write(f"{nmea_str}\n")
+            nmeafile_log.write(f"{nmea_str}\n")
 
         if nmea_str in ["TimeoutError", "EOF"]:
-            nmea_dict["flag"] = nmea_str
-            return nmea_dict
+            return nmea_str
 
         if not obsurv.nmea_checksum(nmea_str):
             print(
                 f"!!! Checksum for NMEA line is invalid. Line has "
                 f"been ignored: => {nmea_str}"
             )
+            if handle and handle.children:
+                handle.children[0].stats.parse_errors += 1
             continue
 
-        nmea_msg = re.match(r"\$(.*)\*", nmea_str)[1].split(",")
-        msg_type = nmea_msg[0][2:]
-        if msg_type in ("GGA", "RMC", "VTG", "SHR"):
-            ts_msg = nmea_msg[1][:8]
-            if ts_start is None:
-                ts_start = ts_msg
-            if ts_msg != ts_start:
-                if gga or rmc:
-                    nmea_dict = _nmea_to_dict(gga, rmc, shr, vtg, hdt)
-                    nmea_dict["flag"] = None
-                    return nmea_dict
-                gga = rmc = shr = vtg = hdt = []
-                ts_start = ts_msg
-
-        if msg_type == "GGA":
-            gga = nmea_msg
-        elif msg_type == "RMC":
-            rmc = nmea_msg
-        elif msg_type == "VTG":
-            vtg = nmea_msg
-        elif msg_type == "SHR":
-            shr = nmea_msg
-        elif msg_type == "HDT":
-            hdt = nmea_msg
-
-
-def _nmea_to_dict(nmea_gga, nmea_rmc, nmea_shr, nmea_vtg, nmea_hdt):
-    try:
-        nmea_dict = {}
-
-        if nmea_gga:
-            time = nmea_gga[1]
-            lat = nmea_gga[2]
-            lat_hemi = nmea_gga[3]
-            lon = nmea_gga[4]
-            lon_hemi = nmea_gga[5]
-        else:
-            time = nmea_rmc[1]
-            lat = nmea_rmc[3]
-            lat_hemi = nmea_rmc[4]
-            lon = nmea_rmc[5]
-            lon_hemi = nmea_rmc[6]
-
-        nmea_dict["utcTime"] = f"{time[0:2]}:{time[2:4]}:{time[4:]}"
-
-        nmea_dict["lat"] = f"{lat[0:2]}\u00b0{lat[2:11]}'{lat_hemi}"
-        nmea_dict["latDec"] = int(lat[0:2]) + float(lat[2:11]) / 60
-        if lat_hemi.upper() == "S":
-            nmea_dict["latDec"] *= -1
-
-        nmea_dict["lon"] = f"{lon[0:3]}\u00b0{lon[3:12]}'{lon_hemi}"
-        nmea_dict["lonDec"] = int(lon[0:3]) + float(lon[3:12]) / 60
-        if lon_hemi.upper() == "W":
-            nmea_dict["lonDec"] *= -1
-    except (IndexError, ValueError):
-        print("NMEA stream is not present or is invalid.")
-
-    if nmea_gga:
-        try:
-            nmea_dict["qlty"] = _fix_qlty(int(nmea_gga[6]))
-        except ValueError:
-            nmea_dict["qlty"] = ""
-        try:
-            nmea_dict["noSats"] = int(nmea_gga[7])
-        except ValueError:
-            nmea_dict["noSats"] = ""
-        try:
-            nmea_dict["hdop"] = float(nmea_gga[8])
-        except ValueError:
-            nmea_dict["hdop"] = ""
-        try:
-            nmea_dict["htAmsl"] = float(nmea_gga[9])
-        except ValueError:
-            nmea_dict["htAmsl"] = ""
-        nmea_dict["htAmslUnit"] = nmea_gga[10].upper()
-        try:
-            nmea_dict["geiodSep"] = float(nmea_gga[11])
-        except ValueError:
-            nmea_dict["geiodSep"] = ""
-        nmea_dict["geiodSepUnit"] = nmea_gga[12].upper()
-    else:
-        nmea_dict["qlty"] = ""
-        nmea_dict["noSats"] = ""
-        nmea_dict["hdop"] = ""
-        nmea_dict["htAmsl"] = ""
-        nmea_dict["htAmslUnit"] = ""
-        nmea_dict["geiodSep"] = ""
-        nmea_dict["geiodSepUnit"] = ""
-
-    if nmea_vtg:
-        nmea_dict["cog"] = float(nmea_vtg[1])
-        nmea_dict["sogKt"] = float(nmea_vtg[5])
-    elif nmea_rmc:
-        nmea_dict["cog"] = float(nmea_rmc[8])
-        nmea_dict["sogKt"] = float(nmea_rmc[7])
-    else:
-        nmea_dict["cog"] = ""
-        nmea_dict["sogKt"] = ""
-
-    if nmea_shr:
-        nmea_dict["heading"] = float(nmea_shr[2])
-        nmea_dict["roll"] = float(nmea_shr[4])
-        nmea_dict["pitch"] = float(nmea_shr[5])
-        nmea_dict["heave"] = float(nmea_shr[6])
-    else:
-        if nmea_hdt:
-            nmea_dict["heading"] = float(nmea_hdt[1])
-        else:
-            nmea_dict["heading"] = ""
-
-        nmea_dict["roll"] = ""
-        nmea_dict["pitch"] = ""
-        nmea_dict["heave"] = ""
-
-    return nmea_dict
-
-
-def _fix_qlty(idx):
-    return [
-        "Invalid",
-        "GPS fix - (Standard Positioning Service)",
-        "DGPS fix",
-        "PPS fix",
-        "Real Time Kinematic",
-        "Float RTK",
-        "Estimated (dead reckoning)",
-        "Manual input mode",
-        "Simulation mode",
-    ][idx]
-
-
-def get_nmea_datetime(nmea_timestamp: str, near: datetime):
-    """Convert nmea timestamp string to a datetime."""
-    if nmea_timestamp[:6] == "240000":
-        # At UTC midnight timestamp may incorrectly show hrs as 24.
-        nmea_timestamp = "000000.000"
-    timestamp_curr = datetime.strptime(nmea_timestamp, "%H:%M:%S.%f")
-    secs = (
-        timestamp_curr.hour * 3600
-        + timestamp_curr.minute * 60
-        + timestamp_curr.second
-        + timestamp_curr.microsecond / 1e6
-    )
-    timestamp_delta = timedelta(seconds=secs)
-    nmea_time = datetime(near.year, near.month, near.day) + timestamp_delta
-    if nmea_time.hour > near.hour + 6:
-        nmea_time = nmea_time - timedelta(days=1)
-    elif nmea_time.hour + 6 < near.hour:
-        nmea_time = nmea_time + timedelta(days=1)
-    return nmea_time
+        fix = parser.parse(nmea_str, pc_time, sentence_src)
+        if fix:
+            if fix.valid:
+                return fix
+            print("NMEA stream is not present or is invalid.")
+    return None
@@ -0,0 +1,171 @@
+"""Replay NMEA and EdgeTech text files together on a simulated clock.
+
+A single thread reads the NMEA file and each EdgeTech file, and merges their
+lines in order of timestamp. Each line is put in its queue when the simulated
+clock reaches its timestamp. The simulated clock runs at spd_fctr times real
+time from the start of the replay, so the files cannot drift apart however
+fast they are replayed.
+
+With a spd_fctr of 0 the files are replayed as fast as possible. If nmea_q is
+bounded (eg Queue(maxsize=1)) each NMEA sentence is only put once the previous
+one has been taken, so every EdgeTech response is queued before any later NMEA
+sentence is processed. Reprocessing a survey then gives the same observations
+each time, at the speed of the CPU rather than that of the survey.
+
+Queue items are as for nmea_replay_textfile() and etech_replay_textfile(),
+except that NMEA sentences are put as tuples of (sentence, timestamp), so the
+time of each fix is that at which it was recorded rather than replayed.
+"""
+
+import heapq
+from collections.abc import Iterator
+from datetime import UTC, datetime
+from operator import itemgetter
+from pathlib import Path
+from queue import Full, Queue
+
+import ob_inst_survey as obsurv
+
+PUT_TIMEOUT = 0.1  # Seconds between checks for stop while a queue is full.
+
+
+def replay_merged_textfiles(
+    nmea_filename: Path,
+    nmea_q: Queue,
+    etech_filenames: list[Path],
+    edgetech_qs: list[Queue],
+    timestamp_start: datetime = None,
+    spd_fctr: float = 1,
+    timestamp_offset: float = 0,
+    etech_stats: list[obsurv.StreamStats] = None,
+    context: obsurv.SurveyContext = None,
+) -> obsurv.StreamHandle:
+    """Initiate queues simulating NMEA and EdgeTech streams from text files.
+
+    Args:
+        nmea_filename (Path): NMEA text file.
+        nmea_q (Queue): Queue for NMEA sentences.
+        etech_filenames (list[Path]): EdgeTech text file of each source.
+        edgetech_qs (list[Queue]): Queue for the responses of each file.
+        timestamp_start (datetime, optional): Time at which the replay
+            starts. Each file is read from the time index entry preceding it,
+            and earlier lines are skipped. Defaults to the first timestamp of
+            the files.
+        spd_fctr (float, optional): Speed multiplier, or 0 for as fast as
+            possible. Defaults to 1.
+        timestamp_offset (float, optional): Seconds added to EdgeTech
+            timestamps to bring them in sync with NMEA. Defaults to 0.
+        etech_stats (list[obsurv.StreamStats], optional): Counters for each
+            EdgeTech file. Defaults to None.
+        context (obsurv.SurveyContext, optional): Survey session, whose start
+            time is the real time at which the replay starts. Defaults to
+            the current time.
+
+    Returns:
+        obsurv.StreamHandle: Handle for stopping the replay, whose stats count
+            the NMEA sentences.
+    """
+    if etech_stats is None:
+        etech_stats = [obsurv.StreamStats() for _ in etech_filenames]
+    if timestamp_start:
+        # Replayed timestamps are times of day on 1900-01-01, so count the
+        # day from the date of the first EdgeTech response.
+        if etech_filenames:
+            index = obsurv.replay_index(etech_filenames[0], "etech")
+        else:
+            index = obsurv.replay_index(nmea_filename, "nmea")
+        timestamp_start = index.virtual_timestamp(timestamp_start)
+    return obsurv.StreamHandle(
+        name=f"Merged replay {nmea_filename}",
+        target=_replay_merged,
+        args=(
+            nmea_filename,
+            nmea_q,
+            list(zip(etech_filenames, edgetech_qs, etech_stats, strict=True)),
+            timestamp_start,
+            spd_fctr,
+            timestamp_offset,
+            context.start_time if context else None,
+        ),
+    ).start()
+
+
+def _replay_merged(
+    handle: obsurv.StreamHandle,
+    nmea_filename: Path,
+    nmea_q: Queue,
+    etech_replays: list[tuple[Path, Queue, obsurv.StreamStats]],
+    timestamp_start: datetime,
+    spd_fctr: float,
+    timestamp_offset: float,
+    actltime_start: datetime,
+):
+    """Put the lines of all files in their queues in order of timestamp."""
+    streams = [
+        _nmea_events(nmea_filename, nmea_q, handle.stats, timestamp_start),
+        *(
+            _etech_events(
+                filename, edgetech_q, timestamp_offset, stats, timestamp_start
+            )
+            for filename, edgetech_q, stats in etech_replays
+        ),
+    ]
+    if not actltime_start:
+        actltime_start = datetime.now(UTC)
+
+    # Lines with equal timestamps are taken from the files in the order given,
+    # so the merged order is always the same.
+    for timestamp, queue, item, nbytes, stats in heapq.merge(
+        *streams, key=itemgetter(0)
+    ):
+        if nbytes:
+            if not timestamp_start:
+                timestamp_start = timestamp
+            if spd_fctr:
+                # Wait until the simulated clock reaches the timestamp.
+                due = actltime_start + (timestamp - timestamp_start) / spd_fctr
+                delay = (due - datetime.now(UTC)).total_seconds()
+                if delay > 0 and handle.wait(delay):
+                    return
+        while True:
+            if handle.stopped:
+                return
+            try:
+                queue.put(item, timeout=PUT_TIMEOUT)
+                break
+            except Full:
+                continue
+        if nbytes:
+            stats.record(nbytes)
+
+
+def _nmea_events(
+    filename: Path,
+    nmea_q: Queue,
+    stats: obsurv.StreamStats,
+    timestamp_start: datetime,
+) -> Iterator[tuple]:
+    """Yield (timestamp, queue, item, bytes, stats) for each NMEA sentence."""
+    timestamp = datetime.min
+    for timestamp, sentence, nbytes, _ in obsurv.read_nmea_textfile(
+        filename, stats, timestamp_start
+    ):
+        yield timestamp, nmea_q, (sentence, timestamp), nbytes, stats
+    yield timestamp, nmea_q, "EOF", 0, stats
+
+
+def _etech_events(
+    filename: Path,
+    edgetech_q: Queue,
+    timestamp_offset: float,
+    stats: obsurv.StreamStats,
+    timestamp_start: datetime,
+) -> Iterator[tuple]:
+    """Yield (timestamp, queue, item, bytes, stats) for each EdgeTech response."""
+    timestamp = datetime.min
+    for timestamp, sentence, nbytes, _ in obsurv.read_etech_textfile(
+        filename, timestamp_offset, stats, timestamp_start
+    ):
+        # Add "replay" flag at end of sentence.
+        yield timestamp, edgetech_q, (f"{sentence} replay", timestamp), nbytes, stats
+    yield timestamp, edgetech_q, ("EOF", None), 0, stats
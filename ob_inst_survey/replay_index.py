@@ -0,0 +1,202 @@
+"""Time index of NMEA and EdgeTech text files, for seeking during replay.
+
+The index of a file records the byte offset of the first line at or after
+every interval seconds of its timestamps, the first and last timestamps, and
+the offsets at which the date rolls over to the next day. It is saved in a
+sidecar file "<filename>.idx" alongside the file, and is rebuilt if the size
+or modification time of the file no longer match those indexed.
+
+Timestamps are those of the replay modules: the time of day on 1900-01-01,
+advanced a day at each midnight, as NMEA sentences do not include the date.
+EdgeTech timestamps are indexed without any timestamp offset. The date of an
+NMEA file is taken from the timestamp in its filename, if it has one.
+
+Offsets in compressed files are of the decompressed data, which can only be
+reached by decompressing from the start of the file. Their indexes provide the
+dates and times of the file, but seeking them is no faster than reading.
+"""
+
+import json
+from bisect import bisect_right
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import ob_inst_survey as obsurv
+
+INDEX_VERSION = 2
+INDEX_INTERVAL = 60  # Seconds between index entries.
+INDEX_EPOCH = datetime(1900, 1, 1)  # Date of replayed timestamps.
+
+
+@dataclass
+class ReplayIndex:
+    """Dataclass for the time index of a replay file."""
+
+    kind: str  # "nmea" or "etech".
+    size: int = 0  # File size (bytes) when indexed.
+    mtime_ns: int = 0  # File modification time when indexed.
+    interval: float = INDEX_INTERVAL  # Seconds between entries.
+    first: float = None  # First timestamp (seconds after INDEX_EPOCH).
+    last: float = None  # Last timestamp (seconds after INDEX_EPOCH).
+    first_date: str = None  # ISO date of the first timestamp, if known.
+    first_time: str = None  # ISO time of the first timestamp, if known.
+    rollovers: list[int] = field(default_factory=list)  # Offsets of new days.
+    entries: list[list] = field(default_factory=list)  # [seconds, offset].
+    version: int = INDEX_VERSION
+
+    @property
+    def first_timestamp(self) -> datetime:
+        """First replay timestamp, or None if the file has none."""
+        return None if self.first is None else _timestamp(self.first)
+
+    @property
+    def last_timestamp(self) -> datetime:
+        """Last replay timestamp, or None if the file has none."""
+        return None if self.last is None else _timestamp(self.last)
+
+    @property
+    def first_datetime(self) -> datetime:
+        """Date and time of the first timestamp, or None if unknown."""
+        if not self.first_date:
+            return None
+        return datetime.fromisoformat(f"{self.first_date}T{self.first_time}")
+
+    def virtual_timestamp(self, timestamp: datetime) -> datetime:
+        """Convert a date and time to the equivalent replay timestamp.
+
+        The day is counted from the date of the first timestamp, or is the
+        first day if the date is unknown.
+        Timestamps already on 1900-01-01 or later days of 1900 are unchanged.
+        """
+        timestamp = timestamp.replace(tzinfo=None)
+        if timestamp.year == INDEX_EPOCH.year:
+            return timestamp
+        days = 0
+        if self.first_date:
+            days = max((timestamp.date() - date.fromisoformat(self.first_date)).days, 0)
+        return datetime.combine(INDEX_EPOCH + timedelta(days=days), timestamp.time())
+
+    def seek(self, timestamp: datetime) -> tuple[int, datetime]:
+        """Return the offset and date of the last entry at or before timestamp."""
+        seconds = (timestamp - INDEX_EPOCH).total_seconds()
+        idx = bisect_right([entry[0] for entry in self.entries], seconds) - 1
+        if idx < 0:
+            return 0, INDEX_EPOCH
+        entry_seconds, offset = self.entries[idx]
+        return offset, INDEX_EPOCH + timedelta(days=int(entry_seconds // 86400))
+
+    def matches(self, filename: Path) -> bool:
+        """True if the index is current for the file."""
+        stat = Path(filename).stat()
+        return (
+            self.version == INDEX_VERSION
+            and self.size == stat.st_size
+            and self.mtime_ns == stat.st_mtime_ns
+        )
+
+
+def index_filename(filename: Path) -> Path:
+    """Returns the filename of the sidecar index of a replay file."""
+    filename = Path(filename)
+    return filename.with_name(f"{filename.name}.idx")
+
+
+def build_replay_index(
+    filename: Path,
+    kind: str,
+    interval: float = INDEX_INTERVAL,
+) -> ReplayIndex:
+    """Read a replay file and return its time index.
+
+    Args:
+        filename (Path): NMEA or EdgeTech text file.
+        kind (str): "nmea" or "etech".
+        interval (float, optional): Seconds between index entries. Defaults
+            to INDEX_INTERVAL.
+    """
+    stat = Path(filename).stat()
+    index = ReplayIndex(kind, stat.st_size, stat.st_mtime_ns, interval)
+    if kind == "nmea":
+        lines = obsurv.read_nmea_textfile(filename)
+    else:
+        lines = obsurv.read_etech_textfile(filename)
+
+    timestamp_prev = None
+    next_entry = None
+    for timestamp, _, _, offset in lines:
+        seconds = (timestamp - INDEX_EPOCH).total_seconds()
+        if timestamp_prev is None:
+            index.first = seconds
+            if kind != "nmea":
+                first_datetime = _etech_datetime(filename, offset)
+            else:
+                first_date = obsurv.date_from_filename(filename, timestamp.time())
+                first_datetime = first_date and datetime.combine(
+                    first_date, timestamp.time()
+                )
+            if first_datetime:
+                index.first_date = first_datetime.date().isoformat()
+                index.first_time = first_datetime.time().isoformat()
+        elif timestamp.date() > timestamp_prev.date():
+            index.rollovers.append(offset)
+        # Entries are only at the first line with each timestamp, so that
+        # lines without a timestamp are not separated from the one before.
+        if next_entry is None or (
+            seconds >= next_entry and timestamp != timestamp_prev
+        ):
+            index.entries.append([seconds, offset])
+            next_entry = seconds + interval
+        index.last = seconds
+        timestamp_prev = timestamp
+    return index
+
+
+def replay_index(
+    filename: Path,
+    kind: str,
+    interval: float = INDEX_INTERVAL,
+    rebuild: bool = False,
+) -> ReplayIndex:
+    """Return the time index of a replay file from its sidecar file.
+
+    If the sidecar file is missing or out of date, the file is indexed and
+    the sidecar written (if the directory is writable). For a directory or
+    glob of rotated files (see replay_files()), the index is that of the first.
+
+    Args:
+        filename (Path): NMEA or EdgeTech text file, or replay source.
+        kind (str): "nmea" or "etech".
+        interval (float, optional): Seconds between entries of a new index.
+            Defaults to INDEX_INTERVAL.
+        rebuild (bool, optional): Index the file even if the sidecar file is
+            current. Defaults to False.
+    """
+    filename = obsurv.replay_files(filename)[0]
+    sidecar = index_filename(filename)
+    try:
+        with open(sidecar, encoding="utf-8") as index_file:
+            index = ReplayIndex(**json.load(index_file))
+        if not rebuild and index.kind == kind and index.matches(filename):
+            return index
+    except (OSError, ValueError, TypeError):
+        pass
+
+    index = build_replay_index(filename, kind, interval)
+    try:
+        with open(sidecar, "w", encoding="utf-8") as index_file:
+            json.dump(asdict(index), index_file, separators=(",", ":"))
+    except OSError:
+        pass  # Eg an archive on read only media. The index is rebuilt next time.
+    return index
+
+
+def _etech_datetime(filename: Path, offset: int) -> datetime:
+    """Date and time of the EdgeTech response at offset in the file."""
+    with obsurv.open_logfile(filename, "rb") as etech_file:
+        etech_file.seek(offset)
+        return obsurv.parse_etech_timestamp(etech_file.readline().decode("utf-8"))
+
+
+def _timestamp(seconds: float) -> datetime:
+    return INDEX_EPOCH + timedelta(seconds=seconds)
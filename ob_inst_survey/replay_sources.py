@@ -0,0 +1,168 @@
+"""Replay a directory or glob of rotated log files as one continuous stream.
+
+Logs are split into several files by --filesplit and whenever logging is
+restarted, each file named "<prefix>_YYYY-MM-DD_HH-MM.txt" by the time it was
+started. A replay source may be a single file, a directory of such files, or a
+glob pattern matching them. The files are ordered by the timestamp embedded in
+their names and read one after the other, only the current file being open.
+
+Each file is read as by the replay modules, with its timestamps on the days
+of 1900 counted from its first timestamp. Files are moved onto the days of
+the whole replay by the date of their first timestamp (for NMEA files, from
+the embedded timestamp) or, where that is unknown, so that they continue from
+the end of the preceding file. Records at the start of a file that overlap
+those already read from the preceding file are skipped.
+"""
+
+import math
+import re
+from collections.abc import Callable, Iterator
+from datetime import date, datetime, time, timedelta
+from glob import glob
+from itertools import chain
+from pathlib import Path
+
+import ob_inst_survey as obsurv
+
+FILE_TIMESTAMP = re.compile(r"(\d{4}-\d{2}-\d{2}_\d{2}-\d{2})")
+FILE_TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M"
+
+
+def replay_files(source: Path) -> list[Path]:
+    """Returns the files of a replay source, in order of their timestamps.
+
+    Args:
+        source (Path): A file, a directory of timestamped log files, or a glob
+            pattern. Index sidecar files are ignored.
+    """
+    source = Path(source)
+    if source.is_dir():
+        files = [
+            filename
+            for filename in source.iterdir()
+            if filename.is_file() and file_timestamp(filename)
+        ]
+    elif any(char in str(source) for char in "*?["):
+        files = [Path(filename) for filename in glob(str(source))]
+        files = [filename for filename in files if filename.is_file()]
+    else:
+        return [source]
+    files = [filename for filename in files if filename.suffix.lower() != ".idx"]
+    if not files:
+        raise FileNotFoundError(f"No replay files found for '{source}'.")
+    return sorted(files, key=lambda name: (file_timestamp(name) or datetime.min, name))
+
+
+def file_timestamp(filename: Path) -> datetime:
+    """Returns the timestamp embedded in a log filename, or None."""
+    match = FILE_TIMESTAMP.search(Path(filename).name)
+    if not match:
+        return None
+    try:
+        return datetime.strptime(match.group(1), FILE_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+def date_from_filename(filename: Path, time_of_day: time) -> date:
+    """Returns the date of time_of_day nearest the timestamp in filename, or None."""
+    file_datetime = file_timestamp(filename)
+    if not file_datetime:
+        return None
+    timestamp = datetime.combine(file_datetime.date(), time_of_day)
+    if timestamp - file_datetime > timedelta(hours=12):
+        timestamp -= timedelta(days=1)
+    elif file_datetime - timestamp > timedelta(hours=12):
+        timestamp += timedelta(days=1)
+    return timestamp.date()
+
+
+def read_replay_files(
+    files: list[Path],
+    kind: str,
+    read_file: Callable[[Path, datetime], Iterator[tuple]],
+    timestamp_start: datetime = None,
+    timestamp_offset: float = 0,
+) -> Iterator[tuple[datetime, str, int, int]]:
+    """Yield (timestamp, line, bytes, byte offset) for the lines of each file.
+
+    Args:
+        files (list[Path]): Replay files, in order (see replay_files()).
+        kind (str): "nmea" or "etech".
+        read_file (Callable): Reads one file from a timestamp (or None) as
+            read_nmea_textfile() or read_etech_textfile() do.
+        timestamp_start (datetime, optional): Time at which the replay
+            starts. Files ending before it are not read, and the file
+            containing it is read from its time index. Defaults to None.
+        timestamp_offset (float, optional): Seconds read_file adds to
+            EdgeTech timestamps, which are indexed without it. Defaults to 0.
+
+    Byte offsets are those within the file each line is read from.
+    """
+    offset_delta = timedelta(seconds=timestamp_offset)
+    if timestamp_start:
+        index = obsurv.replay_index(files[0], kind)
+        timestamp_start = index.virtual_timestamp(timestamp_start)
+    date_start = None  # Date of the first day of the replay.
+    timestamp_last = None  # Timestamp of the last line read.
+    lines_last = set()  # Lines read with timestamp_last.
+    for filename in files:
+        if timestamp_start:
+            index = obsurv.replay_index(filename, kind)
+            if index.first is None:
+                continue
+            first = index.first_timestamp + offset_delta
+            offset = index.entries[0][1]
+            lines = None
+        else:
+            lines = read_file(filename, None)
+            first_line = next(lines, None)
+            if first_line is None:
+                continue
+            first, offset = first_line[0], first_line[3]
+            lines = chain([first_line], lines)
+
+        # Move the file onto the days of the replay.
+        days = 0
+        if timestamp_last:
+            days = math.ceil(
+                (timestamp_last - timedelta(hours=12) - first) / timedelta(days=1)
+            )
+        file_date = _first_date(filename, kind, first, offset)
+        if file_date and date_start:
+            days = max(days, (file_date - date_start).days)
+        elif file_date:
+            date_start = file_date - timedelta(days=days)
+        shift = timedelta(days=max(days, 0))
+
+        if timestamp_start:
+            last = index.last_timestamp + offset_delta + shift
+            if last < timestamp_start:
+                timestamp_last, lines_last = last, set()
+                continue
+            file_start = timestamp_start - shift
+            lines = read_file(filename, file_start if file_start > first else None)
+
+        # Skip lines overlapping those read from the preceding file.
+        overlap, overlap_lines = timestamp_last, lines_last
+        for timestamp, line, nbytes, line_offset in lines:
+            timestamp += shift
+            if overlap and timestamp <= overlap:
+                if timestamp < overlap or line in overlap_lines:
+                    continue
+            if timestamp != timestamp_last:
+                timestamp_last, lines_last = timestamp, set()
+            lines_last.add(line)
+            yield timestamp, line, nbytes, line_offset
+
+
+def _first_date(filename: Path, kind: str, first: datetime, offset: int) -> date:
+    """Date of the first timestamp of a file, or None if unknown."""
+    if kind != "etech":
+        return date_from_filename(filename, first.time())
+    with obsurv.open_logfile(filename, "rb") as etech_file:
+        etech_file.seek(offset)
+        timestamp = obsurv.parse_etech_timestamp(
+            etech_file.readline().decode("utf-8", errors="replace")
+        )
+    return timestamp.date() if timestamp else None
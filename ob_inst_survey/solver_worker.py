@@ -0,0 +1,148 @@
+"""Solve and plot station surveys in a separate worker process.
+
+Trilateration, writing of result files and redrawing of plots can take much
+longer than the interval between ranging observations on slow computers. The
+worker process receives observations as they arrive, and each time it is free
+it applies all observations received since the previous solution before solving
+each affected station once. Intermediate updates are thereby coalesced, while
+ingestion, logging and display in the main process remain real-time.
+"""
+
+from multiprocessing import Process, Queue, Value
+from pathlib import Path
+from queue import Empty
+from time import sleep
+
+import pandas as pd
+
+import ob_inst_survey as obsurv
+
+
+class SolverWorker:
+    """Process that solves and plots the latest observations of each station."""
+
+    def __init__(self):
+        """Initialise the solver worker process (not yet started)."""
+        self._cmd_q = Queue()
+        self._result_q = Queue()
+        self._processed = Value("l", 0)
+        self._submitted = 0
+        self._process = Process(
+            target=_solver_loop,
+            args=(self._cmd_q, self._result_q, self._processed),
+            daemon=True,
+        )
+
+    def start(self):
+        """Start the worker process."""
+        self._process.start()
+
+    def add_station(
+        self,
+        name: str,
+        outfile_path: Path,
+        timestamp_start: str,
+        apriori_coord: pd.Series = None,
+        obsvn_df: pd.DataFrame = None,
+    ):
+        """Create the station survey within the worker process.
+
+        Observations accumulated before a survey was resumed may be provided
+        as obsvn_df.
+        """
+        self._cmd_q.put(
+            ("station", name, outfile_path, timestamp_start, apriori_coord, obsvn_df)
+        )
+
+    def submit(self, name: str, obsvn: dict):
+        """Add an observation to a station, to be solved when the worker is free."""
+        self._submitted += 1
+        self._cmd_q.put(("obsvn", name, obsvn))
+
+    def get_results(self) -> list[dict]:
+        """Return all solutions completed since this was last called.
+
+        Each solution is a dict with the values "name", "final_coord",
+        "apriori_coord", "outlier" and "residual".
+        """
+        results = []
+        while True:
+            try:
+                results.append(self._result_q.get_nowait())
+            except Empty:
+                return results
+
+    def wait_idle(self, timeout: float = None):
+        """Wait until all submitted observations have been solved."""
+        waited = 0.0
+        while self._processed.value < self._submitted and self._process.is_alive():
+            sleep(0.05)
+            waited += 0.05
+            if timeout is not None and waited >= timeout:
+                break
+
+    def stop(self):
+        """Stop the worker process, closing any plots."""
+        if self._process.is_alive():
+            self._cmd_q.put(("stop",))
+            self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+def _solver_loop(cmd_q: Queue, result_q: Queue, processed: Value):
+    """Apply all pending commands, then solve each station that has changed."""
+    surveys: dict[str, obsurv.StationSurvey] = {}
+    while True:
+        try:
+            cmd = cmd_q.get(timeout=0.1)
+        except Empty:
+            # Keep any plot windows responsive while idle.
+            for survey in surveys.values():
+                if survey.fig:
+                    survey.fig.canvas.flush_events()
+            continue
+
+        # Coalesce all commands received since the last solution.
+        cmds = [cmd]
+        while True:
+            try:
+                cmds.append(cmd_q.get_nowait())
+            except Empty:
+                break
+
+        updated = {}
+        num_obsvns = 0
+        for cmd in cmds:
+            if cmd[0] == "stop":
+                return
+            if cmd[0] == "station":
+                _, name, outfile_path, timestamp_start, apriori_coord, obsvn_df = cmd
+                surveys[name] = obsurv.StationSurvey(
+                    name=name,
+                    outfile_path=outfile_path,
+                    timestamp_start=timestamp_start,
+                    apriori_coord=apriori_coord,
+                )
+                if obsvn_df is not None and not obsvn_df.empty:
+                    surveys[name].obsvn_df = obsvn_df
+                    updated[name] = surveys[name]
+            elif cmd[0] == "obsvn":
+                _, name, obsvn = cmd
+                surveys[name].add_obsvn(obsvn)
+                updated[name] = surveys[name]
+                num_obsvns += 1
+
+        for survey in updated.values():
+            survey.solve()
+            result_q.put(
+                {
+                    "name": survey.name,
+                    "final_coord": survey.final_coord,
+                    "apriori_coord": survey.apriori_coord,
+                    "outlier": survey.obsvn_df.get("outlier"),
+                    "residual": survey.obsvn_df.get("residual"),
+                }
+            )
+        with processed.get_lock():
+            processed.value += num_obsvns
@@ -0,0 +1,223 @@
+"""Maintain the observations and trilateration solution for a single station.
+
+Each station surveyed in a realtime ranging survey has its own observations,
+apriori coordinate, solution, output files and plot.
+
+Output files (where <name> is "<station>_<timestamp_start>"):
+    <name>_OBSVNS.csv     Each observation, appended as it is received.
+    <name>_RESIDUALS.csv  All observations with outlier flags and residuals
+                          from the latest solution.
+    <name>_RESULT.csv     The latest solution.
+    <name>.png            Plot of the latest solution.
+"""
+
+import csv
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from pyproj import Transformer
+from pyproj.crs import ProjectedCRS
+from pyproj.crs.coordinate_operation import TransverseMercatorConversion
+
+import ob_inst_survey as obsurv
+
+
+class StationSurvey:
+    """Observations, solution and output files for a single station."""
+
+    def __init__(
+        self,
+        name: str,
+        outfile_path: Path,
+        timestamp_start: str,
+        apriori_coord: pd.Series = None,
+    ):
+        """Initialise the station survey.
+
+        Args:
+            name (str): Station name, used as the prefix of output filenames.
+            outfile_path (Path): Directory for output files.
+            timestamp_start (str): Timestamp included in output filenames.
+            apriori_coord (pd.Series, optional): Apriori coordinate with values
+                "lonDec", "latDec" and "htAmsl". Defaults to None.
+        """
+        self.name = name
+        self.outfile_path = outfile_path
+        self.timestamp_start = timestamp_start
+        self.outfile_name = f"{name}_{timestamp_start}"
+        self.obsfile_log = outfile_path / f"{self.outfile_name}_OBSVNS.csv"
+        self.resdfile_log = outfile_path / f"{self.outfile_name}_RESIDUALS.csv"
+        self.rsltfile_log = outfile_path / f"{self.outfile_name}_RESULT.csv"
+        self._obsfile_cols = None
+        if apriori_coord is None:
+            apriori_coord = pd.Series(dtype=float)
+        self.apriori_coord = apriori_coord
+        self.obsvn_df = pd.DataFrame(dtype=object)
+        self.final_coord = pd.Series(dtype=object)
+        self.fig = None
+
+    def log_obsvn(self, obsvn: dict):
+        """Append a ranging observation to the observations file."""
+        if self._obsfile_cols is None:
+            if self.obsfile_log.exists():
+                with open(self.obsfile_log, newline="", encoding="utf-8") as csvfile:
+                    self._obsfile_cols = next(csv.reader(csvfile), None)
+            if not self._obsfile_cols:
+                self._obsfile_cols = list(obsvn.keys())
+                with open(
+                    self.obsfile_log, "a+", newline="", encoding="utf-8"
+                ) as csvfile:
+                    csv.writer(csvfile).writerow(self._obsfile_cols)
+        with open(self.obsfile_log, "a+", newline="", encoding="utf-8") as csvfile:
+            logwriter = csv.DictWriter(
+                csvfile, fieldnames=self._obsfile_cols, extrasaction="ignore"
+            )
+            logwriter.writerow(obsvn)
+
+    def add_obsvn(self, obsvn: dict):
+        """Append a ranging observation."""
+        next_record = pd.DataFrame.from_dict([obsvn])
+        if not self.obsvn_df.empty:
+            self.obsvn_df = pd.concat(
+                [self.obsvn_df, next_record],
+                axis="rows",
+                ignore_index=True,
+            )
+        else:
+            self.obsvn_df = next_record
+
+    def update_solution(self, result: dict):
+        """Update with a solution computed elsewhere (eg by a SolverWorker)."""
+        self.final_coord = result["final_coord"]
+        if self.apriori_coord.empty:
+            self.apriori_coord = result["apriori_coord"]
+        for col in ("outlier", "residual"):
+            if result[col] is not None:
+                num_rows = min(len(result[col]), len(self.obsvn_df.index))
+                if num_rows:
+                    # Values may be None or float, so store as object dtype.
+                    values = self.obsvn_df.get(
+                        col, pd.Series(index=self.obsvn_df.index, dtype=object)
+                    ).astype(object)
+                    values.iloc[:num_rows] = result[col].iloc[:num_rows].to_numpy()
+                    self.obsvn_df[col] = values
+
+    def get_state(self) -> dict:
+        """Return the survey state so that it may be checkpointed."""
+        return {
+            "name": self.name,
+            "timestamp_start": self.timestamp_start,
+            "apriori_coord": self.apriori_coord,
+            "obsvn_df": self.obsvn_df,
+            "final_coord": self.final_coord,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict, outfile_path: Path) -> "StationSurvey":
+        """Create a survey from a state previously returned by get_state()."""
+        survey = cls(
+            name=state["name"],
+            outfile_path=outfile_path,
+            timestamp_start=state["timestamp_start"],
+            apriori_coord=state["apriori_coord"],
+        )
+        survey.obsvn_df = state["obsvn_df"]
+        survey.final_coord = state["final_coord"]
+        return survey
+
+    def solve(self) -> pd.Series:
+        """Trilaterate, then update the output files and plot.
+
+        Returns the final coordinate, which will be empty if there are
+        insufficient observations for a solution.
+        """
+        final_coord, apriori_returned, all_obs_df = obsurv.trilateration(
+            self.obsvn_df, self.apriori_coord
+        )
+        if self.apriori_coord.empty:
+            self.apriori_coord = apriori_returned
+
+        # Plot the result figure and update it any time a result coordinate is
+        # available.
+        if not final_coord.empty:
+            if not self.fig:
+                plt.ion()
+                self.fig = obsurv.init_plot_trilateration()
+
+            # Transform to Transverse Mercator
+            local_tm = TransverseMercatorConversion(
+                latitude_natural_origin=self.apriori_coord["latDec"],
+                longitude_natural_origin=self.apriori_coord["lonDec"],
+                false_easting=0.0,
+                false_northing=0.0,
+                scale_factor_natural_origin=1.0,
+            )
+
+            proj_local_tm = ProjectedCRS(
+                conversion=local_tm,
+                geodetic_crs="EPSG:4979",
+            )
+            trans_geod_to_tm = Transformer.from_crs(
+                "EPSG:4979", proj_local_tm, always_xy=True
+            )
+
+            (
+                all_obs_df["mE"],
+                all_obs_df["mN"],
+            ) = trans_geod_to_tm.transform(xx=all_obs_df.lonDec, yy=all_obs_df.latDec)
+
+            (
+                final_coord["mE"],
+                final_coord["mN"],
+            ) = trans_geod_to_tm.transform(xx=final_coord.lonDec, yy=final_coord.latDec)
+
+            (
+                self.apriori_coord["mE"],
+                self.apriori_coord["mN"],
+            ) = trans_geod_to_tm.transform(
+                xx=self.apriori_coord.lonDec, yy=self.apriori_coord.latDec
+            )
+
+            final_coord["aprLon"] = self.apriori_coord["lonDec"]
+            final_coord["aprLat"] = self.apriori_coord["latDec"]
+            final_coord["aprHt"] = self.apriori_coord["htAmsl"]
+            final_coord["driftDist"], final_coord["driftBrg"] = rect2pol(
+                final_coord["mN"] - self.apriori_coord["mN"],
+                final_coord["mE"] - self.apriori_coord["mE"],
+            )
+            final_result = final_coord.to_frame().T
+            result_labels = pd.DataFrame(
+                [
+                    {
+                        "site": self.name,
+                        "time": self.timestamp_start,
+                    }
+                ]
+            )
+            final_result = pd.concat([result_labels, final_result], axis=1)
+            final_result.to_csv(self.rsltfile_log, index=False)
+            obsurv.plot_trilateration(
+                fig=self.fig,
+                apriori_coord=apriori_returned,
+                final_coord=final_coord,
+                observations=all_obs_df,
+                plotfile_path=self.outfile_path,
+                plotfile_name=self.outfile_name,
+                title=f"{self.name} {self.timestamp_start}",
+            )
+
+        all_obs_df.to_csv(self.resdfile_log, index=False)
+        self.obsvn_df = all_obs_df
+        self.final_coord = final_coord
+        return final_coord
+
+
+def rect2pol(x_coord, y_coord):
+    """Convert X,Y to dist,brg."""
+    distance = np.sqrt(x_coord**2 + y_coord**2)
+    bearing = np.degrees(np.arctan2(y_coord, x_coord))
+    if bearing < 0:
+        bearing += 360
+    return (distance, bearing)
@@ -38,7 +38,8 @@ def replay2files_parser(
     infile_group.add_argument(
         "--replaynmea",
         help=(
-            f"Full path and filename for NMEA input file. Default: "
+            f"Full path and filename for NMEA input file, or a directory or "
+            f"quoted glob of rotated files to replay as one. Default: "
             f"{dflt_nmeareplayfile}"
         ),
         default=dflt_nmeareplayfile,
@@ -47,10 +48,13 @@ def replay2files_parser(
     infile_group.add_argument(
         "--replayrange",
         help=(
-            f"Full path and filename for Ranging input file. Default: "
-            f"{dflt_rngreplayfile}"
+            f"Full path and filename for Ranging input file, or a directory or "
+            f"quoted glob of rotated files to replay as one. More than one may "
+            f"be specified to replay several ranging sources together. "
+            f"Default: {dflt_rngreplayfile}"
         ),
         default=dflt_rngreplayfile,
+        nargs="+",
         type=Path,
     )
     infile_group.add_argument(
@@ -77,7 +81,10 @@ def replay2files_parser(
     )
     infile_group.add_argument(
         "--replayspeed",
-        help="Speed multiplier for replaying file. Default: 1",
+        help=(
+            "Speed multiplier for replaying files, or 0 to replay as fast as "
+            "possible. Default: 1"
+        ),
         default=1,
         type=float,
     )
@@ -90,7 +97,10 @@ def replayfile_parser(dflt_replayfile: Path = DFLT_INFILE):
     infile_group = parser.add_argument_group(title="Input File Parameters:")
     infile_group.add_argument(
         "--replayfile",
-        help=f"Full path and filename for input file. Default: {dflt_replayfile}",
+        help=(
+            f"Full path and filename for input file, or a directory or quoted "
+            f"glob of rotated files to replay as one. Default: {dflt_replayfile}"
+        ),
         default=dflt_replayfile,
         type=Path,
     )
@@ -158,14 +168,119 @@ def lograw_parser():
     return parser
 
 
+def compress_parser():
+    """Returns parser for compression of logged text files."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--compress",
+        help=(
+            "Compress logged raw text files with gzip (gz), bzip2 (bz2) or xz, "
+            "appending the suffix to their filenames. Compressed logs are "
+            "flushed every minute. Default: uncompressed"
+        ),
+        choices=("gz", "bz2", "xz"),
+        default=None,
+    )
+    return parser
+
+
+def clock_sync_parser():
+    """Returns parser for clock synchronisation switch."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--clocksync",
+        help=(
+            "Continuously estimate the offset of the PC clock from NMEA time and "
+            "correct EdgeTech response timestamps accordingly. When set the PC "
+            "clock does not need to be manually synchronised to NMEA time. "
+            "(Ignored when replaying files.)"
+        ),
+        action="store_true",
+        default=False,
+    )
+    return parser
+
+
+def capture_proc_parser():
+    """Returns parser for capture process switch."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--captureproc",
+        help=(
+            "Receive and timestamp the NMEA and EdgeTech streams in a separate "
+            "capture process, so that timestamps are not delayed by processing "
+            "and plotting. (Ignored when replaying files.)"
+        ),
+        action="store_true",
+        default=False,
+    )
+    return parser
+
+
+def stall_timeout_parser():
+    """Returns parser for the NMEA stall timeout."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--stalltimeout",
+        type=float,
+        help=(
+            "Warn if no NMEA data is received for this many seconds (0 to "
+            "never warn). The survey continues. Default: 5"
+        ),
+        default=5.0,
+    )
+    return parser
+
+
+def nmea_failover_parser():
+    """Returns parser for a standby NMEA source."""
+    parser = ArgumentParser(add_help=False)
+    standby_group = parser.add_argument_group(title="Standby NMEA source:")
+    standby_group.add_argument(
+        "--standbyport",
+        type=int,
+        help=(
+            "Port of a standby NMEA source (eg a second GNSS receiver), used "
+            "if the primary source stops. Other IP parameters are those of the "
+            "primary. Default: no standby."
+        ),
+        default=None,
+    )
+    standby_group.add_argument(
+        "--standbyaddr",
+        help="IP address of the standby NMEA source. Default: as primary.",
+        default=None,
+    )
+    standby_group.add_argument(
+        "--standbylabel",
+        help="Label identifying the standby source. Default: <addr>:<port>",
+        default="",
+    )
+    standby_group.add_argument(
+        "--failoverwindow",
+        type=float,
+        help=(
+            "Switch to the standby if no NMEA is received from the primary "
+            "for this many seconds. Must exceed the interval between primary "
+            "epochs. Default: 1.5"
+        ),
+        default=1.5,
+    )
+    return parser
+
+
 def ip_arg_parser(nmea_conn: obsurv.IpParam):
     """Returns parser for Internet Protocol (IP) connection parameters."""
     parser = ArgumentParser(add_help=False)
     ip_group = parser.add_argument_group(title="NMEA stream IP Parameters:")
     ip_group.add_argument(
         "--ipaddr",
-        help=f"IP address for UDP or TCP connection. Default: {nmea_conn.addr}",
-        default=nmea_conn.addr,
+        help=(
+            "IP address for UDP or TCP connection, or of the local NIC to join "
+            "a UDP multicast group. Default: 127.0.0.1, or 0.0.0.0 (any NIC) "
+            "for multicast."
+        ),
+        default=None,
     )
     ip_group.add_argument(
         "--ipport",
@@ -180,9 +295,74 @@ def ip_arg_parser(nmea_conn: obsurv.IpParam):
     )
     ip_group.add_argument(
         "--ipbuffer",
+        type=int,
         help=f"Buffer size (bytes) for IP connection. Default: {nmea_conn.buffer}",
         default=nmea_conn.buffer,
     )
+    ip_group.add_argument(
+        "--ipgroup",
+        help=(
+            "UDP multicast group address to join, on the local NIC specified "
+            "by --ipaddr. Default: None"
+        ),
+        default=nmea_conn.group,
+    )
+    ip_group.add_argument(
+        "--iplabel",
+        help='Label identifying the NMEA source. Default: "<ipaddr>:<ipport>"',
+        default="",
+    )
+    ip_group.add_argument(
+        "--addipport",
+        nargs=2,
+        action="append",
+        metavar=("PORT", "LABEL"),
+        help=(
+            "Additional UDP port to receive NMEA from, with the same address "
+            "and multicast group, and a label identifying the source (eg "
+            "attitude from an INS). May be repeated."
+        ),
+        default=[],
+    )
+    ip_group.add_argument(
+        "--ipoutage",
+        type=float,
+        help=(
+            "For TCP, end the stream if no data is received for this many "
+            f"seconds (0 to never end). Default: {nmea_conn.outage}"
+        ),
+        default=nmea_conn.outage,
+    )
+    ip_group.add_argument(
+        "--iprcvbuf",
+        type=int,
+        help=(
+            "Socket receive buffer size (bytes). Increase for high rate UDP "
+            "streams. Default: operating system default."
+        ),
+        default=nmea_conn.rcvbuf,
+    )
+    ip_group.add_argument(
+        "--nmeatypes",
+        nargs="+",
+        metavar="TYPE",
+        help=(
+            "NMEA sentence types to be received (eg GGA VTG), all other "
+            "sentences are discarded (and not logged raw). Default: all "
+            "sentence types."
+        ),
+        default=nmea_conn.sentences,
+    )
+    ip_group.add_argument(
+        "--nmeatalkers",
+        nargs="+",
+        metavar="TALKER",
+        help=(
+            "NMEA talker IDs to be received (eg GP GN), all other sentences "
+            "are discarded. Default: all talkers."
+        ),
+        default=nmea_conn.talkers,
+    )
 
     return parser
 
@@ -219,6 +399,50 @@ def ser_arg_parser(ser_conn: obsurv.SerParam):
         help=f"Serial byte size. Default: {ser_conn.bytesize}",
         default=ser_conn.bytesize,
     )
+    ser_group.add_argument(
+        "--sertxcorrect",
+        help=(
+            "Correct response timestamps for the time taken to transmit them "
+            "at the serial baud rate."
+        ),
+        action="store_true",
+        default=ser_conn.tx_correction,
+    )
+    return parser
+
+
+def etech_command_parser(etech_conn: obsurv.EtechParam):
+    """Returns parser for automated EdgeTech 8011M deckbox interrogation."""
+    parser = ArgumentParser(add_help=False)
+    cmd_group = parser.add_argument_group(title="Edgetech Automated Ranging:")
+    cmd_group.add_argument(
+        "--rnginterval",
+        type=float,
+        help=(
+            "Interrogate the transponder automatically, at least this many "
+            "seconds apart (0 for as fast as the upper range gate allows). "
+            "Default: do not interrogate, only receive responses."
+        ),
+        default=etech_conn.range_interval,
+    )
+    cmd_group.add_argument(
+        "--rnggate",
+        type=int,
+        help=(
+            "Upper range gate (ms) for automated interrogation. Default: "
+            f"{etech_conn.upper_gate}"
+        ),
+        default=etech_conn.upper_gate,
+    )
+    cmd_group.add_argument(
+        "--rngcommand",
+        help=(
+            "Host mode command that interrogates the transponder, as "
+            "configured for the deckbox and transponder in use. Required "
+            "with --rnginterval."
+        ),
+        default=etech_conn.range_command,
+    )
     return parser
 
 
@@ -227,7 +451,7 @@ def edgetech_arg_parser(
 ):
     """Returns parser for EdgeTech 8011M deckbox parameters."""
     parser = ArgumentParser(
-        parents=[ser_arg_parser(etech_conn)],
+        parents=[ser_arg_parser(etech_conn), etech_command_parser(etech_conn)],
         add_help=False,
     )
     rng_group = parser.add_argument_group(title="Edgetech Ranging Parameters:")
@@ -249,6 +473,26 @@ def edgetech_arg_parser(
         ),
         default=etech_conn.snd_spd,
     )
+    rng_group.add_argument(
+        "--serlabel",
+        help=(
+            "Label identifying this ranging source in observation records. "
+            "Default: serial port name."
+        ),
+        default=etech_conn.label,
+    )
+    rng_group.add_argument(
+        "--addserport",
+        help=(
+            "Serial port name and label of an additional EdgeTech deckbox to be "
+            "read concurrently, using the same serial and ranging parameters. "
+            "May be repeated for several deckboxes."
+        ),
+        action="append",
+        nargs=2,
+        metavar=("PORT", "LABEL"),
+        default=[],
+    )
     return parser
 
 
@@ -269,6 +513,42 @@ def apriori_coord_parser():
     return parser
 
 
+def station_file_parser():
+    """Returns parser for station file mapping transponder codes to stations."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--stationfile",
+        help=(
+            "CSV file mapping EdgeTech transponder codes to stations, with a header "
+            "row containing 'station', 'tx', 'rx' and optionally 'startlon', "
+            "'startlat' and 'startdepth'. When specified each station is surveyed "
+            "separately with its own output files and plot, and --startcoord is "
+            "ignored."
+        ),
+        default=None,
+        type=Path,
+    )
+    return parser
+
+
+def resume_parser():
+    """Returns parser for resuming from a checkpoint file."""
+    parser = ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--resume",
+        help=(
+            "Resume an interrupted survey from the specified checkpoint file "
+            "'<outfileprefix>_YYYY-MM-DD_HH-MM_CHECKPOINT.pkl'. Observations and "
+            "solutions are restored and new observations are appended to the "
+            "same output files. (If replaying files, use --replaystart to avoid "
+            "replaying observations already included.)"
+        ),
+        default=None,
+        type=Path,
+    )
+    return parser
+
+
 def file_split_parser():
     """Returns parser for time period to split files."""
     parser = ArgumentParser(add_help=False)
@@ -337,27 +617,68 @@ def coord_type(ordinate: str) -> float:
 def options_parser():
     """Parser for various optional CLI arguments"""
     parser = ArgumentParser(add_help=False)
-    parser.add_argument('--tz_offset', default=None, type=float, help="Time zone offset from UTC in hours.")
-    parser.add_argument('--utc', action="store_true", help="Do not use time zone offset, all times in UTC.")
-    parser.add_argument('--maxrange', default=1.6, type=float,
-                        help="Maximum allowable range measurement to use in trilateration calculation, as a multiplier "
-                             "of the a priori water depth. Ranges greater than this will be marked as outliers and "
-                             "excluded. Default 1.6")
-    parser.add_argument('--outlier_resid', default=3, type=float,
-                        help="Outlier cutoff for range residual in trilateration calculation, as a number of standard "
-                             "deviations. Default 3.")
-    parser.add_argument('--hidefig', action="store_true",
-                        help="Do not show figure window during calculation. Useful for batch processing.")
-    parser.add_argument('--tat', type=int, default=320,
-                        help="Delay time in microseconds for bottom-side acoustic modem, between receiving "
-                             "transmission and sending response. Used for calculating range from total acoustic "
-                             "traveltime.")
-    parser.add_argument('--plotmax', type=float, default=None, help="Maximum value for plot axis (+/-).")
-    parser.add_argument('--flexaxis', action="store_true", help="Allow plot limits to expand to fit data.")
-    parser.add_argument('--disco', action='store_true',
-                        help="Input file for survey data is in OBS Locator format from Guralp's Discovery software.")
-    parser.add_argument('--start', type=str, help="Start date/time of location survey, as YYYYMMDD[HH[MM[SS]]].")
-    parser.add_argument('--end', type=str, help="Start date/time of location survey, as YYYYMMDD[HH[MM[SS]]].")
+    parser.add_argument(
+        "--tz_offset",
+        default=None,
+        type=float,
+        help="Time zone offset from UTC in hours.",
+    )
+    parser.add_argument(
+        "--utc",
+        action="store_true",
+        help="Do not use time zone offset, all times in UTC.",
+    )
+    parser.add_argument(
+        "--maxrange",
+        default=1.6,
+        type=float,
+        help="Maximum allowable range measurement to use in trilateration calculation, as a multiplier "
+        "of the a priori water depth. Ranges greater than this will be marked as outliers and "
+        "excluded. Default 1.6",
+    )
+    parser.add_argument(
+        "--outlier_resid",
+        default=3,
+        type=float,
+        help="Outlier cutoff for range residual in trilateration calculation, as a number of standard "
+        "deviations. Default 3.",
+    )
+    parser.add_argument(
+        "--hidefig",
+        action="store_true",
+        help="Do not show figure window during calculation. Useful for batch processing.",
+    )
+    parser.add_argument(
+        "--tat",
+        type=int,
+        default=320,
+        help="Delay time in microseconds for bottom-side acoustic modem, between receiving "
+        "transmission and sending response. Used for calculating range from total acoustic "
+        "traveltime.",
+    )
+    parser.add_argument(
+        "--plotmax", type=float, default=None, help="Maximum value for plot axis (+/-)."
+    )
+    parser.add_argument(
+        "--flexaxis",
+        action="store_true",
+        help="Allow plot limits to expand to fit data.",
+    )
+    parser.add_argument(
+        "--disco",
+        action="store_true",
+        help="Input file for survey data is in OBS Locator format from Guralp's Discovery software.",
+    )
+    parser.add_argument(
+        "--start",
+        type=str,
+        help="Start date/time of location survey, as YYYYMMDD[HH[MM[SS]]].",
+    )
+    parser.add_argument(
+        "--end",
+        type=str,
+        help="Start date/time of location survey, as YYYYMMDD[HH[MM[SS]]].",
+    )
 
     return parser
 
@@ -0,0 +1,161 @@
+"""Handle for controlling a data stream running in a background thread.
+
+Each stream function (nmea_ip_stream, etech_serial_stream, the replay
+functions and ranging_survey_stream) returns a StreamHandle, which may be used
+to stop, join or restart the stream, and which maintains counters of the data
+received.
+"""
+
+from dataclasses import dataclass
+from threading import Event, Thread
+from time import monotonic
+
+# Weight of each new inter-arrival interval in the running interval and jitter.
+INTERVAL_WEIGHT = 1 / 16
+
+
+@dataclass(slots=True)
+class StreamStats:
+    """Counters for data received by a stream.
+
+    These are updated for every sentence received, so record() does no more
+    than a few arithmetic operations on preallocated fields.
+    """
+
+    sentences: int = 0  # Number of sentences (or observations) received.
+    bytes: int = 0  # Number of bytes received.
+    parse_errors: int = 0  # Number of sentences that could not be parsed.
+    filtered: int = 0  # Number of sentences discarded as not required.
+    reconnects: int = 0  # Number of times the connection has been re-established.
+    connect_failures: int = 0  # Number of failed connection attempts.
+    first_msg_time: float = None  # time.monotonic() of first sentence received.
+    last_msg_time: float = None  # time.monotonic() of last sentence received.
+    mean_interval: float = None  # Running mean of seconds between receipts.
+    jitter: float = None  # Running mean deviation of interval from mean_interval.
+
+    def record(self, nbytes: int = 0, sentences: int = 1):
+        """Update counters for newly received sentence(s)."""
+        now = monotonic()
+        if self.last_msg_time is None:
+            self.first_msg_time = now
+        elif self.mean_interval is None:
+            self.mean_interval = now - self.last_msg_time
+            self.jitter = 0.0
+        else:
+            interval = now - self.last_msg_time
+            self.jitter += INTERVAL_WEIGHT * (
+                abs(interval - self.mean_interval) - self.jitter
+            )
+            self.mean_interval += INTERVAL_WEIGHT * (interval - self.mean_interval)
+        self.sentences += sentences
+        self.bytes += nbytes
+        self.last_msg_time = now
+
+    @property
+    def rate(self) -> float:
+        """Mean sentences per second since the first was received."""
+        if self.last_msg_time is None or self.last_msg_time == self.first_msg_time:
+            return 0.0
+        return self.sentences / (self.last_msg_time - self.first_msg_time)
+
+    @property
+    def error_rate(self) -> float:
+        """Fraction of sentences that could not be parsed (eg bad checksum)."""
+        total = self.sentences + self.parse_errors
+        return self.parse_errors / total if total else 0.0
+
+    @property
+    def last_msg_age(self) -> float:
+        """Seconds since the last sentence was received (None if never)."""
+        if self.last_msg_time is None:
+            return None
+        return monotonic() - self.last_msg_time
+
+
+class StreamHandle:
+    """Control a stream running in a background thread.
+
+    The thread target is called as target(handle, *args), and must return
+    promptly once handle.stopped is True.
+    """
+
+    def __init__(self, name: str, target, args: tuple = ()):
+        """Initialise the stream handle (the stream is not yet started).
+
+        Args:
+            name (str): Name describing the stream.
+            target (callable): Function to run in the background thread.
+            args (tuple, optional): Arguments following the handle passed to
+                target. Defaults to ().
+        """
+        self.name = name
+        self.stats = StreamStats()
+        self.children: list[StreamHandle] = []
+        self.error: Exception = None
+        self._target = target
+        self._args = args
+        self._stop_event = Event()
+        self._thread: Thread = None
+
+    def __repr__(self):
+        """Return a summary of the stream state and counters."""
+        return (
+            f"StreamHandle({self.name!r}, running={self.running}, "
+            f"sentences={self.stats.sentences}, bytes={self.stats.bytes}, "
+            f"parse_errors={self.stats.parse_errors}, "
+            f"last_msg_age={self.stats.last_msg_age})"
+        )
+
+    @property
+    def running(self) -> bool:
+        """True if the stream thread is running."""
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def stopped(self) -> bool:
+        """True once stop() has been called."""
+        return self._stop_event.is_set()
+
+    def start(self) -> "StreamHandle":
+        """Start the stream in a background thread."""
+        self._stop_event = Event()
+        self.error = None
+        self._thread = Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Request the stream (and any child streams) to stop."""
+        self._stop_event.set()
+        for child in self.children:
+            child.stop()
+
+    def join(self, timeout: float = None):
+        """Wait for the stream (and any child streams) to finish."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+        for child in self.children:
+            child.join(timeout)
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep for up to timeout seconds, returning True if stopped."""
+        return self._stop_event.wait(timeout)
+
+    def restart(self, args: tuple = None) -> "StreamHandle":
+        """Stop the stream and start it again, optionally with new arguments.
+
+        Counters are retained across restarts.
+        """
+        self.stop()
+        self.join()
+        self.children = []
+        if args is not None:
+            self._args = args
+        return self.start()
+
+    def _run(self):
+        try:
+            self._target(self, *self._args)
+        except Exception as error:
+            self.error = error
+            raise
@@ -0,0 +1,197 @@
+"""Health telemetry and stall watchdog for survey data streams.
+
+StreamTelemetry collects the StreamStats of each source (NMEA, EdgeTech and the
+paired observations) and reports their message rates, inter-arrival jitter,
+parse (checksum) failure rates, queue depths and last message age. The counters
+themselves are updated by the streams as each sentence is received.
+
+The watchdog thread periodically checks each source with a stall timeout. When
+a source has received nothing for longer than its timeout a dict with flag
+"Stalled" is put in the observation queue, followed by one with flag
+"Recovered" once it resumes. Optionally a row for each source is appended to a
+CSV file at a regular interval, to record the feed quality over a survey.
+"""
+
+import csv
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+from queue import Queue
+from time import monotonic
+
+import ob_inst_survey as obsurv
+
+TELEMETRY_COLS = (
+    "timestamp",
+    "source",
+    "sentences",
+    "rate",
+    "meanInterval",
+    "jitter",
+    "parseErrors",
+    "errorRate",
+    "filtered",
+    "reconnects",
+    "queueDepth",
+    "lastMsgAge",
+)
+
+
+@dataclass
+class _TelemetrySource:
+    """A stream monitored by StreamTelemetry."""
+
+    name: str
+    stats: obsurv.StreamStats
+    queue: Queue = None
+    stall_timeout: float = None
+    stalled: bool = False
+    added_time: float = field(default_factory=monotonic)
+
+
+class StreamTelemetry:
+    """Health statistics for the streams of a survey session."""
+
+    def __init__(self):
+        """Initialise with no sources."""
+        self.sources: list[_TelemetrySource] = []
+
+    def add_source(
+        self,
+        name: str,
+        stats: obsurv.StreamStats,
+        queue: Queue = None,
+        stall_timeout: float = None,
+    ):
+        """Add a source to be monitored.
+
+        Args:
+            name (str): Name of the source in reports and flags.
+            stats (obsurv.StreamStats): Counters maintained by the stream.
+            queue (Queue, optional): Queue populated by the stream, whose
+                depth is reported. Defaults to None.
+            stall_timeout (float, optional): Seconds without data after which
+                the watchdog flags the source as stalled. Defaults to None
+                (never flagged).
+        """
+        self.sources.append(_TelemetrySource(name, stats, queue, stall_timeout))
+
+    def snapshot(self) -> list[dict]:
+        """Return a dict of the current statistics for each source."""
+        timestamp = datetime.now(UTC).strftime("%Y-%m-%dT%H:%M:%S")
+        rows = []
+        for source in self.sources:
+            stats = source.stats
+            rows.append(
+                {
+                    "timestamp": timestamp,
+                    "source": source.name,
+                    "sentences": stats.sentences,
+                    "rate": _round(stats.rate, 3),
+                    "meanInterval": _round(stats.mean_interval, 4),
+                    "jitter": _round(stats.jitter, 4),
+                    "parseErrors": stats.parse_errors,
+                    "errorRate": _round(stats.error_rate, 5),
+                    "filtered": stats.filtered,
+                    "reconnects": stats.reconnects,
+                    "queueDepth": source.queue.qsize() if source.queue else None,
+                    "lastMsgAge": _round(stats.last_msg_age, 2),
+                }
+            )
+        return rows
+
+    def report(self) -> str:
+        """Return a summary of the statistics of each source as text."""
+        lines = [
+            f"{'Source':<20} {'Sentences':>9} {'Rate/s':>8} {'Jitter s':>9} "
+            f"{'Err rate':>9} {'Queue':>6} {'Age s':>7}"
+        ]
+        for row in self.snapshot():
+            lines.append(
+                f"{row['source']:<20} {row['sentences']:>9} {row['rate']:>8} "
+                f"{_text(row['jitter']):>9} {row['errorRate']:>9} "
+                f"{_text(row['queueDepth']):>6} {_text(row['lastMsgAge']):>7}"
+            )
+        return "\n".join(lines)
+
+    def write_csv(self, filename: Path):
+        """Append a row for each source to a CSV file."""
+        new_file = not Path(filename).exists()
+        with open(filename, "a+", newline="", encoding="utf-8") as csvfile:
+            logwriter = csv.DictWriter(csvfile, fieldnames=TELEMETRY_COLS)
+            if new_file:
+                logwriter.writeheader()
+            logwriter.writerows(self.snapshot())
+
+    def check_stalls(self, obsvn_q: Queue[dict]):
+        """Put a flag in obsvn_q for each source that has stalled or recovered."""
+        now = monotonic()
+        for source in self.sources:
+            if not source.stall_timeout:
+                continue
+            last_time = source.stats.last_msg_time or source.added_time
+            age = now - max(last_time, source.added_time)
+            if not source.stalled and age > source.stall_timeout:
+                source.stalled = True
+                obsvn_q.put(
+                    {"flag": "Stalled", "source": source.name, "lastMsgAge": age}
+                )
+            elif source.stalled and age <= source.stall_timeout:
+                source.stalled = False
+                obsvn_q.put(
+                    {"flag": "Recovered", "source": source.name, "lastMsgAge": age}
+                )
+
+    def watchdog(
+        self,
+        obsvn_q: Queue[dict],
+        interval: float = 1.0,
+        logfile: Path = None,
+        log_interval: float = 60.0,
+    ) -> obsurv.StreamHandle:
+        """Start the watchdog thread.
+
+        Args:
+            obsvn_q (Queue[dict]): Queue for "Stalled" and "Recovered" flags.
+            interval (float, optional): Seconds between checks. Defaults to 1.
+            logfile (Path, optional): CSV file to which statistics are
+                appended every log_interval seconds, and when the watchdog is
+                stopped. Defaults to None.
+            log_interval (float, optional): Seconds between rows written to
+                logfile. Defaults to 60.
+
+        Returns:
+            obsurv.StreamHandle: Handle for stopping the watchdog.
+        """
+        return obsurv.StreamHandle(
+            name="Stream watchdog",
+            target=_watch,
+            args=(self, obsvn_q, interval, logfile, log_interval),
+        ).start()
+
+
+def _watch(
+    handle: obsurv.StreamHandle,
+    telemetry: StreamTelemetry,
+    obsvn_q: Queue[dict],
+    interval: float,
+    logfile: Path,
+    log_interval: float,
+):
+    """Check for stalled sources and log statistics until stopped."""
+    next_log = monotonic() + log_interval
+    while not handle.wait(interval):
+        telemetry.check_stalls(obsvn_q)
+        if logfile and monotonic() >= next_log:
+            telemetry.write_csv(logfile)
+            next_log += log_interval
+    if logfile:
+        telemetry.write_csv(logfile)
+
+
+def _round(value: float, digits: int) -> float:
+    return None if value is None else round(value, digits)
+
+
+def _text(value) -> str:
+    return "-" if value is None else str(value)
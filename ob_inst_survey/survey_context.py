@@ -0,0 +1,53 @@
+"""Context for a single survey session.
+
+A SurveyContext owns the state that would otherwise be shared between every
+survey run in the same process: the session start time (which names output
+files and synchronises replayed streams), the output and raw log paths, the
+EdgeTech deckbox and acoustic parameters, the handles of running streams and
+the telemetry of their health.
+Several sessions may therefore run concurrently in one process, each with its
+own context.
+"""
+
+from dataclasses import dataclass, field
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+import ob_inst_survey as obsurv
+
+
+def _default_start_time() -> datetime:
+    # Allow time for startup before replayed streams begin.
+    return datetime.now(UTC) + timedelta(seconds=1)
+
+
+@dataclass
+class SurveyContext:
+    """Dataclass for the state owned by a single survey session."""
+
+    start_time: datetime = field(default_factory=_default_start_time)
+    timestamp_start: str = None  # For filenames. Defaults to start_time.
+    outfile_path: Path = None  # Directory for survey output files.
+    outfile_prefix: str = ""  # Prefix for output and raw log filenames.
+    rawfile_path: Path = None  # Directory for raw NMEA & ranging logs, or None.
+    raw_compression: str = None  # Compress raw logs: "gz", "bz2", "xz" or None.
+    etech_conn: list = field(default_factory=list)  # EtechParam for each source.
+    streams: list = field(default_factory=list)  # StreamHandle for each stream.
+    telemetry: obsurv.StreamTelemetry = field(default_factory=obsurv.StreamTelemetry)
+
+    def __post_init__(self):
+        """Default the filename timestamp to the session start time."""
+        if self.timestamp_start is None:
+            self.timestamp_start = self.start_time.strftime("%Y-%m-%d_%H-%M")
+
+    def add_stream(self, handle):
+        """Record a stream handle so that it is stopped with the session."""
+        self.streams.append(handle)
+        return handle
+
+    def stop(self, timeout: float = 2):
+        """Stop all streams of this session and wait for them to finish."""
+        for handle in self.streams:
+            handle.stop()
+        for handle in self.streams:
+            handle.join(timeout)
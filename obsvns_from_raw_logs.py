@@ -0,0 +1,144 @@
+"""Convert raw NMEA and Ranging logs to observation files without replaying."""
+
+import sys
+from argparse import ArgumentParser
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+
+import ob_inst_survey as obsurv
+
+DFLT_PREFIX = "RANGINGSURVEY"
+DFLT_PATH = Path.cwd() / "results/"
+
+
+def main():
+    """Convert raw logs to observations and save to CSV file."""
+    # Default CLI arguments.
+    etech_param = obsurv.EtechParam()
+
+    # Retrieve CLI arguments.
+    helpdesc: str = (
+        "Converts a raw NMEA log and one or more raw EdgeTech ranging logs "
+        "(as logged with --lograw) to an observations file "
+        '"<outfileprefix>_<timestamp>_OBSVNS.csv", with the same fields as '
+        "when the logs are replayed, for use with "
+        "ranging_survey_from_obsfile.py. Each range is paired with the first "
+        "NMEA fix at or after it (or with --interpolate, the position between "
+        "the fixes either side of it). The logs are parsed in bulk, so are "
+        "converted far faster than by replaying them."
+    )
+    parser = ArgumentParser(
+        parents=[
+            obsurv.out_filepath_parser(DFLT_PATH),
+            obsurv.out_fileprefix_parser(DFLT_PREFIX),
+            obsurv.station_file_parser(),
+        ],
+        description=helpdesc,
+    )
+    parser.add_argument(
+        "--nmea",
+        help="Raw NMEA log file.",
+        required=True,
+        type=Path,
+    )
+    parser.add_argument(
+        "--range",
+        help=(
+            "Raw EdgeTech ranging log files, one for each ranging source. "
+            "Sources are labelled by filename unless --rnglabel is specified."
+        ),
+        required=True,
+        nargs="+",
+        type=Path,
+    )
+    parser.add_argument(
+        "--rnglabel",
+        help="Label identifying the ranging source of each --range file.",
+        nargs="+",
+        default=[],
+    )
+    parser.add_argument(
+        "--timestampoffset",
+        help=(
+            "If NMEA and Range files are not time synced, specify number of "
+            "seconds to offset the ranging timestamp to bring in sync with NMEA. "
+            "(If Ranging timestamp is ahead of NMEA timestamp value should "
+            "be negative, otherwise positive.) Default: 0.0"
+        ),
+        default=0.0,
+        type=float,
+    )
+    parser.add_argument(
+        "--acouturn",
+        type=float,
+        help=(
+            f"Delay in ms for reply from BPR transducer. Default: "
+            f"{etech_param.turn_time}"
+        ),
+        default=etech_param.turn_time,
+    )
+    parser.add_argument(
+        "--acouspd",
+        type=int,
+        help=(
+            f"Speed of sound in water (typical 1450 to 1570 m/sec). Default: "
+            f"{etech_param.snd_spd}"
+        ),
+        default=etech_param.snd_spd,
+    )
+    parser.add_argument(
+        "--interpolate",
+        help=(
+            "Interpolate the position of each range between the NMEA fixes "
+            "either side of it."
+        ),
+        action="store_true",
+        default=False,
+    )
+    args = parser.parse_args()
+    if args.rnglabel and len(args.rnglabel) != len(args.range):
+        parser.error("Specify a --rnglabel for each --range file.")
+    etech_params = [
+        obsurv.EtechParam(turn_time=args.acouturn, snd_spd=args.acouspd, label=label)
+        for label in args.rnglabel or [""]
+    ]
+    outfile_path: Path = args.outfilepath
+
+    obsvn_df = obsurv.convert_raw_logs(
+        args.nmea,
+        args.range,
+        etech_params,
+        timestamp_offset=args.timestampoffset,
+        interpolate=args.interpolate,
+    )
+    if obsvn_df.empty:
+        sys.exit("No ranges could be paired with NMEA positions.")
+
+    # Name output files from the timestamp of the first range response, as
+    # when the logs are replayed.
+    timestamp = obsurv.replay_index(args.range[0], "etech").first_datetime
+    timestamp = timestamp + timedelta(seconds=args.timestampoffset)
+    timestamp_start = timestamp.strftime("%Y-%m-%d_%H-%M")
+
+    # If a station file is provided then each observation will be routed by
+    # its transponder codes to a separate file for each station.
+    if args.stationfile:
+        router = obsurv.ObsvnRouter(obsurv.read_station_file(args.stationfile))
+        stations = router.route_table(obsvn_df)
+        unmatched = stations.isna().sum()
+        if unmatched:
+            print(f"{unmatched} ranges do not match any station and are ignored.")
+    else:
+        stations = pd.Series(args.outfileprefix, index=obsvn_df.index)
+
+    outfile_path.mkdir(parents=True, exist_ok=True)
+    for name, station_df in obsvn_df.groupby(stations, sort=False):
+        obsfile_name = outfile_path / f"{name}_{timestamp_start}_OBSVNS.csv"
+        station_df.to_csv(obsfile_name, index=False)
+        print(f"{len(station_df)} observations saved to {obsfile_name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ import ob_inst_survey as obsurv
 
 DFLT_PREFIX = "RANGINGSURVEY"
 DFLT_PATH = Path.cwd() / "results/"
+CACHE_VERSION = 1  # Version of the cached observations table.
 
 
 def main():
@@ -62,36 +63,40 @@ def main():
 
     outfile_path: Path = args.outfilepath
     if timestamp_start:
-        outfile_name = '{0}_{1}'.format(args.outfileprefix, timestamp_start.strftime('%Y-%m-%d_%H-%M'))
+        outfile_name = "{0}_{1}".format(
+            args.outfileprefix, timestamp_start.strftime("%Y-%m-%d_%H-%M")
+        )
     rsltfile_name = outfile_path / f"{outfile_name}_RESULT.csv"
     if args.outfileprefix in obsvn_in_filename.stem:
         obsvn_out_filename = outfile_path / f"{obsvn_in_filename.stem}_OUT.csv"
     else:
         # Include station name in output CSV file, if not present
-        obsvn_out_filename = outfile_path / '{0}_{1}_OUT.csv'.format(obsvn_in_filename.stem, args.outfileprefix)
+        obsvn_out_filename = outfile_path / "{0}_{1}_OUT.csv".format(
+            obsvn_in_filename.stem, args.outfileprefix
+        )
 
     # Organize other arguments
     calc_kwargs = {}
     if args.maxrange:
-        calc_kwargs.update({'maxrange': args.maxrange})
+        calc_kwargs.update({"maxrange": args.maxrange})
     if args.outlier_resid:
-        calc_kwargs.update({'max_resid': args.outlier_resid})
+        calc_kwargs.update({"max_resid": args.outlier_resid})
     if args.tz_offset is not None:
-        calc_kwargs.update({'tz_offset': args.tz_offset})
+        calc_kwargs.update({"tz_offset": args.tz_offset})
     if args.tat:
-        calc_kwargs.update({'tat': args.tat})
+        calc_kwargs.update({"tat": args.tat})
     if args.disco:
-        calc_kwargs.update({'disco': args.disco})
+        calc_kwargs.update({"disco": args.disco})
     if args.start:
-        calc_kwargs.update({'starttime': obsurv.parse_cli_datetime(args.start)})
+        calc_kwargs.update({"starttime": obsurv.parse_cli_datetime(args.start)})
     if args.end:
-        calc_kwargs.update({'endtime': obsurv.parse_cli_datetime(args.end)})
+        calc_kwargs.update({"endtime": obsurv.parse_cli_datetime(args.end)})
 
     plot_kwargs = {}
     if args.flexaxis:
-        plot_kwargs.update({'flex_lims': args.flexaxis})
+        plot_kwargs.update({"flex_lims": args.flexaxis})
     if args.plotmax is not None:
-        plot_kwargs.update({'ax_max': args.plotmax})
+        plot_kwargs.update({"ax_max": args.plotmax})
 
     # Create directories for results.
     outfile_path.mkdir(parents=True, exist_ok=True)
@@ -100,7 +105,9 @@ def main():
     all_obs_df = load_survey_data(obsvn_in_filename, **calc_kwargs)
     # TODO: Calculate range from travel-time if not included (require TAT CLI parameter)
 
-    final_coord, apriori_coord_returned, all_obs_df = obsurv.trilateration(all_obs_df, apriori_coord, **calc_kwargs)
+    final_coord, apriori_coord_returned, all_obs_df = obsurv.trilateration(
+        all_obs_df, apriori_coord, **calc_kwargs
+    )
     if apriori_coord.empty:
         apriori_coord = apriori_coord_returned
 
@@ -171,8 +178,10 @@ def main():
         observations=all_obs_df,
         plotfile_path=outfile_path,
         plotfile_name=outfile_name,
-        title='{0} {1}'.format(args.outfileprefix, timestamp_start.strftime('%Y-%m-%d %H:%M')),
-        **plot_kwargs
+        title="{0} {1}".format(
+            args.outfileprefix, timestamp_start.strftime("%Y-%m-%d %H:%M")
+        ),
+        **plot_kwargs,
     )
 
     all_obs_df.to_csv(obsvn_out_filename, index=False)
@@ -183,12 +192,17 @@ def main():
 
 def load_survey_data(filename, **kwargs):
     data_file = filename
-    disco_fmt = kwargs.pop('disco', False)
+    disco_fmt = kwargs.pop("disco", False)
     try:
         if disco_fmt:
             input_df = read_obs_locator_log(data_file)
         else:
-            input_df = pd.read_csv(data_file)
+            # Compressed files (.gz, .bz2, .xz) are decompressed by pandas.
+            # The parsed table is cached, so is only parsed again if the file
+            # changes.
+            input_df = obsurv.cached_table(
+                data_file, "obsvns", CACHE_VERSION, lambda: pd.read_csv(data_file)
+            )
     except FileNotFoundError:
         sys.exit(f"File '{data_file}' does not exist!")
 
@@ -208,31 +222,31 @@ def load_survey_data(filename, **kwargs):
         )
 
     # Find depth column if 'htAmsl' not present
-    if 'htAmsl' not in input_df:
+    if "htAmsl" not in input_df:
         depth_keys = [
-            ['depth', -1],
-            ['Depth', -1],
-            ['elev', 1],
-            ['Elevation', 1],
-            ['elevation', 1],
+            ["depth", -1],
+            ["Depth", -1],
+            ["elev", 1],
+            ["Elevation", 1],
+            ["elevation", 1],
         ]
         z = False
         while (len(depth_keys) > 0) and not z:
             key_info = depth_keys.pop(0)
             if key_info[0] in input_df:
-                input_df['htAmsl'] = key_info[1] * input_df[key_info[0]]
+                input_df["htAmsl"] = key_info[1] * input_df[key_info[0]]
                 z = True
 
         # Default depth of '0' if no depth data present
         if not z:
-            input_df['htAmsl'] = 0
+            input_df["htAmsl"] = 0
 
     # Filter input data to time range of interest (if specified)
-    if 'datetime' in input_df:
-        if 'starttime' in kwargs:
-            input_df = input_df[input_df['datetime'] >= kwargs['starttime']]
-        if 'endtime' in kwargs:
-            input_df = input_df[input_df['datetime'] <= kwargs['endtime']]
+    if "datetime" in input_df:
+        if "starttime" in kwargs:
+            input_df = input_df[input_df["datetime"] >= kwargs["starttime"]]
+        if "endtime" in kwargs:
+            input_df = input_df[input_df["datetime"] <= kwargs["endtime"]]
 
     return input_df
 
@@ -242,30 +256,30 @@ def read_obs_locator_log(filename):
     from datetime import datetime
     import re
 
-    formats = [int, 'date', 'time', float, float, int, float, float, float]
+    formats = [int, "date", "time", float, float, int, float, float, float]
 
-    f = open(filename)
+    f = obsurv.open_logfile(filename)
     head = None
     while head is None:
         temp = f.readline()
-        if temp[0] != '#' and temp.strip():
-            head = re.split(r',|\s', temp.strip().lower())
-    head.append('datetime')
+        if temp[0] != "#" and temp.strip():
+            head = re.split(r",|\s", temp.strip().lower())
+    head.append("datetime")
 
     range_data = []
     for line in f.readlines():
-        if line[0] == '#':
+        if line[0] == "#":
             continue
 
-        parts = re.split(r',|\s', line.strip())
+        parts = re.split(r",|\s", line.strip())
         values = []
         for i in range(min(len(parts), len(formats))):
             if isinstance(formats[i], type):
                 values.append(formats[i](parts[i]))
-            elif formats[i] == 'date':
-                values.append(datetime.strptime(parts[i], '%d-%m-%Y').date())
-            elif formats[i] == 'time':
-                values.append(datetime.strptime(parts[i], '%H:%M:%S').time())
+            elif formats[i] == "date":
+                values.append(datetime.strptime(parts[i], "%d-%m-%Y").date())
+            elif formats[i] == "time":
+                values.append(datetime.strptime(parts[i], "%H:%M:%S").time())
             else:
                 values.append(parts[i])
         values.append(datetime.combine(values[1], values[2]))
@@ -273,8 +287,8 @@ def read_obs_locator_log(filename):
 
     data = pd.DataFrame(range_data, columns=head)
     # Ensure required columns are present
-    data.rename(columns={'lat': 'latDec', 'lon': 'lonDec'}, inplace=True)
-    data['htAmsl'] = 0
+    data.rename(columns={"lat": "latDec", "lon": "lonDec"}, inplace=True)
+    data["htAmsl"] = 0
     return data
 
 
@@ -286,17 +300,17 @@ def timestamp_from_file(filename, tz_offset=None):
         # Look for timestamp in the filename.
         timestamp = re.search(timestamp_pattern, filename).group()
     except AttributeError:
-        # If no valid timestamp in filename look inside file.
-        with open(filename, mode="r", encoding="utf-8") as file:
-            file_lines = file.readlines()
-        for line in file_lines:
-            try:
-                # Find first occurrence of a timestamp in a line of the file.
-                timestamp = re.search(timestamp_pattern, line).group()
-                break
-            except AttributeError:
-                # If no valid timestamp continue with next line.
-                pass
+        # If no valid timestamp in filename look inside file, which may be
+        # compressed.
+        with obsurv.open_logfile(filename) as file:
+            for line in file:
+                try:
+                    # Find first occurrence of a timestamp in a line of the file.
+                    timestamp = re.search(timestamp_pattern, line).group()
+                    break
+                except AttributeError:
+                    # If no valid timestamp continue with next line.
+                    pass
     if timestamp:
         # Standardise timestamp format
         timestamp = re.sub(r"[Tt :_-]", r"_", timestamp)
@@ -304,7 +318,7 @@ def timestamp_from_file(filename, tz_offset=None):
         # Time zone offset
         if tz_offset is not None:
             tzo = tz_offset
-            timestamp = (timestamp - timedelta(hours=tzo))
+            timestamp = timestamp - timedelta(hours=tzo)
 
     return timestamp
 
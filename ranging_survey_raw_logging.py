@@ -3,6 +3,7 @@
 import csv
 import sys
 from argparse import ArgumentParser
+from dataclasses import replace
 from datetime import datetime
 from pathlib import Path
 from queue import Queue
@@ -35,6 +36,8 @@ OBSVN_COLS = (
     "sndSpd",
     "tx",
     "rx",
+    "rngSrc",
+    "nmeaSrc",
 )
 
 DISPLAY_COLS = (
@@ -48,8 +51,6 @@ DISPLAY_COLS = (
     "heading",
 )
 
-STARTTIME = datetime.now()
-TIMESTAMP_START = STARTTIME.strftime("%Y-%m-%d_%H-%M")
 DFLT_PREFIX = "RANGELOG"
 DFLT_PATH = Path.home() / "logs/"
 ACCOU_TURNTIME = 12.5  # millisec
@@ -58,6 +59,8 @@ ACCOU_SPD = 1500  # m/sec
 
 def main():
     """Initialise NMEA and EdgeTech data streams and log to CSV text file."""
+    context = obsurv.SurveyContext()
+
     # Default CLI arguments.
     ip_param = obsurv.IpParam()
     etech_param = obsurv.EtechParam()
@@ -77,6 +80,11 @@ def main():
             obsurv.out_fileprefix_parser(DFLT_PREFIX),
             obsurv.ip_arg_parser(ip_param),
             obsurv.edgetech_arg_parser(etech_param),
+            obsurv.compress_parser(),
+            obsurv.clock_sync_parser(),
+            obsurv.capture_proc_parser(),
+            obsurv.stall_timeout_parser(),
+            obsurv.nmea_failover_parser(),
             obsurv.replay2files_parser(None),
         ],
         description=helpdesc,
@@ -92,27 +100,56 @@ def main():
     )
     args = parser.parse_args()
     outfile_path: Path = args.outfilepath
-    outfile_log: str = outfile_path / f"{args.outfileprefix}_{TIMESTAMP_START}.csv"
-    rawfile_path = None
+    outfile_log: str = (
+        outfile_path / f"{args.outfileprefix}_{context.timestamp_start}.csv"
+    )
+    context.outfile_path = outfile_path
+    context.outfile_prefix = args.outfileprefix
     if args.lograw:
-        rawfile_path = outfile_path
+        context.rawfile_path = outfile_path
+        context.raw_compression = args.compress
     ip_param = obsurv.IpParam(
         port=args.ipport,
         addr=args.ipaddr,
         prot=args.ipprot,
         buffer=args.ipbuffer,
+        rcvbuf=args.iprcvbuf,
+        sentences=args.nmeatypes,
+        talkers=args.nmeatalkers,
+        group=args.ipgroup,
+        label=args.iplabel,
+        outage=args.ipoutage,
     )
+    ip_params = [ip_param]
+    for port, label in args.addipport:
+        ip_params.append(replace(ip_param, port=int(port), label=label))
+    standby_param = None
+    if args.standbyport:
+        standby_param = replace(
+            ip_param,
+            port=args.standbyport,
+            addr=args.standbyaddr or ip_param.addr,
+            label=args.standbylabel,
+        )
     etech_param = obsurv.EtechParam(
         port=args.serport,
         baud=args.serbaud,
         stop=args.serstop,
         parity=args.serparity,
         bytesize=args.serbytesize,
+        tx_correction=args.sertxcorrect,
         turn_time=args.acouturn,
         snd_spd=args.acouspd,
+        label=args.serlabel,
+        range_interval=args.rnginterval,
+        upper_gate=args.rnggate,
+        range_command=args.rngcommand,
     )
+    context.etech_conn = [etech_param]
+    for port, label in args.addserport:
+        context.etech_conn.append(replace(etech_param, port=port, label=label))
     replay_nmeafile: Path = args.replaynmea
-    replay_rngfile: Path = args.replayrange
+    replay_rngfile: list[Path] = args.replayrange
     replay_start: datetime = args.replaystart
     replay_speed: float = args.replayspeed
     timestamp_offset: float = args.timestampoffset
@@ -125,15 +162,18 @@ def main():
     obsvn_q: Queue[dict] = Queue()
     obsurv.ranging_survey_stream(
         obsvn_q=obsvn_q,
-        nmea_conn=ip_param,
-        etech_conn=etech_param,
+        nmea_conn=ip_params,
         nmea_filename=replay_nmeafile,
         etech_filename=replay_rngfile,
         replay_start=replay_start,
         spd_fctr=replay_speed,
         timestamp_offset=timestamp_offset,
-        rawfile_path=rawfile_path,
-        rawfile_prefix=args.outfileprefix,
+        clock=obsurv.ClockDiscipline() if args.clocksync else None,
+        context=context,
+        capture_proc=args.captureproc,
+        stall_timeout=args.stalltimeout or None,
+        nmea_standby=standby_param,
+        failover_window=args.failoverwindow,
     )
 
     print(",".join(DISPLAY_COLS))
@@ -146,6 +186,15 @@ def main():
                 sleep(0.001)  # Prevents idle loop from 100% CPU thread usage.
                 continue
             result_dict = obsvn_q.get()
+            if result_dict["flag"] == "Stalled":
+                print(
+                    f"!!! No {result_dict['source']} data for "
+                    f"{result_dict['lastMsgAge']:.0f} seconds. !!!"
+                )
+                continue
+            if result_dict["flag"] == "Recovered":
+                print(f"*** {result_dict['source']} data resumed. ***")
+                continue
             if result_dict["flag"] in ["TimeoutError", "EOF"]:
                 sys.exit(f"*** Survey Ended: {result_dict['flag']} ***")
 
@@ -163,6 +212,9 @@ def main():
 
     except KeyboardInterrupt:
         sys.exit("*** End Ranging Survey ***")
+    finally:
+        context.stop()
+        print(context.telemetry.report())
 
 
 if __name__ == "__main__":
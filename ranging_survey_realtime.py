@@ -1,22 +1,16 @@
 """Log NMEA & Ranging data streams to a combined CSV text file."""
 
-import re
 from argparse import ArgumentParser
-from datetime import datetime, timedelta, timezone
+from dataclasses import replace
+from datetime import datetime, timedelta
 from pathlib import Path
 from queue import Queue
 from time import sleep
 
-import matplotlib.pyplot as plt
-import numpy as np
 import pandas as pd
-from pyproj import Transformer
-from pyproj.crs import ProjectedCRS
-from pyproj.crs.coordinate_operation import TransverseMercatorConversion
 
 import ob_inst_survey as obsurv
 
-STARTTIME = datetime.now(timezone.utc)
 DFLT_PREFIX = "RANGINGSURVEY"
 DFLT_PATH = Path.cwd() / "results/"
 ACCOU_TURNTIME = 12.5  # millisec
@@ -26,6 +20,8 @@ ACCOU_SPD = 1500  # m/sec
 # TODO: Add ability for real-time survey with NFSI log files (Discovery)
 def main():
     """Initialise NMEA and EdgeTech data streams and log to CSV text file."""
+    context = obsurv.SurveyContext()
+
     # Default CLI arguments.
     ip_param = obsurv.IpParam()
     etech_param = obsurv.EtechParam()
@@ -46,10 +42,17 @@ def main():
             obsurv.out_filepath_parser(DFLT_PATH),
             obsurv.out_fileprefix_parser(DFLT_PREFIX),
             obsurv.lograw_parser(),
+            obsurv.compress_parser(),
             obsurv.ip_arg_parser(ip_param),
             obsurv.edgetech_arg_parser(etech_param),
+            obsurv.clock_sync_parser(),
+            obsurv.capture_proc_parser(),
+            obsurv.stall_timeout_parser(),
+            obsurv.nmea_failover_parser(),
             obsurv.replay2files_parser(None),
             obsurv.apriori_coord_parser(),
+            obsurv.station_file_parser(),
+            obsurv.resume_parser(),
         ],
         description=helpdesc,
     )
@@ -64,90 +67,165 @@ def main():
         addr=args.ipaddr,
         prot=args.ipprot,
         buffer=args.ipbuffer,
+        rcvbuf=args.iprcvbuf,
+        sentences=args.nmeatypes,
+        talkers=args.nmeatalkers,
+        group=args.ipgroup,
+        label=args.iplabel,
+        outage=args.ipoutage,
     )
+    ip_params = [ip_param]
+    for port, label in args.addipport:
+        ip_params.append(replace(ip_param, port=int(port), label=label))
+    standby_param = None
+    if args.standbyport:
+        standby_param = replace(
+            ip_param,
+            port=args.standbyport,
+            addr=args.standbyaddr or ip_param.addr,
+            label=args.standbylabel,
+        )
     etech_param = obsurv.EtechParam(
         port=args.serport,
         baud=args.serbaud,
         stop=args.serstop,
         parity=args.serparity,
         bytesize=args.serbytesize,
+        tx_correction=args.sertxcorrect,
         turn_time=args.acouturn,
         snd_spd=args.acouspd,
+        label=args.serlabel,
+        range_interval=args.rnginterval,
+        upper_gate=args.rnggate,
+        range_command=args.rngcommand,
     )
+    etech_params = [etech_param]
+    for port, label in args.addserport:
+        etech_params.append(replace(etech_param, port=port, label=label))
     replay_nmeafile: Path = args.replaynmea
-    replay_rngfile: Path = args.replayrange
+    replay_rngfile: list[Path] = args.replayrange
     replay_start: datetime = args.replaystart
     replay_speed: float = args.replayspeed
     timestamp_offset: float = args.timestampoffset
 
     if not (replay_rngfile and replay_nmeafile):
-        timestamp_start = STARTTIME.strftime("%Y-%m-%d_%H-%M")
+        timestamp_start = context.timestamp_start
     else:
-        with open(replay_rngfile, encoding="utf-8") as etech_file:
-            etech_lines = etech_file.readlines()
-        for sentence in etech_lines:
-            try:
-                # Attempt to extract the timestamp from the beginning of first sentence of the file replay.
-                timestamp_pattern = (
-                    r"^\d{4}[:_-]\d{2}[:_-]\d{2}[Tt :_-]"
-                    r"\d{2}[:_-]\d{2}[:_-]\d{2}\.\d{0,6}"
-                )
-                timestamp = re.search(timestamp_pattern, sentence).group()
-                timestamp = re.sub(r"[Tt :_-]", r"_", timestamp)
-                timestamp = datetime.strptime(timestamp, r"%Y_%m_%d_%H_%M_%S.%f")
-                timestamp = timestamp + timedelta(seconds=timestamp_offset)
-                timestamp_start = timestamp.strftime("%Y-%m-%d_%H-%M")
-                break
-            except AttributeError:
-                # If no valid timestamp continue with next response line.
-                pass
+        # Name output files from the timestamp of the first range response,
+        # found from the time index of the file.
+        timestamp_start = context.timestamp_start
+        timestamp = obsurv.replay_index(replay_rngfile[0], "etech").first_datetime
+        if timestamp:
+            timestamp = timestamp + timedelta(seconds=timestamp_offset)
+            timestamp_start = timestamp.strftime("%Y-%m-%d_%H-%M")
+
+    # If resuming an interrupted survey, continue with the same output files.
+    checkpoint_state = None
+    if args.resume:
+        checkpoint_state = obsurv.load_checkpoint(args.resume)
+        timestamp_start = checkpoint_state["timestamp_start"]
+        print(f"Resuming survey from checkpoint {args.resume}")
 
     outfile_path: Path = args.outfilepath
-    outfile_name: str = f"{args.outfileprefix}_{timestamp_start}"
-    obsfile_name: str = f"{outfile_name}_OBSVNS"
-    obsfile_log: str = outfile_path / f"{obsfile_name}.csv"
-    rsltfile_name: str = f"{outfile_name}_RESULT"
-    rsltfile_log: str = outfile_path / f"{rsltfile_name}.csv"
+    context.timestamp_start = timestamp_start
+    context.outfile_path = outfile_path
+    context.outfile_prefix = args.outfileprefix
+    context.etech_conn = etech_params
     if args.lograw:
-        rawfile_path = outfile_path
+        context.rawfile_path = outfile_path
+        context.raw_compression = args.compress
+
+    # If a station file is provided then each observation will be routed by
+    # its transponder codes to a separate survey for each station. Otherwise
+    # all observations belong to a single survey.
+    router = None
+    if args.stationfile:
+        stations = obsurv.read_station_file(args.stationfile)
+        router = obsurv.ObsvnRouter(stations)
+        surveys = {
+            station.name: obsurv.StationSurvey(
+                name=station.name,
+                outfile_path=outfile_path,
+                timestamp_start=timestamp_start,
+                apriori_coord=station.apriori_coord(),
+            )
+            for station in stations
+        }
     else:
-        rawfile_path = None
+        surveys = {
+            args.outfileprefix: obsurv.StationSurvey(
+                name=args.outfileprefix,
+                outfile_path=outfile_path,
+                timestamp_start=timestamp_start,
+                apriori_coord=apriori_coord,
+            )
+        }
+    if checkpoint_state:
+        for name, station_state in checkpoint_state["stations"].items():
+            surveys[name] = obsurv.StationSurvey.from_state(station_state, outfile_path)
+
+    clock = obsurv.ClockDiscipline() if args.clocksync else None
+    if clock and checkpoint_state and checkpoint_state["clock"]:
+        clock.set_state(checkpoint_state["clock"])
+
+    if args.resume:
+        checkpoint_file = args.resume
+    else:
+        checkpoint_file = (
+            outfile_path / f"{args.outfileprefix}_{timestamp_start}_CHECKPOINT.pkl"
+        )
+    checkpointer = obsurv.Checkpointer(checkpoint_file)
 
     # Create directories for logging (included raw NMEA and Ranging streams).
     outfile_path.mkdir(parents=True, exist_ok=True)
-    print(f"Logging survey observations to {obsfile_log}")
+    for survey in surveys.values():
+        print(f"Logging survey observations to {survey.obsfile_log}")
+
+    # Trilateration and plotting are done in a separate process so that they
+    # do not delay logging and display of observations.
+    solver = obsurv.SolverWorker()
+    solver.start()
+    for survey in surveys.values():
+        solver.add_station(
+            name=survey.name,
+            outfile_path=survey.outfile_path,
+            timestamp_start=survey.timestamp_start,
+            apriori_coord=survey.apriori_coord,
+            obsvn_df=survey.obsvn_df,
+        )
 
     # Initiate NMEA and Ranging data streams to the observation queue.
     obsvn_q: Queue[dict] = Queue()
     obsurv.ranging_survey_stream(
         obsvn_q=obsvn_q,
-        nmea_conn=ip_param,
-        etech_conn=etech_param,
+        nmea_conn=ip_params,
         nmea_filename=replay_nmeafile,
         etech_filename=replay_rngfile,
         replay_start=replay_start,
         spd_fctr=replay_speed,
         timestamp_offset=timestamp_offset,
-        rawfile_path=rawfile_path,
-        rawfile_prefix=args.outfileprefix,
+        clock=clock,
+        context=context,
+        capture_proc=args.captureproc,
+        stall_timeout=args.stalltimeout or None,
+        nmea_standby=standby_param,
+        failover_window=args.failoverwindow,
     )
 
-    figure_displayed = False
-
     display_cols = (
-        f'{"utcTime":^12s}',
-        f'{"rngTime":^7s}',
-        f'{"range":^8s}',
-        f'{"lat":^14s}',
-        f'{"lon":^14s}',
-        f'{"cog":^6s}',
-        f'{"sogKt":^5s}',
-        f'{"heading":^6s}',
+        f"{'utcTime':^12s}",
+        f"{'rngTime':^7s}",
+        f"{'range':^8s}",
+        f"{'lat':^14s}",
+        f"{'lon':^14s}",
+        f"{'cog':^6s}",
+        f"{'sogKt':^5s}",
+        f"{'heading':^6s}",
     )
+    if router:
+        display_cols = (f"{'station':^12s}", *display_cols)
     print(", ".join(display_cols))
 
-    obsvn_df = pd.DataFrame(dtype=object)
-
     # Main survey loop.
     try:
         while True:
@@ -155,132 +233,85 @@ def main():
                 sleep(0.000001)  # Prevents idle loop from 100% CPU thread usage.
                 continue
             result_dict = obsvn_q.get()
+            if result_dict["flag"] == "Stalled":
+                print(
+                    f"!!! No {result_dict['source']} data for "
+                    f"{result_dict['lastMsgAge']:.0f} seconds. !!!"
+                )
+                continue
+            if result_dict["flag"] == "Recovered":
+                print(f"*** {result_dict['source']} data resumed. ***")
+                continue
             if result_dict["flag"] in ["TimeoutError", "EOF"]:
                 print(f"*** Survey Ended: {result_dict['flag']} ***")
+                solver.wait_idle()
                 input("Press <Enter> to close plot.")
                 break
 
+            if router:
+                station = router.route(result_dict)
+                if not station:
+                    print(
+                        f"Range with TX {result_dict['tx']} / RX {result_dict['rx']} "
+                        f"does not match any station. It has been ignored."
+                    )
+                    continue
+                survey = surveys[station.name]
+            else:
+                survey = surveys[args.outfileprefix]
+
             # Display summary values to screen
             display_vals = []
-            display_vals.append(f'{result_dict["utcTime"]:<12s}')
-            display_vals.append(f'{result_dict["rangeTime"]:7.3f}')
-            display_vals.append(f'{result_dict["range"]:8.2f}')
-            display_vals.append(f'{result_dict["lat"]:>14s}')
-            display_vals.append(f'{result_dict["lon"]:>14s}')
+            if router:
+                display_vals.append(f"{survey.name:<12s}")
+            display_vals.append(f"{result_dict['utcTime']:<12s}")
+            display_vals.append(f"{result_dict['rangeTime']:7.3f}")
+            display_vals.append(f"{result_dict['range']:8.2f}")
+            display_vals.append(f"{result_dict['lat']:>14s}")
+            display_vals.append(f"{result_dict['lon']:>14s}")
             try:
-                display_vals.append(f'{result_dict["cog"]:06.2f}')
-                display_vals.append(f'{result_dict["sogKt"]:5.1f}')
+                display_vals.append(f"{result_dict['cog']:06.2f}")
+                display_vals.append(f"{result_dict['sogKt']:5.1f}")
             except ValueError:
                 display_vals.extend([" " * 6, " " * 5])
             try:
-                display_vals.append(f'{result_dict["heading"]:06.2f}')
+                display_vals.append(f"{result_dict['heading']:06.2f}")
             except ValueError:
                 display_vals.append(" " * 6)
             print(", ".join(display_vals))
 
-            next_record = pd.DataFrame.from_dict([result_dict])
+            survey.log_obsvn(result_dict)
+            survey.add_obsvn(result_dict)
+            solver.submit(survey.name, result_dict)
 
-            if not obsvn_df.empty:
-                obsvn_df = pd.concat(
-                    [obsvn_df, next_record],
-                    axis="rows",
-                    ignore_index=True,
-                )
-            else:
-                obsvn_df = next_record
-
-            final_coord, apriori_returned, all_obs_df = obsurv.trilateration(
-                obsvn_df, apriori_coord
-            )
-            if apriori_coord.empty:
-                apriori_coord = apriori_returned
-
-            # Plot the result figure and update it any time a result coordinate is available.
-            if not final_coord.empty:
-                if not figure_displayed:
-                    plt.ion()
-                    fig = obsurv.init_plot_trilateration()
-                    figure_displayed = True
-
-                # Transform to Transverse Mercator
-                local_tm = TransverseMercatorConversion(
-                    latitude_natural_origin=apriori_coord["latDec"],
-                    longitude_natural_origin=apriori_coord["lonDec"],
-                    false_easting=0.0,
-                    false_northing=0.0,
-                    scale_factor_natural_origin=1.0,
-                )
-
-                proj_local_tm = ProjectedCRS(
-                    conversion=local_tm,
-                    geodetic_crs="EPSG:4979",
-                )
-                trans_geod_to_tm = Transformer.from_crs(
-                    "EPSG:4979", proj_local_tm, always_xy=True
-                )
-
-                (
-                    all_obs_df["mE"],
-                    all_obs_df["mN"],
-                ) = trans_geod_to_tm.transform(
-                    xx=all_obs_df.lonDec, yy=all_obs_df.latDec
-                )
-
-                (
-                    final_coord["mE"],
-                    final_coord["mN"],
-                ) = trans_geod_to_tm.transform(
-                    xx=final_coord.lonDec, yy=final_coord.latDec
-                )
-
-                (
-                    apriori_coord["mE"],
-                    apriori_coord["mN"],
-                ) = trans_geod_to_tm.transform(
-                    xx=apriori_coord.lonDec, yy=apriori_coord.latDec
-                )
-
-                final_coord["aprLon"] = apriori_coord["lonDec"]
-                final_coord["aprLat"] = apriori_coord["latDec"]
-                final_coord["aprHt"] = apriori_coord["htAmsl"]
-                final_coord["driftDist"], final_coord["driftBrg"] = rect2pol(
-                    final_coord["mN"] - apriori_coord["mN"],
-                    final_coord["mE"] - apriori_coord["mE"],
-                )
-                final_result = final_coord.to_frame().T
-                result_labels = pd.DataFrame(
-                    [
-                        {
-                            "site": args.outfileprefix,
-                            "time": timestamp_start,
-                        }
-                    ]
-                )
-                final_result = pd.concat([result_labels, final_result], axis=1)
-                final_result.to_csv(rsltfile_log, index=False)
-                obsurv.plot_trilateration(
-                    fig=fig,
-                    apriori_coord=apriori_returned,
-                    final_coord=final_coord,
-                    observations=all_obs_df,
-                    plotfile_path=outfile_path,
-                    plotfile_name=outfile_name,
-                    title=f"{args.outfileprefix} {timestamp_start}",
-                )
-
-            all_obs_df.to_csv(obsfile_log, index=False)
+            for result in solver.get_results():
+                surveys[result["name"]].update_solution(result)
+            if checkpointer.due():
+                checkpointer.save(session_state(timestamp_start, surveys, clock))
 
     except KeyboardInterrupt:
         print("*** Ranging survey ended. ***")
-
-
-def rect2pol(x_coord, y_coord):
-    """Convert X,Y to dist,brg."""
-    distance = np.sqrt(x_coord**2 + y_coord**2)
-    bearing = np.degrees(np.arctan2(y_coord, x_coord))
-    if bearing < 0:
-        bearing += 360
-    return (distance, bearing)
+    finally:
+        context.stop()
+        print(context.telemetry.report())
+        for result in solver.get_results():
+            surveys[result["name"]].update_solution(result)
+        checkpointer.save(session_state(timestamp_start, surveys, clock))
+        print(f"Survey state saved to {checkpointer.filename}")
+        solver.stop()
+
+
+def session_state(
+    timestamp_start: str,
+    surveys: dict[str, obsurv.StationSurvey],
+    clock: obsurv.ClockDiscipline,
+) -> dict:
+    """Return the survey session state to be checkpointed."""
+    return {
+        "timestamp_start": timestamp_start,
+        "stations": {name: survey.get_state() for name, survey in surveys.items()},
+        "clock": clock.get_state() if clock else None,
+    }
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+"""Simulate an EdgeTech 8011M deckbox on a pseudo-terminal for testing."""
+
+import sys
+from argparse import ArgumentParser
+from pathlib import Path
+from time import sleep
+
+import ob_inst_survey as obsurv
+
+
+def main():
+    """Run the deckbox simulator until interrupted."""
+    # Default CLI arguments.
+    sim_param = obsurv.SimParam()
+    geometry = obsurv.SimGeometry()
+
+    # Retrieve CLI arguments.
+    helpdesc: str = (
+        "Emulates an EdgeTech 8011M acoustic deck box on a pseudo-terminal "
+        "(Linux/Unix only), for testing and benchmarking without hardware. "
+        "The name of the pseudo-terminal is displayed, and should be used as "
+        "the serial port (--serport) of the logging and survey scripts. "
+        "Range responses are emitted at a regular rate with range times "
+        "computed from a ship circling an instrument, or as listed in a "
+        "scenario file."
+    )
+    parser = ArgumentParser(description=helpdesc)
+    sim_group = parser.add_argument_group(title="Simulator Parameters:")
+    sim_group.add_argument(
+        "--rate",
+        type=float,
+        help=f"Range responses per second. Default: {sim_param.rate}",
+        default=sim_param.rate,
+    )
+    sim_group.add_argument(
+        "--scenario",
+        type=Path,
+        help=(
+            'File with a line of "<seconds> <range time>" for each response. '
+            "Overrides --rate and the geometry."
+        ),
+        default=None,
+    )
+    sim_group.add_argument(
+        "--jitter",
+        type=float,
+        help=(
+            "Maximum random delay (s) added to each response. "
+            f"Default: {sim_param.jitter}"
+        ),
+        default=sim_param.jitter,
+    )
+    sim_group.add_argument(
+        "--malformed",
+        type=float,
+        help=(
+            "Fraction of responses that are truncated or garbled. "
+            f"Default: {sim_param.malformed}"
+        ),
+        default=sim_param.malformed,
+    )
+    sim_group.add_argument(
+        "--simbaud",
+        type=int,
+        help=(
+            "Pace output at this baud rate (0 for as fast as possible). "
+            f"Default: {sim_param.baud}"
+        ),
+        default=sim_param.baud,
+    )
+    sim_group.add_argument(
+        "--hostonly",
+        help="Only respond to host mode commands (no free running responses).",
+        action="store_true",
+        default=False,
+    )
+    sim_group.add_argument(
+        "--seed",
+        type=int,
+        help="Random seed, for repeatable jitter and malformed responses.",
+        default=None,
+    )
+    geom_group = parser.add_argument_group(title="Simulated Geometry:")
+    geom_group.add_argument(
+        "--depth",
+        type=float,
+        help=f"Instrument depth (m). Default: {geometry.depth}",
+        default=geometry.depth,
+    )
+    geom_group.add_argument(
+        "--radius",
+        type=float,
+        help=f"Radius of ship's circle (m). Default: {geometry.radius}",
+        default=geometry.radius,
+    )
+    geom_group.add_argument(
+        "--offset",
+        type=float,
+        help=(
+            "Horizontal distance of instrument from circle centre (m). "
+            f"Default: {geometry.offset}"
+        ),
+        default=geometry.offset,
+    )
+    geom_group.add_argument(
+        "--speed",
+        type=float,
+        help=f"Ship speed (knots). Default: {geometry.speed}",
+        default=geometry.speed,
+    )
+    geom_group.add_argument(
+        "--acouspd",
+        type=float,
+        help=f"Speed of sound in water (m/s). Default: {geometry.snd_spd}",
+        default=geometry.snd_spd,
+    )
+    geom_group.add_argument(
+        "--acouturn",
+        type=float,
+        help=f"Transducer turn around time (ms). Default: {geometry.turn_time}",
+        default=geometry.turn_time,
+    )
+    args = parser.parse_args()
+
+    sim_param = obsurv.SimParam(
+        rate=args.rate,
+        jitter=args.jitter,
+        malformed=args.malformed,
+        baud=args.simbaud,
+        free_running=not args.hostonly,
+        seed=args.seed,
+    )
+    geometry = obsurv.SimGeometry(
+        depth=args.depth,
+        radius=args.radius,
+        offset=args.offset,
+        speed=args.speed,
+        snd_spd=args.acouspd,
+        turn_time=args.acouturn,
+    )
+    scenario = obsurv.read_scenario(args.scenario) if args.scenario else None
+
+    simulator = obsurv.DeckboxSimulator(sim_param, geometry, scenario)
+    handle = simulator.start()
+    print(f"Simulated EdgeTech deckbox on serial port: {simulator.port}")
+    try:
+        while handle.running:
+            sleep(1)
+        if handle.error:
+            sys.exit(f"*** Simulator failed: {handle.error} ***")
+    except KeyboardInterrupt:
+        print("*** End EdgeTech Simulator ***")
+    finally:
+        simulator.close()
+        print(handle)
+
+
+if __name__ == "__main__":
+    main()
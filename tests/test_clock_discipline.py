@@ -0,0 +1,39 @@
+"""Tests of the PC-to-NMEA clock offset estimator."""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import ob_inst_survey as obsurv
+
+START = datetime(2024, 1, 1, 12)
+
+
+def test_offset_and_drift_recovered_despite_outliers():
+    """Theil-Sen fit recovers offset and drift, ignoring delayed samples."""
+    clock = obsurv.ClockDiscipline(window=60, min_samples=10)
+    offset, drift = 0.25, 20e-6  # NMEA - PC seconds, and seconds per second.
+    for second in range(60):
+        pc_time = START + timedelta(seconds=second)
+        nmea_time = pc_time + timedelta(seconds=offset + drift * second)
+        if second % 10 == 3:
+            # PC receipt delayed, eg by a stalled consumer.
+            pc_time += timedelta(seconds=0.5)
+        clock.update(pc_time, nmea_time)
+
+    assert clock.ready
+    assert clock.drift_ppm() == pytest.approx(20, abs=0.5)
+    later = START + timedelta(seconds=100)
+    assert clock.offset(later).total_seconds() == pytest.approx(
+        offset + drift * 100, abs=1e-4
+    )
+
+
+def test_no_correction_until_enough_samples():
+    """The offset is zero until min_samples pairs have been received."""
+    clock = obsurv.ClockDiscipline(min_samples=10)
+    for second in range(9):
+        pc_time = START + timedelta(seconds=second)
+        clock.update(pc_time, pc_time + timedelta(seconds=1))
+    assert not clock.ready
+    assert clock.correct(START) == START
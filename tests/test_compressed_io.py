@@ -0,0 +1,42 @@
+"""Tests of reading and writing compressed log files."""
+
+import pytest
+
+import ob_inst_survey as obsurv
+
+LINES = [
+    "2024-01-01T00:00:00.000000 $GPHDT,90.0,T*0C\r\n",
+    "2024-01-01T00:00:01.000000 $GPHDT,91.0,T*0D\r\n",
+    "2024-01-01T00:00:02.000000 $GPHDT,92.0,T*0E\r\n",
+]
+
+
+@pytest.mark.parametrize("suffix", ["gz", "bz2", "xz"])
+def test_write_then_read_round_trip(tmp_path, suffix):
+    """Lines written in several compressed streams read back as one."""
+    log_file = obsurv.compressed_filename(tmp_path / "NMEA.txt", suffix)
+
+    with obsurv.LogWriter(log_file, flush_interval=0) as writer:
+        for line in LINES:
+            writer.write(line)  # Each write ends a compressed stream.
+    with obsurv.LogWriter(log_file) as writer:
+        writer.write(LINES[0])
+
+    with open(log_file, "rb") as raw_file:
+        assert LINES[0].encode() not in raw_file.read()
+    with obsurv.open_logfile(log_file, newline="") as text_file:
+        assert text_file.readlines() == LINES + LINES[:1]
+    with obsurv.open_logfile(log_file, "rb") as binary_file:
+        assert binary_file.read() == "".join(LINES + LINES[:1]).encode()
+    assert obsurv.uncompressed_filename(log_file) == tmp_path / "NMEA.txt"
+
+
+def test_uncompressed_round_trip(tmp_path):
+    """Files without a compression suffix are written as plain text."""
+    log_file = obsurv.compressed_filename(tmp_path / "NMEA.txt", None)
+
+    with obsurv.LogWriter(log_file) as writer:
+        for line in LINES:
+            writer.write(line)
+
+    assert log_file.read_bytes() == "".join(LINES).encode()
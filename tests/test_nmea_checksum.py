@@ -0,0 +1,57 @@
+"""Tests of NMEA checksum validation."""
+
+from functools import reduce
+
+import ob_inst_survey as obsurv
+
+
+def _sentence(body: str, checksum: int = None) -> str:
+    if checksum is None:
+        checksum = reduce(lambda value, char: value ^ ord(char), body, 0)
+    return f"${body}*{checksum:02X}"
+
+
+LINES = [
+    _sentence("GPGGA,120000.00,3815.00000,S,17830.72000,E,1,10,0.9,10.0,M,,M,,"),
+    _sentence("GPVTG,90.0,T,,M,5.0,N,9.2,K,A", checksum=0),  # Wrong checksum.
+    "$GPHDT,90.0,T*0c",  # Lower case hexadecimal digits.
+    "$GPHDT,90.0,T",  # No checksum.
+    "",
+    "2024-01-01T12-00-00.000000 " + _sentence("GPHDT,91.0,T"),  # Prefixed.
+    "noise $" + _sentence("GPZDA,120000.00,01,01,2024,,"),  # Last "$" counts.
+    _sentence("GPHDT,92.0,T")[:-1],  # Truncated checksum.
+    _sentence("GPHDT,93.0,T"),  # Final line without a newline.
+]
+
+
+def _expected(lines: list[str]) -> list[bool]:
+    return [obsurv.nmea_checksum(line[line.rfind("$") :]) for line in lines]
+
+
+def test_block_matches_per_line_checksums():
+    """Block validation agrees with validating each line separately."""
+    block = "\r\n".join(LINES).encode()
+    valid = obsurv.nmea_checksum_block(block)
+    assert valid.tolist() == _expected(LINES)
+    assert valid.tolist() == [
+        True, False, True, False, False, True, True, False, True
+    ]  # fmt: skip
+
+
+def test_block_excludes_final_empty_line():
+    """A trailing newline does not add a line, nor does an empty block."""
+    block = ("\n".join(LINES) + "\n").encode()
+    assert obsurv.nmea_checksum_block(block).tolist() == _expected(LINES)
+    assert obsurv.nmea_checksum_block(b"").tolist() == []
+
+
+def test_file_chunks_match_per_line_checksums(tmp_path):
+    """Lines split across chunks are validated whole."""
+    nmea_file = tmp_path / "nmea.txt"
+    nmea_file.write_bytes("\r\n".join(LINES).encode())
+    lines, valid = [], []
+    for chunk_lines, chunk_valid in obsurv.nmea_checksum_file(nmea_file, 50):
+        lines.extend(chunk_lines)
+        valid.extend(chunk_valid.tolist())
+    assert [line.decode() for line in lines] == LINES
+    assert valid == _expected(LINES)
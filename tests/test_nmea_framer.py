@@ -0,0 +1,47 @@
+"""Tests of the framing of received bytes into NMEA sentences."""
+
+import socket
+
+import ob_inst_survey as obsurv
+
+GGA = "$GPGGA,120000.00,3815.00000,S,17830.72000,E,1,10,0.9,10.0,M,20.0,M,,*4F"
+HDT = "$GPHDT,90.0,T*0C"
+
+
+def _receive(framer: obsurv.NmeaFramer, chunks: list[bytes]) -> list[list[str]]:
+    """Send each chunk over a socket pair and frame it as received."""
+    sender, receiver = socket.socketpair()
+    with sender, receiver:
+        received = []
+        for chunk in chunks:
+            sender.sendall(chunk)
+            nbytes = 0
+            while nbytes < len(chunk):
+                nbytes += framer.recv_into(receiver)
+            received.append(framer.sentences())
+    return received
+
+
+def test_sentence_split_across_chunks_is_reassembled():
+    """A partial sentence is held until the rest of it is received."""
+    data = f"{HDT}\r\n{GGA}\r\n".encode()
+    split = len(HDT) + 2 + 20  # Part way through the GGA sentence.
+    stats = obsurv.StreamStats()
+    framer = obsurv.NmeaFramer(size=64, stats=stats)
+
+    received = _receive(framer, [data[:split], data[split:]])
+
+    assert received == [[HDT], [GGA]]
+    assert stats.sentences == 2
+    assert stats.bytes == len(data)
+
+
+def test_sentence_types_filtered():
+    """Only the accepted sentence types are returned, others are counted."""
+    stats = obsurv.StreamStats()
+    framer = obsurv.NmeaFramer(stats=stats, sentences=("GGA",))
+
+    received = _receive(framer, [f"{HDT}\r\n{GGA}\r\n".encode()])
+
+    assert received == [[GGA]]
+    assert stats.filtered == 1
@@ -0,0 +1,22 @@
+"""Tests of the NMEA IP connection parameters."""
+
+import ob_inst_survey as obsurv
+
+
+def test_default_address():
+    """Unicast defaults to localhost, multicast to any NIC."""
+    assert obsurv.IpParam().addr == "127.0.0.1"
+    multicast = obsurv.IpParam(group="239.192.0.1")
+    assert multicast.addr == "0.0.0.0"
+    assert multicast.label == "239.192.0.1:50001"
+    nic = obsurv.IpParam(addr="192.168.1.10", group="239.192.0.1")
+    assert nic.addr == "192.168.1.10"
+
+
+def test_parser_default_address():
+    """The address is left to IpParam unless given on the command line."""
+    parser = obsurv.ip_arg_parser(obsurv.IpParam())
+    args = parser.parse_args(["--ipgroup", "239.192.0.1"])
+    assert obsurv.IpParam(addr=args.ipaddr, group=args.ipgroup).addr == "0.0.0.0"
+    args = parser.parse_args(["--ipaddr", "10.0.0.2"])
+    assert obsurv.IpParam(addr=args.ipaddr).addr == "10.0.0.2"
@@ -0,0 +1,39 @@
+"""Tests of the bulk conversion of raw logs to observations."""
+
+from functools import reduce
+
+import ob_inst_survey as obsurv
+
+
+def _sentence(body: str) -> str:
+    checksum = reduce(lambda value, char: value ^ ord(char), body, 0)
+    return f"${body}*{checksum:02X}"
+
+
+def test_convert_skips_fix_stepping_backwards(tmp_path, monkeypatch):
+    """A fix with a timestamp stepping backwards is dropped before pairing."""
+    monkeypatch.setenv(obsurv.parse_cache.CACHE_ENV, "off")
+    nmea_file = tmp_path / "nmea.txt"
+    nmea_file.write_text(
+        "".join(
+            _sentence(
+                f"GPGGA,{time},3815.00000,S,17830.72000,E,1,10,0.9,10.0,M,20.0,M,,"
+            )
+            + "\n"
+            for time in ("120000.00", "120001.00", "115959.00", "120002.00")
+        )
+    )
+    rng_file = tmp_path / "rng.txt"
+    rng_file.write_text(
+        "".join(
+            f"2024-01-01T12-00-{second}.500000 RNG: Tx Freq 12.00 Rx Freq 11.00 "
+            "Range Time 2.438 sec\n"
+            for second in ("00", "01")
+        )
+    )
+
+    fix_df = obsurv.read_fix_table(nmea_file)
+    assert fix_df["utcTime"].tolist() == ["12:00:00.00", "12:00:01.00", "12:00:02.00"]
+
+    obsvn_df = obsurv.convert_raw_logs(nmea_file, rng_file)
+    assert obsvn_df["utcTime"].tolist() == ["12:00:01.00", "12:00:02.00"]
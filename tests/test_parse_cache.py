@@ -0,0 +1,57 @@
+"""Tests of the cache of parsed replay files."""
+
+import os
+from datetime import datetime
+
+import pandas as pd
+
+import ob_inst_survey as obsurv
+
+
+def test_eviction_removes_least_recently_used(tmp_path, monkeypatch):
+    """Entries are evicted oldest used first, and loading marks an entry used."""
+    cache = tmp_path / "cache"
+    cache.mkdir()
+    monkeypatch.setenv(obsurv.parse_cache.CACHE_ENV, str(cache))
+    table = pd.DataFrame({"range": [1.5, 2.5, 3.5], "text": ["a", "b", "c"]})
+    entries = {}
+    for idx, name in enumerate(["first.txt", "second.txt", "third.txt"]):
+        filename = tmp_path / name
+        filename.write_text(name)
+        obsurv.parse_cache.save_cached_table(filename, "test", 1, table)
+        (entry,) = set(cache.glob("*.npz")) - set(entries.values())
+        os.utime(entry, ns=(idx * 10**9, idx * 10**9))
+        entries[name] = entry
+
+    # Using the oldest entry makes "second.txt" the least recently used.
+    loaded = obsurv.parse_cache.load_cached_table(tmp_path / "first.txt", "test", 1)
+    pd.testing.assert_frame_equal(loaded, table)
+    sizes = {name: entry.stat().st_size for name, entry in entries.items()}
+    obsurv.parse_cache.evict_cache(cache, sum(sizes.values()) - 1)
+
+    assert not entries["second.txt"].exists()
+    assert entries["first.txt"].exists()
+    assert entries["third.txt"].exists()
+
+    obsurv.parse_cache.evict_cache(cache, 0)
+    assert not list(cache.glob("*.npz"))
+
+
+def test_spooled_lines_round_trip(tmp_path, monkeypatch):
+    """Lines spooled in several chunks are cached and read back unchanged."""
+    monkeypatch.setenv(obsurv.parse_cache.CACHE_ENV, str(tmp_path / "cache"))
+    monkeypatch.setattr(obsurv.parse_cache, "SPOOL_ROWS", 4)
+    filename = tmp_path / "NMEA.txt"
+    filename.write_text("replayed")
+    lines = [
+        (datetime(1900, 1, 1, 0, 0, idx), f"$GPHDT,{idx}.0,T*{idx:02X}", 18, idx * 18)
+        for idx in range(10)
+    ]
+    stats = obsurv.StreamStats()
+
+    cached = list(obsurv.caching_lines(filename, "lines", 1, iter(lines), stats))
+    table = obsurv.parse_cache.load_cached_table(filename, "lines", 1)
+
+    assert cached == lines
+    assert list(obsurv.cached_lines(table)) == lines
+    assert list(obsurv.cached_lines(table, offset=5 * 18)) == lines[5:]
@@ -0,0 +1,69 @@
+"""Tests of the time index used to seek replay files."""
+
+from datetime import datetime, timedelta
+from functools import reduce
+
+import ob_inst_survey as obsurv
+
+
+def _sentence(body: str) -> str:
+    checksum = reduce(lambda value, char: value ^ ord(char), body, 0)
+    return f"${body}*{checksum:02X}"
+
+
+def _write_nmea(filename, start: datetime, count: int, step: float):
+    """Write a GGA and HDT sentence every step seconds from start."""
+    offsets = {}
+    with open(filename, "wb") as nmea_file:
+        for idx in range(count):
+            time = start + timedelta(seconds=idx * step)
+            offsets[time] = nmea_file.tell()
+            nmea_file.write(
+                (
+                    _sentence(
+                        f"GPGGA,{time:%H%M%S}.00,3815.00000,S,17830.72000,E,"
+                        "1,10,0.9,10.0,M,20.0,M,,"
+                    )
+                    + "\r\n"
+                    + _sentence("GPHDT,90.0,T")
+                    + "\r\n"
+                ).encode()
+            )
+    return offsets
+
+
+def test_seek_lands_on_indexed_line(tmp_path, monkeypatch):
+    """Seeking returns the offset of the last entry at or before the time."""
+    monkeypatch.setenv(obsurv.parse_cache.CACHE_ENV, "off")
+    nmea_file = tmp_path / "NMEA_2024-01-01_23-55.txt"
+    offsets = _write_nmea(nmea_file, datetime(1900, 1, 1, 23, 55), 60, 10)
+
+    index = obsurv.replay_index(nmea_file, "nmea", interval=60)
+
+    assert obsurv.index_filename(nmea_file).exists()
+    assert index.first_datetime == datetime(2024, 1, 1, 23, 55)
+    assert len(index.rollovers) == 1
+    # 00:02:30 the next day is after the entry at 00:02:00.
+    target = datetime(1900, 1, 2, 0, 2, 30)
+    offset, timestamp_date = index.seek(target)
+    assert offset == offsets[datetime(1900, 1, 2, 0, 2)]
+    assert timestamp_date == datetime(1900, 1, 2)
+    with open(nmea_file, "rb") as nmea_file_:
+        nmea_file_.seek(offset)
+        assert nmea_file_.readline().startswith(b"$GPGGA,000200.00,")
+    assert index.seek(datetime(1900, 1, 1, 23, 0)) == (0, datetime(1900, 1, 1))
+
+
+def test_replay_from_timestamp_starts_at_first_line_due(tmp_path, monkeypatch):
+    """Replaying from a date and time starts at the first line at or after it."""
+    monkeypatch.setenv(obsurv.parse_cache.CACHE_ENV, "off")
+    nmea_file = tmp_path / "NMEA_2024-01-01_23-55.txt"
+    _write_nmea(nmea_file, datetime(1900, 1, 1, 23, 55), 60, 10)
+
+    lines = obsurv.read_nmea_textfile(
+        nmea_file, timestamp_start=datetime(2024, 1, 2, 0, 2, 35)
+    )
+    timestamp, line, _, _ = next(lines)
+
+    assert timestamp == datetime(1900, 1, 2, 0, 2, 40)
+    assert line.startswith("$GPGGA,000240.00,")